@@ -1,6 +1,11 @@
+import asyncio
 import importlib
 import inspect
+import sys
 from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict
 
 from src.agents.base_agent import BaseAgent
 from src.logger import logger
@@ -8,60 +13,132 @@ from src.logger import logger
 EMPTY_AGENT_CONFIG = {}
 EMPTY_HEADERS = {}
 
+IMPLEMENTATIONS_PACKAGE = "src.agents.implementations"
+IMPLEMENTATIONS_PATH = Path(__file__).parent / "implementations"
+
+
+class AgentRegistration(BaseModel):
+    """An agent class found in the implementations, with what can be derived from the class once."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    agent_class: type[BaseAgent]
+    config_type: Any
+
 
 class AgentLoader:
-    @staticmethod
+    """Registry of the agent classes in `implementations`, keyed by class name.
+
+    The implementations are imported once, on the first lookup or explicitly with `load` at startup, instead of on
+    every request. With `watch` the registry is rebuilt whenever an implementation changes, for development.
+    """
+
+    _registry: dict[str, AgentRegistration] | None = None
+
+    # Agents registered with `register`, kept across reloads
+    _extra_agents: dict[str, type[BaseAgent]] = {}
+
+    @classmethod
+    def load(cls) -> dict[str, AgentRegistration]:
+        """Import the implementations and (re)build the registry.
+
+        Returns:
+            dict[str, AgentRegistration]: The registered agents by class name.
+        """
+
+        registry: dict[str, AgentRegistration] = {}
+
+        for file in sorted(IMPLEMENTATIONS_PATH.glob("*.py")):
+            module_path = f"{IMPLEMENTATIONS_PACKAGE}.{file.stem}"
+
+            try:
+                module = (
+                    importlib.reload(sys.modules[module_path])
+                    if module_path in sys.modules
+                    else importlib.import_module(module_path)
+                )
+            except Exception as e:
+                logger.error(f"Failed to import module {module_path}: {e}")
+                continue
+
+            for _, obj in inspect.getmembers(module, inspect.isclass):
+                # Skip agents imported from another implementation module, they are registered from their own
+                if not issubclass(obj, BaseAgent) or obj is BaseAgent or obj.__module__ != module.__name__:
+                    continue
+
+                if obj.__name__ in registry:
+                    logger.warning(f"Agent class {obj.__name__} is defined more than once, using {module_path}")
+
+                registry[obj.__name__] = cls._register(obj)
+
+        for agent_class in cls._extra_agents.values():
+            registry[agent_class.__name__] = cls._register(agent_class)
+
+        cls._registry = registry
+
+        logger.info(f"Registered {len(registry)} agents: {', '.join(registry) or 'none'}")
+
+        return registry
+
+    @classmethod
+    def register(cls, agent_class: type[BaseAgent]) -> None:
+        """Register an agent class that is not part of `implementations`, e.g. for benchmarks and replays."""
+
+        cls._extra_agents[agent_class.__name__] = agent_class
+
+        if cls._registry is not None:
+            cls._registry[agent_class.__name__] = cls._register(agent_class)
+
+    @classmethod
+    def get_registration(cls, agent_class: str) -> AgentRegistration | None:
+        registry = cls._registry if cls._registry is not None else cls.load()
+
+        return registry.get(agent_class)
+
+    @classmethod
     def get_agent(
+        cls,
         agent_class: str,
         thread_id: str,
         agent_config: dict = EMPTY_AGENT_CONFIG,
         headers: dict = EMPTY_HEADERS,
     ) -> BaseAgent | None:
-        logger.debug(f"Attempting to load agent class: {agent_class}")
-        agents_dir = Path(__file__).parent / "implementations"
-        logger.debug(f"Scanning directory: {agents_dir}")
-
-        # Get all Python files in the agents directory
-        for file in agents_dir.glob("*.py"):
-            logger.debug(f"Examining file: {file.name}")
-            if file.name == "base_agent.py":
-                logger.debug("Skipping base_agent.py")
-                continue
+        registration = cls.get_registration(agent_class)
 
-            # Import the module
-            module_path = f"src.agents.implementations.{file.stem}"
-            logger.debug(f"Importing module: {module_path}")
-            try:
-                module = importlib.import_module(module_path)
-            except Exception as e:
-                logger.error(f"Failed to import module {module_path}: {e}")
-                continue
+        if registration is None:
+            logger.warning(f"No matching agent found for class: {agent_class}")
+            return None
 
-            # Find all classes in the module that inherit from BaseAgent
-            logger.debug(f"Scanning classes in {file.stem}")
-            for name, obj in inspect.getmembers(module):
-                logger.debug(f"Examining class: {name}")
-                if inspect.isclass(obj):
-                    logger.debug(f"Class {name} inheritance: {obj.__bases__}")
-                    if issubclass(obj, BaseAgent) and obj != BaseAgent and obj.__name__ == agent_class:
-                        logger.debug(f"Found matching agent class: {obj}")
-                        logger.debug(f"Initializing agent with config: {agent_config}")
-                        logger.debug(f"Headers: {headers}")
-                        return obj(thread_id=thread_id, request_headers=headers, **agent_config)
-
-        logger.warning(f"No matching agent found for class: {agent_class}")
-        return None
-
-    @staticmethod
-    def get_all_agents() -> list[type[BaseAgent]]:
-        agents_dir = Path(__file__).parent / "implementations"
-        agents = []
-        for file in agents_dir.glob("*.py"):
-            if file.name == "base_agent.py":
-                continue
-            module_path = f"src.agents.implementations.{file.stem}"
-            module = importlib.import_module(module_path)
-            for _, obj in inspect.getmembers(module):
-                if inspect.isclass(obj) and issubclass(obj, BaseAgent) and obj != BaseAgent:
-                    agents.append(obj)
-        return agents
+        return registration.agent_class(thread_id=thread_id, request_headers=headers, **agent_config)
+
+    @classmethod
+    def get_all_agents(cls) -> list[type[BaseAgent]]:
+        registry = cls._registry if cls._registry is not None else cls.load()
+
+        return [registration.agent_class for registration in registry.values()]
+
+    @classmethod
+    async def watch(cls) -> None:
+        """Rebuild the registry whenever a file in `implementations` changes, until cancelled.
+
+        Only meant for development: agents that are running keep their old class.
+        """
+
+        from watchfiles import awatch
+
+        logger.info(f"Watching {IMPLEMENTATIONS_PATH} for agent changes")
+
+        async for changes in awatch(IMPLEMENTATIONS_PATH):
+            logger.info(
+                f"Agent implementations changed, reloading: {', '.join(Path(path).name for _, path in changes)}"
+            )
+
+            # Importing runs module code, keep it off the event loop
+            await asyncio.to_thread(cls.load)
+
+    @classmethod
+    def _register(cls, agent_class: type[BaseAgent]) -> AgentRegistration:
+        return AgentRegistration(
+            agent_class=agent_class,
+            config_type=getattr(agent_class, "_config_type", None),
+        )
@@ -5,6 +5,7 @@ import logging
 import uuid
 from abc import abstractmethod
 from collections.abc import AsyncGenerator, Callable, Iterable, Sequence
+from functools import partial
 from types import UnionType
 from typing import (
     Any,
@@ -18,16 +19,27 @@ from openai import AsyncStream
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+from openai.types.chat.chat_completion_system_message_param import ChatCompletionSystemMessageParam
 from PIL import Image
 from prisma import Json
+from prisma.enums import message_content_type
 from prisma.models import documents, threads
 from pydantic import BaseModel, Field
 from weaviate.classes.query import Filter, MetadataQuery
 from weaviate.collections.classes.types import Properties
 from weaviate.collections.collection import CollectionAsync
 
-from src.agents.tools.base_tools import BaseTools
-from src.lib.openai import openai_client
+from src.agents.prompt_assembly import (
+    PromptSection,
+    assemble_system_message,
+    split_volatile_values,
+    supports_cache_control,
+)
+from src.agents.tool_executor import SpeculativeToolCalls, ToolCallExecutor
+from src.agents.tool_registry import ToolRegistry
+from src.agents.tools.base_tools import BaseTools, is_serial_tool
+from src.lib.llm_request_policy import PolicyStream
+from src.lib.openai import llm_client
 from src.lib.prisma import prisma
 from src.lib.supabase import create_supabase
 from src.lib.weaviate import weaviate_client
@@ -36,9 +48,13 @@ from src.models.chart_widget import ChartWidget
 from src.models.image_widget import ImageWidget
 from src.models.messages import MessageContent, TextContent, TextDeltaContent, ToolResultContent, ToolUseContent
 from src.models.multiple_choice_widget import MultipleChoiceWidget
+from src.models.prompt_usage import PromptUsage
 from src.models.stream_tool_call import StreamToolCall
+from src.services.messages.utils.compact_tool_outputs import compact_tool_outputs
 from src.services.one_signal.one_signal_service import OneSignalService
 from src.utils.image_to_base64 import image_to_base64
+from src.utils.tool_arguments import ToolArgumentsDecoder, ToolArgumentsError
+from src.utils.truncate import truncate
 
 TConfig = TypeVar("TConfig", bound=BaseModel)
 
@@ -56,13 +72,38 @@ class BaseAgent(Generic[TConfig]):
     _metadata: dict | None = None
     _onesignal_api_key: str | None = None
 
+    # Maximum number of tool calls from a single model response that run at the same time. The default keeps tool
+    # calls sequential; agents opt in to concurrent execution by raising it. Tools marked with `serial_tool` never
+    # overlap with other tool calls regardless of this setting.
+    max_concurrent_tool_calls: int = 1
+
+    # Start tool calls as soon as their arguments are complete, while the model is still streaming the rest of its
+    # response. Only enable this for agents whose non-serial tools are read-only: a speculatively started tool runs
+    # even if the stream fails afterwards.
+    speculative_tool_calls: bool = False
+
+    # Replace tool outputs older than this many turns with a short stub before calling `on_message`. Agents that
+    # enable this should offer `tool_get_tool_output` to the model, so it can still read a shortened output.
+    compact_tool_outputs_after_turns: int | None = None
+
+    # Shared by all agents, so its metrics cover every tool call of the process
+    tool_arguments_decoder = ToolArgumentsDecoder()
+
+    # Prompt values that change on (almost) every turn. `build_system_message` moves them behind the rest of the
+    # prompt, so the provider can reuse its cached prompt prefix between turns.
+    volatile_prompt_keys: tuple[str, ...] = ("current_time", "current_date", "notifications", "reminders", "memories")
+
     def __init__(self, thread_id: str, request_headers: dict, **kwargs: dict[str, Any]) -> None:
         self._raw_config = kwargs
         self.thread_id = thread_id
         self.request_headers = request_headers
 
+        # Input tokens of all model calls of this agent, streams only report usage with `stream_options`
+        # `{"include_usage": True}`
+        self.prompt_usage = PromptUsage()
+
         # Initialize the client
-        self.client = openai_client
+        self.client = llm_client
 
         self.on_init()
 
@@ -89,14 +130,14 @@ class BaseAgent(Generic[TConfig]):
         self,
         messages: Iterable[ChatCompletionMessageParam],
         retry_count: int = 0,
-    ) -> tuple[AsyncStream[ChatCompletionChunk] | ChatCompletion, list[Callable]]:
+    ) -> tuple[AsyncStream[ChatCompletionChunk] | PolicyStream | ChatCompletion, list[Callable] | ToolRegistry]:
         raise NotImplementedError()
 
     @abstractmethod
     async def on_super_agent_call(
         self,
         messages: Iterable[ChatCompletionMessageParam],
-    ) -> tuple[AsyncStream[ChatCompletionChunk] | ChatCompletion, list[Callable]] | None:
+    ) -> tuple[AsyncStream[ChatCompletionChunk] | PolicyStream | ChatCompletion, list[Callable] | ToolRegistry] | None:
         raise NotImplementedError()
 
     @abstractmethod
@@ -114,15 +155,48 @@ class BaseAgent(Generic[TConfig]):
     def super_agent_config() -> SuperAgentConfig[TConfig] | None:
         return None
 
+    def build_system_message(
+        self,
+        template: str,
+        values: dict[str, Any],
+        model: str,
+        extra_sections: Iterable[PromptSection] = (),
+    ) -> ChatCompletionSystemMessageParam:
+        """Render the system prompt so that its prefix stays the same between turns.
+
+        Args:
+            template (str): The `{{placeholder}}` template of the prompt.
+            values (dict[str, Any]): The values of the placeholders, those in `volatile_prompt_keys` are moved to the
+                end of the prompt.
+            model (str): The model the prompt is sent to, decides whether cache breakpoints are added.
+            extra_sections (Iterable[PromptSection]): Additional sections, e.g. role instructions as `session`.
+
+        Returns:
+            ChatCompletionSystemMessageParam: The system message.
+        """
+
+        return assemble_system_message(
+            [*split_volatile_values(template, values, self.volatile_prompt_keys), *extra_sections],
+            use_cache_control=supports_cache_control(model),
+        )
+
     async def forward_message(
         self, messages: Iterable[ChatCompletionMessageParam], retry_count: int = 0
     ) -> AsyncGenerator[tuple[MessageContent, bool], None]:
-        result, tools = await self.on_message(messages, retry_count)
+        if self.compact_tool_outputs_after_turns is not None:
+            messages = compact_tool_outputs(list(messages), self.compact_tool_outputs_after_turns)
+
+        result, agent_tools = await self.on_message(messages, retry_count)
+
+        if self.compact_tool_outputs_after_turns is not None and self.tool_get_tool_output not in agent_tools:
+            agent_tools = [*agent_tools, self.tool_get_tool_output]
+
+        tools = agent_tools if isinstance(agent_tools, ToolRegistry) else ToolRegistry(agent_tools)
 
         async for chunk, should_stop in (
-            self._handle_stream(result, tools, messages, retry_count)
-            if isinstance(result, AsyncStream)
-            else self._handle_completion(result, tools, messages, retry_count)
+            self._handle_completion(result, tools, messages, retry_count)
+            if isinstance(result, ChatCompletion)
+            else self._handle_stream(result, tools, messages, retry_count)
         ):
             yield chunk, should_stop
 
@@ -136,15 +210,36 @@ class BaseAgent(Generic[TConfig]):
         if result is None:
             return
 
-        result, tools = result
+        result, agent_tools = result
+        tools = agent_tools if isinstance(agent_tools, ToolRegistry) else ToolRegistry(agent_tools)
 
         async for chunk, should_stop in (
-            self._handle_stream(result, tools, messages)
-            if isinstance(result, AsyncStream)
-            else self._handle_completion(result, tools, messages)
+            self._handle_completion(result, tools, messages)
+            if isinstance(result, ChatCompletion)
+            else self._handle_stream(result, tools, messages)
         ):
             yield chunk, should_stop
 
+    async def tool_get_tool_output(self, tool_call_id: str) -> str:
+        """Get the full output of an earlier tool call whose output was shortened in the conversation.
+
+        Args:
+            tool_call_id (str): The ID of the tool call, as mentioned in the shortened output.
+        """
+
+        content = await prisma.message_contents.find_first(
+            where={
+                "tool_use_id": tool_call_id,
+                "type": message_content_type.tool_result,
+                "message": {"is": {"thread_id": self.thread_id}},
+            }
+        )
+
+        if content is None or content.tool_output is None:
+            raise ValueError(f"No output found for tool call {tool_call_id}")
+
+        return content.tool_output
+
     async def get_metadata(self, key: str, default: Any | None = None) -> Any:
         if self._metadata is None:
             self._metadata = dict((await self._get_thread()).metadata) or {}
@@ -333,12 +428,12 @@ If nothing relevant: "No relevant information found in the knowledge base."""
         return self._config_type(**kwargs)
 
     async def _handle_tool_call(
-        self, name: str, tool_call_id: str, arguments: dict[str, Any], tools: list[Callable]
+        self, name: str, tool_call_id: str, arguments: dict[str, Any], tools: ToolRegistry
     ) -> tuple[ToolResultContent, bool]:
-        try:
-            tool = next(tool for tool in tools if tool.__name__ == name)
-        except StopIteration as e:
-            raise ValueError(f"Tool {name} not found") from e
+        tool = tools.get(name)
+
+        if tool is None:
+            raise ValueError(f"Tool {name} not found")
 
         try:
             tool_call_result = await tool(**arguments) if asyncio.iscoroutinefunction(tool) else tool(**arguments)
@@ -453,40 +548,145 @@ If nothing relevant: "No relevant information found in the knowledge base."""
                 False,
             )
 
+    async def _run_tool_calls(
+        self,
+        tool_calls: Sequence[StreamToolCall],
+        tools: ToolRegistry,
+        messages: Iterable[ChatCompletionMessageParam],
+        executor: ToolCallExecutor[tuple[ToolResultContent, bool]] | None = None,
+        speculative_tool_calls: SpeculativeToolCalls[tuple[ToolResultContent, bool]] | None = None,
+    ) -> AsyncGenerator[tuple[MessageContent, bool], None]:
+        """Execute the tool calls of one model response and yield their use and result contents in call order.
+
+        Up to `max_concurrent_tool_calls` calls run at the same time. Calls that were already started while the
+        response was streaming are picked up from `speculative_tool_calls`. A super agent call acts as a barrier:
+        every earlier call is finished and yielded before the super agent runs, and later calls only start afterwards.
+        """
+
+        if executor is None:
+            executor = ToolCallExecutor(self.max_concurrent_tool_calls)
+
+        pending: list[tuple[ToolUseContent, asyncio.Task[tuple[ToolResultContent, bool]]]] = []
+
+        try:
+            for tool_call in tool_calls:
+                if tool_call.name == BaseTools.tool_call_super_agent.__name__:
+                    for tool_use, task in pending:
+                        yield tool_use, False
+                        yield await task
+
+                    pending.clear()
+
+                    async for chunk, should_stop in self.run_super_agent(messages):
+                        yield chunk, should_stop
+
+                    continue
+
+                try:
+                    input_data = self.tool_arguments_decoder.decode(tool_call.arguments)
+                except ToolArgumentsError as e:
+                    # Answer with an error the model can correct in one round instead of failing the whole turn
+                    self.logger.warning(f"Invalid arguments for tool {tool_call.name}: {tool_call.arguments!r}")
+
+                    input_data = {}
+                    task = executor.submit(partial(self._invalid_arguments_result, tool_call, e))
+                else:
+                    task = (
+                        speculative_tool_calls.pop(tool_call) if speculative_tool_calls is not None else None
+                    ) or executor.submit(
+                        partial(self._handle_tool_call, tool_call.name, tool_call.tool_call_id, input_data, tools),
+                        is_serial=self._is_serial_tool_call(tool_call.name, tools),
+                    )
+
+                pending.append(
+                    (
+                        ToolUseContent(
+                            id=str(uuid.uuid4()),
+                            tool_use_id=tool_call.tool_call_id,
+                            name=tool_call.name,
+                            input=input_data,
+                        ),
+                        task,
+                    )
+                )
+
+            for tool_use, task in pending:
+                yield tool_use, False
+                yield await task
+        finally:
+            executor.cancel()
+
+    async def _invalid_arguments_result(
+        self, tool_call: StreamToolCall, error: ToolArgumentsError
+    ) -> tuple[ToolResultContent, bool]:
+        return (
+            ToolResultContent(
+                id=str(uuid.uuid4()),
+                tool_use_id=tool_call.tool_call_id,
+                output=(
+                    f"Error: {error} Received: {truncate(tool_call.arguments, 500)!r}. Call {tool_call.name} again "
+                    "with its arguments as a single valid JSON object."
+                ),
+                is_error=True,
+            ),
+            False,
+        )
+
+    def _is_serial_tool_call(self, name: str, tools: ToolRegistry) -> bool:
+        tool = tools.get(name)
+
+        # Unknown tools fail in `_handle_tool_call`, run them serially so the failure surfaces in call order
+        return tool is None or is_serial_tool(tool)
+
     async def _handle_stream(
         self,
-        stream: AsyncStream[ChatCompletionChunk],
-        tools: list[Callable],
+        stream: AsyncStream[ChatCompletionChunk] | PolicyStream,
+        tools: ToolRegistry,
         messages: Iterable[ChatCompletionMessageParam],
         retry_count: int = 0,
     ) -> AsyncGenerator[tuple[MessageContent, bool], None]:
         final_tool_calls: dict[int, StreamToolCall] = {}
-        text_content: str | None = None
+        text_parts: list[str] = []
         text_id = str(uuid.uuid4())
         completion_id: str | None = None
 
+        executor: ToolCallExecutor[tuple[ToolResultContent, bool]] = ToolCallExecutor(self.max_concurrent_tool_calls)
+        speculative_tool_calls = (
+            SpeculativeToolCalls(
+                executor,
+                final_tool_calls,
+                can_speculate=lambda tool_call: tool_call.name != BaseTools.tool_call_super_agent.__name__
+                and not self._is_serial_tool_call(tool_call.name, tools),
+                create_run=lambda tool_call, arguments: partial(
+                    self._handle_tool_call, tool_call.name, tool_call.tool_call_id, arguments, tools
+                ),
+            )
+            if self.speculative_tool_calls
+            else None
+        )
+
         try:
             async for event in stream:
                 if completion_id is None:
                     completion_id = event.id
                     self.logger.info(f"CompletionId: {event.id}, ThreadId: {self.thread_id}")
 
-                if event.choices[0].delta.content is not None:
-                    text_content = (
-                        event.choices[0].delta.content
-                        if text_content is None
-                        else text_content + event.choices[0].delta.content
-                    )
+                if event.usage is not None:
+                    self.prompt_usage.add(event.usage)
 
-                    yield (
-                        TextDeltaContent(
-                            id=text_id,
-                            delta=event.choices[0].delta.content,
-                        ),
-                        False,
-                    )
+                # The usage is sent in a final chunk without choices
+                if not event.choices:
+                    continue
+
+                delta = event.choices[0].delta
 
-                for tool_call in event.choices[0].delta.tool_calls or []:
+                if delta.content is not None:
+                    text_parts.append(delta.content)
+
+                    # Deltas are built from already validated provider data, skip validation on this hot path
+                    yield TextDeltaContent.model_construct(id=text_id, delta=delta.content), False
+
+                for tool_call in delta.tool_calls or []:
                     index = tool_call.index
 
                     if tool_call.function is None or tool_call.function.arguments is None:
@@ -506,6 +706,11 @@ If nothing relevant: "No relevant information found in the knowledge base."""
                     else:
                         final_tool_calls[index].arguments += tool_call.function.arguments
 
+                    if speculative_tool_calls is not None:
+                        speculative_tool_calls.on_arguments(index, tool_call.function.arguments)
+
+            text_content = "".join(text_parts) if text_parts else None
+
             if text_content is not None:
                 yield (
                     TextContent(
@@ -515,26 +720,10 @@ If nothing relevant: "No relevant information found in the knowledge base."""
                     False,
                 )
 
-            for _, tool_call in final_tool_calls.items():
-                if tool_call.name == BaseTools.tool_call_super_agent.__name__:
-                    async for chunk, should_stop in self.run_super_agent(messages):
-                        yield chunk, should_stop
-
-                    continue
-
-                input_data = json.loads(tool_call.arguments or "{}")
-
-                yield (
-                    ToolUseContent(
-                        id=str(uuid.uuid4()),
-                        tool_use_id=tool_call.tool_call_id,
-                        name=tool_call.name,
-                        input=input_data,
-                    ),
-                    False,
-                )
-
-                yield await self._handle_tool_call(tool_call.name, tool_call.tool_call_id, input_data, tools)
+            async for chunk, should_stop in self._run_tool_calls(
+                list(final_tool_calls.values()), tools, messages, executor, speculative_tool_calls
+            ):
+                yield chunk, should_stop
 
             did_produce_content = len(final_tool_calls.items()) > 0 or (text_content and text_content.strip() != "")
 
@@ -548,16 +737,24 @@ If nothing relevant: "No relevant information found in the knowledge base."""
         except Exception as e:
             self.logger.error(f"Error in _handle_stream: {e}")
             raise e
+        finally:
+            executor.cancel()
+
+            # Releases the provider connection when the turn is cancelled before the response is complete
+            await stream.close()
 
     async def _handle_completion(
         self,
         completion: ChatCompletion,
-        tools: list[Callable],
+        tools: ToolRegistry,
         messages: Iterable[ChatCompletionMessageParam],
         retry_count: int = 0,
     ) -> AsyncGenerator[tuple[MessageContent, bool], None]:
         self.logger.info(f"CompletionId: {completion.id}, ThreadId: {self.thread_id}")
 
+        if completion.usage is not None:
+            self.prompt_usage.add(completion.usage)
+
         if len(completion.choices or []) == 0:
             raise ValueError(
                 "No choices found in completion, this usually means the messages weren't forwarded correctly"
@@ -574,26 +771,17 @@ If nothing relevant: "No relevant information found in the knowledge base."""
                 False,
             )
 
-        for tool_call in choice.message.tool_calls or []:
-            if tool_call.function.name == BaseTools.tool_call_super_agent.__name__:
-                async for chunk in self.run_super_agent(messages):
-                    yield chunk
-
-                continue
-
-            input_data = json.loads(tool_call.function.arguments or "{}")
-
-            yield (
-                ToolUseContent(
-                    id=str(uuid.uuid4()),
-                    tool_use_id=tool_call.id,
-                    name=tool_call.function.name,
-                    input=input_data,
-                ),
-                False,
+        tool_calls = [
+            StreamToolCall(
+                tool_call_id=tool_call.id,
+                name=tool_call.function.name,
+                arguments=tool_call.function.arguments,
             )
+            for tool_call in choice.message.tool_calls or []
+        ]
 
-            yield await self._handle_tool_call(tool_call.function.name, tool_call.id, input_data, tools)
+        async for chunk, should_stop in self._run_tool_calls(tool_calls, tools, messages):
+            yield chunk, should_stop
 
         did_produce_content = len(choice.message.tool_calls or []) > 0 or (
             choice.message.content and choice.message.content.strip() != ""
@@ -0,0 +1,112 @@
+from collections.abc import Iterable, Mapping
+from typing import Any, Literal, cast
+
+from openai.types.chat import ChatCompletionContentPartTextParam, ChatCompletionSystemMessageParam
+from pydantic import BaseModel
+
+from src.agents.prompt_template import compile_template
+
+PromptVolatility = Literal["static", "session", "turn"]
+
+_VOLATILITY_ORDER: dict[PromptVolatility, int] = {"static": 0, "session": 1, "turn": 2}
+
+# Providers on OpenRouter that only cache up to explicit `cache_control` breakpoints, others cache automatically
+_CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+class PromptSection(BaseModel):
+    """A part of the system prompt, together with how often it changes.
+
+    `static` content is identical for every thread of an agent config, `session` content changes between threads or
+    roles, and `turn` content changes on (almost) every turn, e.g. the current time.
+    """
+
+    content: str
+    volatility: PromptVolatility = "static"
+
+
+def supports_cache_control(model: str) -> bool:
+    return model.startswith(_CACHE_CONTROL_MODEL_PREFIXES)
+
+
+def split_volatile_values(
+    template: str,
+    values: Mapping[str, Any],
+    volatile_keys: Iterable[str],
+    context_title: str = "Current context",
+) -> list[PromptSection]:
+    """Render a template with its volatile values moved out of the prompt body into a trailing section.
+
+    Placeholders of volatile keys are replaced by a reference to the trailing section, so the rendered body only
+    changes when a static value changes and the provider can reuse its cached prefix across turns.
+
+    Args:
+        template (str): The `{{placeholder}}` template.
+        values (Mapping[str, Any]): The values of the placeholders.
+        volatile_keys (Iterable[str]): The keys whose values change between turns.
+        context_title (str): The heading of the trailing section.
+
+    Returns:
+        list[PromptSection]: The static body followed by the volatile context.
+    """
+
+    compiled = compile_template(template)
+    volatile = [key for key in volatile_keys if key in values and key in compiled.keys]
+    body_values = {
+        **values,
+        **{key: f"[{key}: see '{context_title}' at the end of these instructions]" for key in volatile},
+    }
+
+    sections = [PromptSection(content=compiled.render(body_values))]
+
+    if volatile:
+        sections.append(
+            PromptSection(
+                content=f"# {context_title}\n\n" + "\n\n".join(f"## {key}\n{values[key]}" for key in volatile),
+                volatility="turn",
+            )
+        )
+
+    return sections
+
+
+def assemble_system_message(
+    sections: Iterable[PromptSection],
+    use_cache_control: bool,
+) -> ChatCompletionSystemMessageParam:
+    """Build the system message with its sections ordered from static to volatile.
+
+    With `use_cache_control`, a cache breakpoint is set at the end of the static and the session part, so the
+    provider caches them separately and a new role or thread only invalidates the session part. Without it the
+    sections are joined into a single string, which keeps the prefix stable for providers that cache automatically.
+
+    Args:
+        sections (Iterable[PromptSection]): The sections of the prompt, in any order.
+        use_cache_control (bool): Whether the model needs explicit `cache_control` breakpoints.
+
+    Returns:
+        ChatCompletionSystemMessageParam: The system message.
+    """
+
+    ordered = sorted(
+        (section for section in sections if section.content), key=lambda s: _VOLATILITY_ORDER[s.volatility]
+    )
+
+    if not use_cache_control:
+        return ChatCompletionSystemMessageParam(
+            role="system", content="\n\n".join(section.content for section in ordered)
+        )
+
+    parts: list[ChatCompletionContentPartTextParam] = []
+
+    for index, section in enumerate(ordered):
+        part = ChatCompletionContentPartTextParam(type="text", text=section.content)
+
+        is_last_of_volatility = index + 1 == len(ordered) or ordered[index + 1].volatility != section.volatility
+
+        if is_last_of_volatility and section.volatility != "turn":
+            cast(dict[str, Any], part)["cache_control"] = {"type": "ephemeral"}
+
+        parts.append(part)
+
+    return ChatCompletionSystemMessageParam(role="system", content=parts)
@@ -0,0 +1,88 @@
+import re
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any
+
+_PLACEHOLDER_PATTERN = re.compile(r"\{\{([^}]+)\}\}")
+
+
+class CompiledTemplate:
+    """A `{{placeholder}}` template parsed into its literal segments and placeholder keys.
+
+    Rendering joins the segments with the values in a single pass, instead of scanning the whole template once per
+    value. Placeholders without a value are rendered as `[missing:key]`, like the agents have always done.
+    """
+
+    __slots__ = ("_literals", "_keys", "keys")
+
+    def __init__(self, template: str) -> None:
+        # `split` with one capturing group alternates literals and keys, starting and ending with a literal
+        parts = _PLACEHOLDER_PATTERN.split(template)
+
+        self._literals: tuple[str, ...] = tuple(parts[0::2])
+        self._keys: tuple[str, ...] = tuple(parts[1::2])
+        self.keys: frozenset[str] = frozenset(self._keys)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """Render the template.
+
+        Args:
+            values (Mapping[str, Any]): The values of the placeholders, converted with `str`.
+
+        Returns:
+            str: The rendered template.
+        """
+
+        literals = self._literals
+        parts = [literals[0]]
+
+        for index, key in enumerate(self._keys):
+            parts.append(str(values[key]) if key in values else f"[missing:{key}]")
+            parts.append(literals[index + 1])
+
+        return "".join(parts)
+
+    def missing_keys(self, values: Mapping[str, Any]) -> list[str]:
+        """Get the placeholders of the template that have no value, in order of first occurrence."""
+
+        return [key for key in dict.fromkeys(self._keys) if key not in values]
+
+    def partial(self, values: Mapping[str, Any]) -> "CompiledTemplate":
+        """Bind some placeholders ahead of time, e.g. values that only change with the agent config.
+
+        Args:
+            values (Mapping[str, Any]): The values to bind, placeholders without a value stay placeholders.
+
+        Returns:
+            CompiledTemplate: A template with only the unbound placeholders left.
+        """
+
+        bound = CompiledTemplate.__new__(CompiledTemplate)
+        literals = [self._literals[0]]
+        keys: list[str] = []
+
+        for index, key in enumerate(self._keys):
+            if key in values:
+                literals[-1] += str(values[key]) + self._literals[index + 1]
+            else:
+                keys.append(key)
+                literals.append(self._literals[index + 1])
+
+        bound._literals = tuple(literals)
+        bound._keys = tuple(keys)
+        bound.keys = frozenset(keys)
+
+        return bound
+
+
+# Agent configs are parsed again on every access, caching by the template text reuses the parse across turns and
+# threads until the config itself changes
+@lru_cache(maxsize=256)
+def compile_template(template: str) -> CompiledTemplate:
+    return CompiledTemplate(template)
+
+
+def render_template(template: str, values: Mapping[str, Any]) -> str:
+    """Render a `{{placeholder}}` template, compiling it on first use."""
+
+    return compile_template(template).render(values)
@@ -0,0 +1,145 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any, Generic, TypeVar
+
+from src.models.stream_tool_call import StreamToolCall
+from src.utils.incremental_json import IncrementalJsonScanner
+from src.utils.tool_arguments import ToolArgumentsError, decode_tool_arguments
+
+T = TypeVar("T")
+
+
+class ToolCallExecutor(Generic[T]):
+    """Schedules the tool calls of a single model response.
+
+    Every submitted call starts as soon as its dependencies allow it, bounded by `max_concurrency`. A serial call
+    waits for every call submitted before it and blocks every call submitted after it, so tools that mutate state
+    never overlap with other tools. Callers await the returned tasks in submission order to keep the output order
+    identical to the order in which the model emitted the calls.
+    """
+
+    def __init__(self, max_concurrency: int = 1) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: list[asyncio.Task[T]] = []
+        self._last_serial_task: asyncio.Task[T] | None = None
+
+    def submit(self, run: Callable[[], Awaitable[T]], is_serial: bool = False) -> asyncio.Task[T]:
+        """Schedule a tool call and return the task that resolves to its result."""
+
+        if is_serial:
+            dependencies = list(self._tasks)
+        else:
+            dependencies = [self._last_serial_task] if self._last_serial_task is not None else []
+
+        task = asyncio.create_task(self._run(run, dependencies))
+
+        self._tasks.append(task)
+
+        if is_serial:
+            self._last_serial_task = task
+
+        return task
+
+    def cancel(self) -> None:
+        """Cancel every call that has not finished yet."""
+
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+
+    async def _run(self, run: Callable[[], Awaitable[T]], dependencies: list[asyncio.Task[T]]) -> T:
+        if dependencies:
+            # Failures of earlier calls surface when the caller awaits their own task, not here
+            await asyncio.wait(dependencies)
+
+        async with self._semaphore:
+            return await run()
+
+
+class SpeculativeToolCalls(Generic[T]):
+    """Starts tool calls while the model response is still streaming.
+
+    A call counts as complete once its arguments form a closed JSON object or the model starts the next call. Calls
+    are started in index order for as long as every earlier call was started too; the first call that `can_speculate`
+    rejects (or whose arguments do not parse) ends speculation for the rest of the response, so speculation never
+    moves a call ahead of a serial tool.
+    """
+
+    def __init__(
+        self,
+        executor: ToolCallExecutor[T],
+        tool_calls: Mapping[int, StreamToolCall],
+        can_speculate: Callable[[StreamToolCall], bool],
+        create_run: Callable[[StreamToolCall, dict[str, Any]], Callable[[], Awaitable[T]]],
+    ) -> None:
+        self._executor = executor
+        self._tool_calls = tool_calls
+        self._can_speculate = can_speculate
+        self._create_run = create_run
+
+        self._order: list[int] = []
+        self._scanners: dict[int, IncrementalJsonScanner] = {}
+        self._completed: set[int] = set()
+        self._started: dict[str, tuple[str, asyncio.Task[T]]] = {}
+        self._position = 0
+        self._is_open = True
+
+    def on_arguments(self, index: int, fragment: str) -> None:
+        """Register an argument fragment of the call at `index` and start every call that became ready."""
+
+        if not self._is_open:
+            return
+
+        if index not in self._scanners:
+            # The model only moves on to the next call once the arguments of every earlier call are final
+            self._completed.update(self._order)
+            self._order.append(index)
+            self._scanners[index] = IncrementalJsonScanner()
+
+        if self._scanners[index].feed(fragment):
+            self._completed.add(index)
+
+        self._start_ready()
+
+    def pop(self, tool_call: StreamToolCall) -> asyncio.Task[T] | None:
+        """Return the task started for `tool_call`, or None if it was not started with its final arguments."""
+
+        started = self._started.pop(tool_call.tool_call_id, None)
+
+        if started is None:
+            return None
+
+        arguments, task = started
+
+        if arguments != tool_call.arguments:
+            task.cancel()
+            return None
+
+        return task
+
+    def _start_ready(self) -> None:
+        while self._is_open and self._position < len(self._order):
+            index = self._order[self._position]
+
+            if index not in self._completed or index not in self._tool_calls:
+                return
+
+            tool_call = self._tool_calls[index]
+
+            try:
+                arguments, _ = decode_tool_arguments(tool_call.arguments)
+            except ToolArgumentsError:
+                arguments = None
+
+            if arguments is None or not self._can_speculate(tool_call):
+                self._is_open = False
+                return
+
+            self._started[tool_call.tool_call_id] = (
+                tool_call.arguments,
+                self._executor.submit(self._create_run(tool_call, arguments)),
+            )
+            self._position += 1
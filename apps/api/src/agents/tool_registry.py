@@ -0,0 +1,43 @@
+from collections.abc import Callable, Iterable, Iterator
+
+from openai.types.chat import ChatCompletionToolParam
+
+from src.utils.function_to_openai_tool import function_to_openai_tool
+
+
+class ToolRegistry:
+    """The tools offered to the model in one agent call, indexed by name.
+
+    Schemas come from the `function_to_openai_tool` cache, so building a registry from freshly created closures on
+    every call only costs a dict lookup per tool after the first call.
+    """
+
+    def __init__(self, tools: Iterable[Callable]) -> None:
+        self._tools: dict[str, Callable] = {}
+
+        for tool in tools:
+            # The first definition wins, as it did with the previous linear lookup
+            self._tools.setdefault(tool.__name__, tool)
+
+        self._openai_tools: list[ChatCompletionToolParam] | None = None
+
+    def get(self, name: str) -> Callable | None:
+        return self._tools.get(name)
+
+    @property
+    def openai_tools(self) -> list[ChatCompletionToolParam]:
+        """The `tools` parameter of a chat completion request for these tools."""
+
+        if self._openai_tools is None:
+            self._openai_tools = [function_to_openai_tool(tool) for tool in self._tools.values()]
+
+        return self._openai_tools
+
+    def __contains__(self, tool: object) -> bool:
+        return callable(tool) and self._tools.get(getattr(tool, "__name__", "")) == tool
+
+    def __iter__(self) -> Iterator[Callable]:
+        return iter(self._tools.values())
+
+    def __len__(self) -> int:
+        return len(self._tools)
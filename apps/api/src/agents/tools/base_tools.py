@@ -1,5 +1,22 @@
 from abc import ABC, abstractmethod
 from collections.abc import Callable
+from typing import TypeVar
+
+TCallable = TypeVar("TCallable", bound=Callable)
+
+
+def serial_tool(func: TCallable) -> TCallable:
+    """Mark a tool as mutating state, so it never runs at the same time as other tool calls of the same turn."""
+
+    func.__serial_tool__ = True  # type: ignore[attr-defined]
+
+    return func
+
+
+def is_serial_tool(tool: Callable) -> bool:
+    """Whether the tool was marked with `serial_tool`. Bound methods resolve the marker on their function."""
+
+    return getattr(tool, "__serial_tool__", False) is True
 
 
 class BaseTools(ABC):
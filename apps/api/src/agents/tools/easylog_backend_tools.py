@@ -4,7 +4,7 @@ from datetime import date
 
 from dateutil import parser
 
-from src.agents.tools.base_tools import BaseTools
+from src.agents.tools.base_tools import BaseTools, serial_tool
 from src.services.easylog.easylog_backend_service import EasylogBackendService
 from src.services.easylog.schemas import (
     CreateMultipleAllocations,
@@ -94,6 +94,7 @@ class EasylogBackendTools(BaseTools):
 
         return project.model_dump_json(exclude_none=True)
 
+    @serial_tool
     async def tool_update_planning_project(
         self,
         project_id: int,
@@ -167,6 +168,7 @@ class EasylogBackendTools(BaseTools):
 
         return phase.model_dump_json(exclude_none=True)
 
+    @serial_tool
     async def tool_update_planning_phase(
         self,
         phase_id: int,
@@ -191,6 +193,7 @@ class EasylogBackendTools(BaseTools):
 
         return await self.tool_get_planning_phase(phase_id)
 
+    @serial_tool
     async def tool_create_planning_phase(
         self,
         project_id: int,
@@ -262,6 +265,7 @@ class EasylogBackendTools(BaseTools):
 
         return resource_groups.model_dump_json(exclude_none=True)
 
+    @serial_tool
     async def tool_create_multiple_allocations(
         self,
         project_id: int,
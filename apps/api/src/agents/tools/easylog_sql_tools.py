@@ -1,6 +1,6 @@
 from collections.abc import Callable
 
-from src.agents.tools.base_tools import BaseTools
+from src.agents.tools.base_tools import BaseTools, serial_tool
 from src.services.easylog.easylog_sql_service import EasylogSqlService
 
 
@@ -33,6 +33,7 @@ class EasylogSqlTools(BaseTools):
     def all_tools(self) -> list[Callable]:
         return [self.tool_execute_query]
 
+    @serial_tool
     async def tool_execute_query(self, query: str) -> str:
         if not self.db:
             raise ValueError("Database not connected")
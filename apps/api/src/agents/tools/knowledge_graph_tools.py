@@ -6,7 +6,7 @@ from collections.abc import Callable
 
 from pydantic import BaseModel
 
-from src.agents.tools.base_tools import BaseTools
+from src.agents.tools.base_tools import BaseTools, serial_tool
 from src.lib.graphiti import get_graphiti_connection
 
 
@@ -22,6 +22,7 @@ class KnowledgeGraphTools(BaseTools):
             self.tool_search_knowledge_base,
         ]
 
+    @serial_tool
     async def tool_store_episode(self, conversation_summary: str, episode_body: str) -> None:
         """Store a new episode in the knowledge graph.
 
@@ -0,0 +1,82 @@
+from collections.abc import Awaitable, Callable
+
+from fastapi import Header, HTTPException, Request, Response
+from prisma.models import threads
+
+from src.lib.prisma import prisma
+from src.services.threads.session_service import SessionService
+from src.utils.etag import etag_matches, make_etag
+from src.utils.is_valid_uuid import is_valid_uuid
+
+
+class ThreadRead:
+    """The thread a read request is about, and the ETag of the response."""
+
+    def __init__(self, thread: threads | None, etag: str | None) -> None:
+        self.thread = thread
+        self.etag = etag
+
+
+def conditional_thread_read(path_param: str = "thread_id") -> Callable[..., Awaitable[ThreadRead]]:
+    """Create a dependency for routes that read a thread, answering `If-None-Match` requests without loading it.
+
+    The dependency resolves the thread from the internal or external ID in `path_param` and adds a welcome message
+    when one is due. The ETag is derived from the request URL, the `updated_at` of the thread and the ID and
+    `updated_at` of its last message, so it changes with every message that is added or changed, and with metadata
+    changes and deletions, which touch the thread. When it matches the request is answered with 304 before any
+    message or content rows are loaded, otherwise the ETag header is set on the response of the route.
+
+    Args:
+        path_param (str): The name of the path parameter with the ID of the thread.
+
+    Returns:
+        Callable[..., Awaitable[ThreadRead]]: The dependency. Its `thread` is None if the thread does not exist.
+    """
+
+    async def dependency(
+        request: Request,
+        response: Response,
+        if_none_match: str | None = Header(default=None),
+    ) -> ThreadRead:
+        thread_id = request.path_params[path_param]
+        thread = await prisma.threads.find_first(
+            where={"id": thread_id} if is_valid_uuid(thread_id) else {"external_id": thread_id}
+        )
+
+        if thread is None:
+            return ThreadRead(None, None)
+
+        welcome = await SessionService.ensure_welcome_message(thread)
+
+        if welcome is not None:
+            _, thread = welcome
+
+        rows = await prisma.query_raw(
+            """
+            SELECT id, updated_at
+            FROM messages
+            WHERE thread_id = $1::uuid
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+            """,
+            thread.id,
+        )
+        last_message = rows[0] if rows else {}
+
+        etag = make_etag(
+            request.url.path,
+            request.url.query,
+            thread.id,
+            thread.updated_at.isoformat(),
+            last_message.get("id"),
+            last_message.get("updated_at"),
+        )
+
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+
+        return ThreadRead(thread, etag)
+
+    return dependency
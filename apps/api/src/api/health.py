@@ -3,11 +3,17 @@ from typing import Literal
 
 from fastapi import APIRouter, HTTPException
 
+from src.agents.base_agent import BaseAgent
 from src.lib.graphiti import get_graphiti_connection
+from src.lib.openai import llm_client
 from src.lib.prisma import prisma
 from src.lib.weaviate import weaviate_client
 from src.models.health import HealthResponse
+from src.models.history_cache import HistoryCacheMetrics
+from src.models.llm_metrics import ModelLatencyMetrics
+from src.models.tool_arguments import ToolArgumentsMetrics
 from src.services.easylog.easylog_sql_service import EasylogSqlService
+from src.services.messages.message_service import MessageService
 from src.settings import settings
 
 router = APIRouter()
@@ -79,3 +85,36 @@ async def health() -> HealthResponse:
     )
 
     return HealthResponse(api="healthy", main_db=main_db, easylog_db=easylog_db, neo4j=neo4j, weaviate=weaviate)
+
+
+@router.get(
+    "/health/history-cache",
+    name="history_cache_metrics",
+    tags=["health"],
+    response_model=HistoryCacheMetrics,
+    description="Returns the hit and miss counters of the in-process thread history cache.",
+)
+async def history_cache_metrics() -> HistoryCacheMetrics:
+    return MessageService.history_cache.metrics()
+
+
+@router.get(
+    "/health/tool-arguments",
+    name="tool_arguments_metrics",
+    tags=["health"],
+    response_model=ToolArgumentsMetrics,
+    description="Returns how often the arguments of tool calls had to be repaired or could not be decoded.",
+)
+async def tool_arguments_metrics() -> ToolArgumentsMetrics:
+    return BaseAgent.tool_arguments_decoder.metrics()
+
+
+@router.get(
+    "/health/llm",
+    name="llm_metrics",
+    tags=["health"],
+    response_model=list[ModelLatencyMetrics],
+    description="Returns the time to first token and throughput histograms and the retry and hedge counters per model.",
+)
+async def llm_metrics() -> list[ModelLatencyMetrics]:
+    return llm_client.metrics()
@@ -1,228 +1,62 @@
 import json
-import re
 from collections.abc import AsyncGenerator
-from datetime import datetime
-from typing import Literal
+from datetime import UTC, datetime
+from typing import Annotated, Literal
 
-import pytz
-from fastapi import APIRouter, HTTPException, Path, Query, Request, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from prisma import Json
+from prisma.types import messagesWhereInput
 
+from src.api.dependencies import ThreadRead, conditional_thread_read
+from src.lib.file_storage import FileNotFoundInStorageError
 from src.lib.prisma import prisma
 from src.logger import logger
 from src.models.chart_widget import ChartWidget
 from src.models.message_create import MessageCreateInput
-from src.models.messages import MessageResponse
+from src.models.messages import FileContent, MessageContent, MessageResponse, TextDeltaContent
 from src.models.multiple_choice_widget import MultipleChoiceWidget
 from src.models.pagination import Pagination
+from src.services.messages.file_contents import load_file_data
+from src.services.messages.history_summary_service import HistorySummaryService
 from src.services.messages.message_service import MessageService
 from src.services.messages.utils.db_message_to_message_model import (
     db_message_to_message_model,
+    file_param,
 )
+from src.services.turns.turn_service import TurnAlreadyRunningError, TurnService
+from src.settings import settings
+from src.utils.coalesce_text_deltas import coalesce_text_deltas
+from src.utils.cursor import InvalidCursorError, decode_cursor, encode_cursor, keyset_where
 from src.utils.is_valid_uuid import is_valid_uuid
-from src.utils.sse import create_sse_event
+from src.utils.sse import create_sse_event, text_delta_json
 
 router = APIRouter()
 
+MAX_SSE_CHUNK_SIZE = 4000
 
-async def _ensure_welcome_message(
-    thread_id: str, external_id: str | None
-) -> None:
-    """Ensure thread has a welcome message if it's a new/expired session.
-
-    Two-tier welcome system:
-    1. First visit (empty thread): Full onboarding message
-    2. Return visit (24h+ inactive): Personalized "welcome back" with name
-
-    Args:
-        thread_id: The thread ID
-        external_id: The external ID (used to determine agent_class)
-    """
-    # Map external_id patterns to agent_class
-    # NOTE: Order matters - more specific patterns first!
-    agent_class_map = {
-        "mumc-server-test": "MUMCAgentTest",  # Test environment
-        "mumc-server": "MUMCAgent",            # Production environment
-        # Add more agents here when needed
-    }
-
-    # Determine agent_class from external_id
-    agent_class = None
-    if external_id:
-        for pattern, cls in agent_class_map.items():
-            if pattern in external_id:
-                agent_class = cls
-                break
-
-    if not agent_class:
-        # No mapping found, skip welcome message
-        return
-
-    # Get thread with messages
-    thread = await prisma.threads.find_unique(
-        where={"id": thread_id},
-        include={"messages": True},
-    )
 
-    if not thread:
-        return
-
-    # Get metadata
-    metadata = dict(thread.metadata) if thread.metadata else {}
-    last_interaction = metadata.get("last_interaction_time")
-    last_welcome_date = metadata.get("last_welcome_date")
-
-    # Current time
-    current_time = datetime.now(pytz.timezone("Europe/Amsterdam"))
-    current_date = current_time.date().isoformat()
-
-    # Configuration
-    SESSION_TIMEOUT_MINUTES = 240  # 4 hours = 240 minutes
-
-    # Determine if we should add welcome message
-    should_add_welcome = False
-    welcome_reason = ""
-    welcome_text = ""
-    is_welcome_back = False
-
-    # Scenario 1: Empty thread (first visit)
-    if len(thread.messages or []) == 0:
-        if last_interaction is None:
-            # First time ever
-            should_add_welcome = True
-            welcome_reason = "first_time"
-            welcome_text = (
-                "👋 Hallo!\n\n"
-                "Welkom bij de 1e testversie van de nieuwe "
-                "E-Supporter app van Easylog en het MUMC+.\n\n"
-                "Zullen we beginnen met testen?"
-            )
+def create_content_sse_events(chunk: MessageContent, chunk_id: int) -> list[str]:
+    """Encode a content chunk as SSE events, splitting payloads larger than `MAX_SSE_CHUNK_SIZE`."""
 
-    # Scenario 2: Thread has messages - check for "welcome back"
-    elif last_interaction:
-        try:
-            last_time = datetime.fromisoformat(last_interaction)
-            time_diff = current_time - last_time
-            inactive_minutes = time_diff.total_seconds() / 60
-
-            # Check if enough time has passed (4 hours)
-            # Always show welcome back after timeout, even if shown earlier today
-            if inactive_minutes > SESSION_TIMEOUT_MINUTES:
-                should_add_welcome = True
-                is_welcome_back = True
-                welcome_reason = f"welcome_back_{inactive_minutes:.0f}min"
-
-                # Extract user name from memories if available
-                memories = metadata.get("memories", [])
-                user_name = None
-
-                # Memories is a list of {"id": "...", "memory": "text"}
-                # Search for name in memory text with multiple patterns
-                if isinstance(memories, list):
-                    for mem in memories:
-                        if not isinstance(mem, dict):
-                            continue
-                        memory_text = mem.get("memory", "").strip()
-                        memory_lower = memory_text.lower()
-
-                        # Remove timestamp from memory (datum: YYYY-MM-DD HH:MM)
-                        memory_text_clean = re.sub(
-                            r'\s*\(datum:\s*[^)]+\)\s*', '', memory_text
-                        ).strip()
-
-                        # Pattern 1: "[naam]" as entire memory
-                        if (
-                            memory_text_clean.startswith("[")
-                            and memory_text_clean.endswith("]")
-                        ):
-                            user_name = memory_text_clean[1:-1].strip()
-                            break
-                        # Pattern 2: "naam: John" or "naam : John"
-                        elif (
-                            "naam" in memory_lower
-                            and ":" in memory_text_clean
-                        ):
-                            parts = memory_text_clean.split(":", 1)
-                            if "naam" in parts[0].lower():
-                                user_name = parts[1].split(",")[0].strip()
-                                break
-                        # Pattern 3: Just the name (short text, capital)
-                        elif (
-                            len(memory_text_clean.split()) <= 3
-                            and memory_text_clean[0].isupper()
-                            and not any(
-                                x in memory_lower
-                                for x in [
-                                    "goal",
-                                    "zlm",
-                                    "score",
-                                    "stappen",
-                                    "medicatie",
-                                ]
-                            )
-                        ):
-                            user_name = memory_text_clean
-                            break
-
-                    logger.info(
-                        f"Thread {thread_id} - found {len(memories)} "
-                        f"memories, extracted name: '{user_name or 'None'}'"
-                    )
-
-                # Build personalized welcome back message
-                if user_name:
-                    welcome_text = (
-                        f"👋 Hallo {user_name}!\n\n"
-                        "Fijn dat je er weer bent. "
-                        "Hoe gaat het vandaag met je?"
-                    )
-                else:
-                    welcome_text = (
-                        "👋 Hallo!\n\n"
-                        "Fijn dat je er weer bent. "
-                        "Hoe gaat het vandaag met je?"
-                    )
-        except Exception as e:
-            logger.warning(
-                f"Error parsing last_interaction_time for thread "
-                f"{thread_id}: {e}"
-            )
+    # Text deltas are the bulk of every stream, encode them without a pydantic serialization pass
+    data = text_delta_json(chunk.id, chunk.delta) if isinstance(chunk, TextDeltaContent) else chunk.model_dump_json()
 
-    # Add welcome message if needed
-    if should_add_welcome:
-        logger.info(
-            f"Adding welcome message to thread {thread_id} "
-            f"(reason: {welcome_reason}, agent: {agent_class}, "
-            f"welcome_back: {is_welcome_back})"
-        )
+    if len(data) <= MAX_SSE_CHUNK_SIZE:
+        return [create_sse_event("content", data)]
 
-        # Create welcome message
-        welcome_msg = await prisma.messages.create(
-            data={
-                "thread_id": thread_id,
-                "role": "assistant",
-                "agent_class": agent_class,
-            }
-        )
+    events = [create_sse_event("content_start", json.dumps({"chunk_id": chunk_id}))]
 
-        # Add text content
-        await prisma.message_contents.create(
-            data={
-                "message_id": welcome_msg.id,
-                "type": "text",
-                "text": welcome_text,
-            }
+    while len(data) > MAX_SSE_CHUNK_SIZE:
+        events.append(
+            create_sse_event("content_delta", json.dumps({"chunk_id": chunk_id, "delta": data[:MAX_SSE_CHUNK_SIZE]}))
         )
 
-        # Update metadata
-        metadata["last_interaction_time"] = current_time.isoformat()
-        if is_welcome_back:
-            metadata["last_welcome_date"] = current_date
+        data = data[MAX_SSE_CHUNK_SIZE:]
 
-        await prisma.threads.update(
-            where={"id": thread_id}, data={"metadata": Json(metadata)}
-        )
+    events.append(create_sse_event("content_delta", json.dumps({"chunk_id": chunk_id, "delta": data})))
+    events.append(create_sse_event("content_end", json.dumps({"chunk_id": chunk_id})))
+
+    return events
 
 
 @router.get(
@@ -230,9 +64,13 @@ async def _ensure_welcome_message(
     name="get_messages",
     tags=["messages"],
     response_model=Pagination[MessageResponse],
+    responses={
+        304: {"description": "The messages did not change since the version in `If-None-Match`"},
+    },
     description="Retrieves all messages for a given thread. Returns a list of all messages by default in descending chronological order (newest first).",
 )
 async def get_messages(
+    read: Annotated[ThreadRead, Depends(conditional_thread_read("thread_id"))],
     thread_id: str = Path(
         ...,
         description="The unique identifier of the thread. Can be either the internal ID or external ID.",
@@ -240,28 +78,28 @@ async def get_messages(
     limit: int = Query(default=10, ge=1),
     offset: int = Query(default=0, ge=0),
     order: Literal["asc", "desc"] = Query(default="asc"),
+    cursor: str | None = Query(
+        default=None,
+        description="The `next_cursor` of the previous page, pages stay stable while messages are added.",
+    ),
 ) -> Pagination[MessageResponse]:
-    # First, get thread to extract external_id
-    thread = await prisma.threads.find_first(
-        where=(
-            {"id": thread_id}
-            if is_valid_uuid(thread_id)
-            else {"external_id": thread_id}
-        )
-    )
+    if cursor is not None and offset > 0:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset")
+
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
-    if thread:
-        # Ensure welcome message exists for new/expired sessions
-        await _ensure_welcome_message(thread.id, thread.external_id)
+    if read.thread is None:
+        return Pagination(data=[], limit=limit, offset=offset)
 
-    # Now fetch messages (may include newly added welcome message)
+    where: messagesWhereInput = {"thread_id": read.thread.id}
+
+    # The welcome message, if one was due, was added by the dependency
     messages = await prisma.messages.find_many(
-        where=(
-            {"thread_id": thread_id}
-            if is_valid_uuid(thread_id)
-            else {"thread": {"is": {"external_id": thread_id}}}
-        ),
-        order=[{"created_at": order}],
+        where={"AND": [where, keyset_where(after, order)]} if after is not None else where,  # type: ignore[list-item]
+        order=[{"created_at": order}, {"id": order}],
         include={"contents": True},
         take=limit,
         skip=offset,
@@ -269,7 +107,12 @@ async def get_messages(
 
     message_data = [db_message_to_message_model(message) for message in messages]
 
-    return Pagination(data=message_data, limit=limit, offset=offset)
+    return Pagination(
+        data=message_data,
+        limit=limit,
+        offset=offset,
+        next_cursor=encode_cursor(messages[-1].created_at, messages[-1].id) if len(messages) == limit else None,
+    )
 
 
 @router.post(
@@ -277,7 +120,7 @@ async def get_messages(
     name="create_message",
     tags=["messages"],
     response_description="A stream of JSON-encoded message chunks",
-    description="Creates a new message in the given thread. Will interact with the agent and return a stream of message chunks.",
+    description="Creates a new message in the given thread. Will interact with the agent and return a stream of message chunks. Fails with 409 while the thread already has a running turn.",
 )
 async def create_message(
     message: MessageCreateInput,
@@ -286,6 +129,10 @@ async def create_message(
         ...,
         description="The unique identifier of the thread. Can be either the internal ID or external ID.",
     ),
+    stream_mode: Literal["coalesced", "per_token"] = Query(
+        default="coalesced",
+        description="`coalesced` merges consecutive text deltas into fewer events, `per_token` sends every token.",
+    ),
 ) -> StreamingResponse:
     thread = await prisma.threads.find_first(
         where={"id": thread_id} if is_valid_uuid(thread_id) else {"external_id": thread_id},
@@ -306,48 +153,121 @@ async def create_message(
     )
 
     async def stream() -> AsyncGenerator[str, None]:
-        max_chunk_size = 4000
         chunk_count = 0
 
+        chunks = (
+            coalesce_text_deltas(
+                forward_message_generator,
+                max_delay=settings.SSE_COALESCE_MAX_DELAY_MS / 1000,
+                max_chars=settings.SSE_COALESCE_MAX_CHARS,
+            )
+            if stream_mode == "coalesced"
+            else forward_message_generator
+        )
+
         try:
-            async for chunk in forward_message_generator:
+            async for chunk in chunks:
                 if isinstance(chunk, MessageResponse):
                     yield create_sse_event("message", chunk.model_dump_json())
                     continue
 
-                data = chunk.model_dump_json()
-                if len(data) > max_chunk_size:
-                    yield create_sse_event("content_start", json.dumps({"chunk_id": chunk_count}))
-                    while len(data) > max_chunk_size:
-                        yield create_sse_event(
-                            "content_delta", json.dumps({"chunk_id": chunk_count, "delta": data[:max_chunk_size]})
-                        )
-
-                        data = data[max_chunk_size:]
-
-                    yield create_sse_event("content_delta", json.dumps({"chunk_id": chunk_count, "delta": data}))
-                    yield create_sse_event("content_end", json.dumps({"chunk_id": chunk_count}))
-                else:
-                    yield create_sse_event("content", data)
+                for sse_event in create_content_sse_events(chunk, chunk_count):
+                    yield sse_event
 
                 chunk_count += 1
 
+            # Only sent once the turn is saved, clients can safely refetch the thread after it
+            yield create_sse_event("done", "{}")
+
         except Exception as e:
             logger.exception("Error in SSE stream", exc_info=e)
-            sse_event = create_sse_event("error", json.dumps({"detail": str(e)[:max_chunk_size]}))
+            sse_event = create_sse_event("error", json.dumps({"detail": str(e)[:MAX_SSE_CHUNK_SIZE]}))
             logger.warning(f"Sending sse error event to client: {sse_event}")
             yield sse_event
 
+    # The turn keeps running when the client goes away, so it can reattach through `get_current_turn_events`
+    try:
+        turn = TurnService.start(thread.id, stream())
+    except TurnAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail="The thread already has a running turn") from e
+
     return StreamingResponse(
-        stream(),
+        turn.subscribe(),
         media_type="text/event-stream",
         headers={
             "Transfer-Encoding": "chunked",
             "X-Accel-Buffering": "no",
+            "X-Turn-Id": turn.id,
+        },
+    )
+
+
+@router.get(
+    "/threads/{thread_id}/turns/current/events",
+    name="get_current_turn_events",
+    tags=["messages"],
+    response_description="A stream of JSON-encoded message chunks",
+    description="Reattaches to the running (or recently finished) turn of a thread. Send the id of the last received event in the `Last-Event-ID` header to only receive the events after it.",
+)
+async def get_current_turn_events(
+    thread_id: str = Path(
+        ...,
+        description="The unique identifier of the thread. Can be either the internal ID or external ID.",
+    ),
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    thread = await prisma.threads.find_first(
+        where={"id": thread_id} if is_valid_uuid(thread_id) else {"external_id": thread_id},
+    )
+
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+
+    turn = TurnService.get_current(thread.id)
+
+    if not turn:
+        raise HTTPException(status_code=404, detail="No active turn for this thread")
+
+    return StreamingResponse(
+        turn.subscribe(turn.parse_event_id(last_event_id)),
+        media_type="text/event-stream",
+        headers={
+            "Transfer-Encoding": "chunked",
+            "X-Accel-Buffering": "no",
+            "X-Turn-Id": turn.id,
         },
     )
 
 
+@router.delete(
+    "/threads/{thread_id}/turns/current",
+    name="cancel_current_turn",
+    tags=["messages"],
+    description="Stops the running turn of a thread. The output produced so far is saved and marked as cancelled.",
+)
+async def cancel_current_turn(
+    thread_id: str = Path(
+        ...,
+        description="The unique identifier of the thread. Can be either the internal ID or external ID.",
+    ),
+) -> Response:
+    thread = await prisma.threads.find_first(
+        where={"id": thread_id} if is_valid_uuid(thread_id) else {"external_id": thread_id},
+    )
+
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+
+    turn = TurnService.get_current(thread.id)
+
+    if not turn:
+        raise HTTPException(status_code=404, detail="No active turn for this thread")
+
+    await turn.cancel()
+
+    return Response(status_code=204)
+
+
 @router.delete(
     "/threads/{thread_id}/messages/{message_id}",
     tags=["messages"],
@@ -360,7 +280,7 @@ async def delete_message(
     ),
     message_id: str = Path(..., description="The unique identifier of the message."),
 ) -> Response:
-    await prisma.messages.delete_many(
+    deleted = await prisma.messages.delete_many(
         where={
             "AND": [
                 {"id": message_id},
@@ -369,9 +289,62 @@ async def delete_message(
         }
     )
 
+    # Touching the thread changes the ETag of its reads, which only follows the last message
+    if deleted > 0:
+        await prisma.threads.update(where={"id": thread_id}, data={"updated_at": datetime.now(UTC)})
+
+    MessageService.history_cache.invalidate(thread_id)
+    await HistorySummaryService.invalidate(thread_id)
+
     return Response(status_code=204)
 
 
+@router.get(
+    "/threads/{thread_id}/messages/{message_id}/contents/{content_id}/file",
+    name="get_message_file",
+    tags=["messages"],
+    response_model=FileContent,
+    description="Retrieves a file of a message including its data. Message listings only include the file metadata.",
+)
+async def get_message_file(
+    thread_id: str = Path(
+        ...,
+        description="The unique identifier of the thread. Can be either the internal ID or external ID.",
+    ),
+    message_id: str = Path(..., description="The unique identifier of the message."),
+    content_id: str = Path(..., description="The unique identifier of the file content."),
+) -> FileContent:
+    if not is_valid_uuid(message_id) or not is_valid_uuid(content_id):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    thread_where = (
+        {"thread_id": thread_id} if is_valid_uuid(thread_id) else {"thread": {"is": {"external_id": thread_id}}}
+    )
+
+    content = await prisma.message_contents.find_first(
+        where={
+            "id": content_id,
+            "message_id": message_id,
+            "type": "file",
+            "message": {"is": thread_where},  # type: ignore[typeddict-item]
+        }
+    )
+
+    if content is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if content.file_ref is None:
+        return file_param(content)
+
+    try:
+        file_data = await load_file_data(content.file_ref)
+    except FileNotFoundInStorageError as e:
+        logger.error(f"File {content.file_ref} of content {content.id} is missing from the file storage")
+        raise HTTPException(status_code=404, detail="File not found") from e
+
+    return file_param(content).model_copy(update={"file_data": file_data})
+
+
 # TODO: This is a temporary hack to get the models in openapi. Need to implement a better spec.
 @router.get(
     "/models",
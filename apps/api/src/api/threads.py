@@ -1,228 +1,29 @@
-import re
-from datetime import datetime
-from typing import Literal
+from typing import Annotated, Literal
 
-import pytz
-from fastapi import APIRouter, HTTPException, Path, Query, Response
-from prisma import Json
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
+from prisma.types import threadsWhereInput
 
+from src.api.dependencies import ThreadRead, conditional_thread_read
 from src.lib.prisma import prisma
-from src.logger import logger
 from src.models.pagination import Pagination
-from src.models.threads import ThreadCreateInput, ThreadResponse
+from src.models.threads import ThreadCreateInput, ThreadResponse, ThreadSummaryResponse
+from src.services.messages.message_service import MessageService
 from src.services.messages.utils.db_message_to_message_model import (
     db_message_to_message_model,
 )
+from src.services.threads.thread_summary_service import ThreadSummaryService
+from src.utils.cursor import InvalidCursorError, decode_cursor, encode_cursor, keyset_where
 from src.utils.is_valid_uuid import is_valid_uuid
 
 router = APIRouter()
 
 
-async def _ensure_welcome_message(
-    thread_id: str, external_id: str | None
-) -> None:
-    """Ensure thread has a welcome message if it's a new/expired session.
-
-    Two-tier welcome system:
-    1. First visit (empty thread): Full onboarding message
-    2. Return visit (24h+ inactive): Personalized "welcome back" with name
-
-    Args:
-        thread_id: The thread ID
-        external_id: The external ID (used to determine agent_class)
-    """
-    # Map external_id patterns to agent_class
-    # NOTE: Order matters - more specific patterns first!
-    agent_class_map = {
-        "mumc-server-test": "MUMCAgentTest",  # Test environment
-        "mumc-server": "MUMCAgent",            # Production environment
-        # Add more agents here when needed
-    }
-
-    # Determine agent_class from external_id
-    agent_class = None
-    if external_id:
-        for pattern, cls in agent_class_map.items():
-            if pattern in external_id:
-                agent_class = cls
-                break
-
-    if not agent_class:
-        # No mapping found, skip welcome message
-        return
-
-    # Get thread with messages
-    thread = await prisma.threads.find_unique(
-        where={"id": thread_id},
-        include={"messages": True},
-    )
-
-    if not thread:
-        return
-
-    # Get metadata
-    metadata = dict(thread.metadata) if thread.metadata else {}
-    last_interaction = metadata.get("last_interaction_time")
-    last_welcome_date = metadata.get("last_welcome_date")
-
-    # Current time
-    current_time = datetime.now(pytz.timezone("Europe/Amsterdam"))
-    current_date = current_time.date().isoformat()
-
-    # Configuration
-    SESSION_TIMEOUT_MINUTES = 240  # 4 hours = 240 minutes
-
-    # Determine if we should add welcome message
-    should_add_welcome = False
-    welcome_reason = ""
-    welcome_text = ""
-    is_welcome_back = False
-
-    # Scenario 1: Empty thread (first visit)
-    if len(thread.messages or []) == 0:
-        if last_interaction is None:
-            # First time ever
-            should_add_welcome = True
-            welcome_reason = "first_time"
-            welcome_text = (
-                "👋 Hallo!\n\n"
-                "Welkom bij de 1e testversie van de nieuwe "
-                "E-Supporter app van Easylog en het MUMC+.\n\n"
-                "Zullen we beginnen met testen?"
-            )
-
-    # Scenario 2: Thread has messages - check for "welcome back"
-    elif last_interaction:
-        try:
-            last_time = datetime.fromisoformat(last_interaction)
-            time_diff = current_time - last_time
-            inactive_minutes = time_diff.total_seconds() / 60
-
-            # Check if enough time has passed (4 hours)
-            # Always show welcome back after timeout, even if shown earlier today
-            if inactive_minutes > SESSION_TIMEOUT_MINUTES:
-                should_add_welcome = True
-                is_welcome_back = True
-                welcome_reason = f"welcome_back_{inactive_minutes:.0f}min"
-
-                # Extract user name from memories if available
-                memories = metadata.get("memories", [])
-                user_name = None
-
-                # Memories is a list of {"id": "...", "memory": "text"}
-                # Search for name in memory text with multiple patterns
-                if isinstance(memories, list):
-                    for mem in memories:
-                        if not isinstance(mem, dict):
-                            continue
-                        memory_text = mem.get("memory", "").strip()
-                        memory_lower = memory_text.lower()
-
-                        # Remove timestamp from memory (datum: YYYY-MM-DD HH:MM)
-                        memory_text_clean = re.sub(
-                            r'\s*\(datum:\s*[^)]+\)\s*', '', memory_text
-                        ).strip()
-
-                        # Pattern 1: "[naam]" as entire memory
-                        if (
-                            memory_text_clean.startswith("[")
-                            and memory_text_clean.endswith("]")
-                        ):
-                            user_name = memory_text_clean[1:-1].strip()
-                            break
-                        # Pattern 2: "naam: John" or "naam : John"
-                        elif (
-                            "naam" in memory_lower
-                            and ":" in memory_text_clean
-                        ):
-                            parts = memory_text_clean.split(":", 1)
-                            if "naam" in parts[0].lower():
-                                user_name = parts[1].split(",")[0].strip()
-                                break
-                        # Pattern 3: Just the name (short text, capital)
-                        elif (
-                            len(memory_text_clean.split()) <= 3
-                            and memory_text_clean[0].isupper()
-                            and not any(
-                                x in memory_lower
-                                for x in [
-                                    "goal",
-                                    "zlm",
-                                    "score",
-                                    "stappen",
-                                    "medicatie",
-                                ]
-                            )
-                        ):
-                            user_name = memory_text_clean
-                            break
-
-                    logger.info(
-                        f"Thread {thread_id} - found {len(memories)} "
-                        f"memories, extracted name: '{user_name or 'None'}'"
-                    )
-
-                # Build personalized welcome back message
-                if user_name:
-                    welcome_text = (
-                        f"👋 Hallo {user_name}!\n\n"
-                        "Fijn dat je er weer bent. "
-                        "Hoe gaat het vandaag met je?"
-                    )
-                else:
-                    welcome_text = (
-                        "👋 Hallo!\n\n"
-                        "Fijn dat je er weer bent. "
-                        "Hoe gaat het vandaag met je?"
-                    )
-        except Exception as e:
-            logger.warning(
-                f"Error parsing last_interaction_time for thread "
-                f"{thread_id}: {e}"
-            )
-
-    # Add welcome message if needed
-    if should_add_welcome:
-        logger.info(
-            f"Adding welcome message to thread {thread_id} "
-            f"(reason: {welcome_reason}, agent: {agent_class}, "
-            f"welcome_back: {is_welcome_back})"
-        )
-
-        # Create welcome message
-        welcome_msg = await prisma.messages.create(
-            data={
-                "thread_id": thread_id,
-                "role": "assistant",
-                "agent_class": agent_class,
-            }
-        )
-
-        # Add text content
-        await prisma.message_contents.create(
-            data={
-                "message_id": welcome_msg.id,
-                "type": "text",
-                "text": welcome_text,
-            }
-        )
-
-        # Update metadata
-        metadata["last_interaction_time"] = current_time.isoformat()
-        if is_welcome_back:
-            metadata["last_welcome_date"] = current_date
-
-        await prisma.threads.update(
-            where={"id": thread_id}, data={"metadata": Json(metadata)}
-        )
-
-
 @router.get(
     "/threads",
     name="get_threads",
     tags=["threads"],
-    response_model=Pagination[ThreadResponse],
-    description="Retrieves all threads. Returns a list of all threads with their messages by default in descending chronological order (newest first). Each message includes its full content.",
+    response_model=Pagination[ThreadSummaryResponse] | Pagination[ThreadResponse],
+    description="Retrieves all threads, by default in descending chronological order (newest first). Each thread is summarized by its message count, last activity and a preview of its last message. Set `include_messages` to get every message with its full content instead.",
 )
 async def get_threads(
     limit: int = Query(
@@ -232,11 +33,38 @@ async def get_threads(
     ),
     offset: int = Query(default=0, ge=0),
     order: Literal["asc", "desc"] = Query(default="desc"),
-) -> Pagination[ThreadResponse]:
+    cursor: str | None = Query(
+        default=None,
+        description="The `next_cursor` of the previous page, pages stay stable while threads are added.",
+    ),
+    include_messages: bool = Query(
+        default=False,
+        description="Include the full history of every thread, including file contents. This can be a lot of data.",
+    ),
+) -> Pagination[ThreadSummaryResponse] | Pagination[ThreadResponse]:
+    if cursor is not None and offset > 0:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset")
+
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    if not include_messages:
+        summaries = await ThreadSummaryService.list_summaries(limit=limit, offset=offset, order=order, after=after)
+
+        return Pagination(
+            data=summaries,
+            limit=limit,
+            offset=offset,
+            next_cursor=encode_cursor(summaries[-1].created_at, summaries[-1].id) if len(summaries) == limit else None,
+        )
+
     threads = await prisma.threads.find_many(
+        where=keyset_where(after, order) if after is not None else {},  # type: ignore[arg-type]
         take=limit,
         skip=offset,
-        order={"created_at": order},
+        order=[{"created_at": order}, {"id": order}],
         include={
             "messages": {
                 "order_by": {"created_at": order},
@@ -257,6 +85,7 @@ async def get_threads(
         ],
         limit=limit,
         offset=offset,
+        next_cursor=encode_cursor(threads[-1].created_at, threads[-1].id) if len(threads) == limit else None,
     )
 
 
@@ -266,19 +95,25 @@ async def get_threads(
     tags=["threads"],
     response_model=ThreadResponse,
     responses={
+        304: {"description": "The thread did not change since the version in `If-None-Match`"},
         404: {"description": "Thread not found"},
     },
     description="Retrieves a specific thread by its unique ID. Returns the thread details along with its messages in descending chronological order (newest first). Each message includes its full content.",
 )
 async def get_thread_by_id(
+    read: Annotated[ThreadRead, Depends(conditional_thread_read("id"))],
     _id: str = Path(
         ...,
         alias="id",
         description="The unique identifier of the thread. Can be either the internal ID or external ID.",
     ),
 ) -> ThreadResponse:
-    thread = await prisma.threads.find_first(
-        where={"id": _id} if is_valid_uuid(_id) else {"external_id": _id},
+    if read.thread is None:
+        raise HTTPException(status_code=404, detail="Thread not found")
+
+    # The welcome message, if one was due, was added by the dependency
+    thread = await prisma.threads.find_unique(
+        where={"id": read.thread.id},
         include={
             "messages": {
                 "order_by": {"created_at": "desc"},
@@ -292,22 +127,6 @@ async def get_thread_by_id(
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
 
-    # Ensure welcome message exists for new/expired sessions
-    await _ensure_welcome_message(thread.id, thread.external_id)
-
-    # Refetch thread to include any newly added welcome message
-    thread = await prisma.threads.find_first(
-        where={"id": thread.id},
-        include={
-            "messages": {
-                "order_by": {"created_at": "desc"},
-                "include": {
-                    "contents": True,
-                },
-            }
-        },
-    )
-
     return ThreadResponse(
         **thread.model_dump(exclude={"messages"}),
         messages=[db_message_to_message_model(message) for message in thread.messages or []],
@@ -374,8 +193,13 @@ async def delete_thread(
         description="The unique identifier of the thread. Can be either the internal ID or external ID.",
     ),
 ) -> Response:
-    await prisma.threads.delete_many(
-        where={"id": _id} if is_valid_uuid(_id) else {"external_id": _id},
-    )
+    where: threadsWhereInput = {"id": _id} if is_valid_uuid(_id) else {"external_id": _id}
+
+    threads = await prisma.threads.find_many(where=where)
+
+    await prisma.threads.delete_many(where=where)
+
+    for thread in threads:
+        MessageService.history_cache.invalidate(thread.id)
 
     return Response(status_code=204)
@@ -0,0 +1,87 @@
+"""Backfill `messages.openai_param` for messages saved before it was materialized at write time.
+
+Run with `uv run python -m src.jobs.backfill_openai_params [batch size]`.
+"""
+
+import asyncio
+import sys
+
+from src.lib.prisma import prisma
+from src.logger import logger
+from src.services.messages.utils.db_message_to_openai_param import db_message_to_openai_param
+from src.services.messages.utils.materialize_openai_param import materialize_openai_param
+
+
+async def backfill_openai_params(batch_size: int = 500) -> int:
+    """Materialize the provider-ready form of every message that does not have one yet.
+
+    Messages are walked in (created_at, id) order, so messages that stay unmaterialized (those with files) are only
+    visited once.
+
+    Args:
+        batch_size (int): The number of messages converted and updated per round-trip.
+
+    Returns:
+        int: The number of updated messages.
+    """
+
+    # (created_at, id) of the last visited message, as returned by the raw query
+    cursor: tuple[str, str] | None = None
+    updated = 0
+
+    while True:
+        rows = await prisma.query_raw(
+            """
+            SELECT id, created_at
+            FROM messages
+            WHERE openai_param IS NULL
+              AND ($1::timestamp IS NULL OR (created_at, id) > ($1::timestamp, $2::uuid))
+            ORDER BY created_at, id
+            LIMIT $3
+            """,
+            cursor[0] if cursor else None,
+            cursor[1] if cursor else None,
+            batch_size,
+        )
+
+        if not rows:
+            return updated
+
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+        messages = await prisma.messages.find_many(
+            where={"id": {"in": [row["id"] for row in rows]}},
+            include={
+                "contents": {
+                    "order_by": [{"created_at": "asc"}, {"type": "asc"}],
+                }
+            },
+        )
+
+        async with prisma.batch_() as batcher:
+            for message in messages:
+                try:
+                    data = materialize_openai_param(db_message_to_openai_param(message))
+                except ValueError as e:
+                    logger.warning(f"Skipping message {message.id}, it cannot be converted: {e}")
+                    continue
+
+                if data:
+                    batcher.messages.update(where={"id": message.id}, data=data)  # type: ignore[arg-type]
+                    updated += 1
+
+        logger.info(f"Backfilled {updated} messages up to {cursor[0]}")
+
+
+async def main(batch_size: int) -> None:
+    await prisma.connect()
+
+    try:
+        updated = await backfill_openai_params(batch_size)
+        logger.info(f"Done, backfilled {updated} messages")
+    finally:
+        await prisma.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
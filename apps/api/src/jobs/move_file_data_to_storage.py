@@ -0,0 +1,85 @@
+"""Move the inline `message_contents.file_data` of files saved before the file storage to the file storage.
+
+Run with `uv run python -m src.jobs.move_file_data_to_storage [batch size]`.
+"""
+
+import asyncio
+import sys
+
+from prisma import Base64
+
+from src.lib.prisma import prisma
+from src.logger import logger
+from src.services.messages.file_contents import store_file
+
+
+async def move_file_data_to_storage(batch_size: int = 50) -> int:
+    """Upload every inline file payload to the file storage and replace it by a reference.
+
+    Rows are walked in (created_at, id) order. A row only loses its payload after the upload succeeded, so the job
+    can be stopped and run again at any time.
+
+    Args:
+        batch_size (int): The number of files uploaded and updated per round-trip.
+
+    Returns:
+        int: The number of moved files.
+    """
+
+    # (created_at, id) of the last visited content, as returned by the raw query
+    cursor: tuple[str, str] | None = None
+    moved = 0
+
+    while True:
+        rows = await prisma.query_raw(
+            """
+            SELECT contents.id, contents.created_at, messages.thread_id
+            FROM message_contents contents
+            JOIN messages ON messages.id = contents.message_id
+            WHERE contents.file_data IS NOT NULL
+              AND ($1::timestamp IS NULL OR (contents.created_at, contents.id) > ($1::timestamp, $2::uuid))
+            ORDER BY contents.created_at, contents.id
+            LIMIT $3
+            """,
+            cursor[0] if cursor else None,
+            cursor[1] if cursor else None,
+            batch_size,
+        )
+
+        if not rows:
+            return moved
+
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        thread_ids = {row["id"]: row["thread_id"] for row in rows}
+
+        contents = await prisma.message_contents.find_many(where={"id": {"in": list(thread_ids)}})
+        uploads = [(content, Base64.decode(content.file_data)) for content in contents if content.file_data is not None]
+
+        file_refs = await asyncio.gather(
+            *(store_file(thread_ids[content.id], content.id, data) for content, data in uploads)
+        )
+
+        async with prisma.batch_() as batcher:
+            for (content, data), file_ref in zip(uploads, file_refs, strict=True):
+                batcher.message_contents.update(
+                    where={"id": content.id},
+                    data={"file_ref": file_ref, "file_size": len(data), "file_data": None},
+                )
+
+        moved += len(uploads)
+
+        logger.info(f"Moved {moved} files up to {cursor[0]}")
+
+
+async def main(batch_size: int) -> None:
+    await prisma.connect()
+
+    try:
+        moved = await move_file_data_to_storage(batch_size)
+        logger.info(f"Done, moved {moved} files")
+    finally:
+        await prisma.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,105 @@
+import asyncio
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from storage3._async.file_api import AsyncBucketProxy
+from supabase import AsyncClient
+
+from src.lib.supabase import create_supabase
+from src.settings import settings
+
+
+class FileNotFoundInStorageError(LookupError):
+    pass
+
+
+class FileStorage(ABC):
+    """Stores the payloads of message files outside the database, by key."""
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Get a file.
+
+        Raises:
+            FileNotFoundInStorageError: There is no file with this key.
+        """
+
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def delete(self, keys: list[str]) -> None:
+        raise NotImplementedError()
+
+
+class SupabaseFileStorage(FileStorage):
+    def __init__(self, bucket: str) -> None:
+        self.bucket = bucket
+        self._client: AsyncClient | None = None
+
+    async def _bucket(self) -> AsyncBucketProxy:
+        if self._client is None:
+            self._client = await create_supabase()
+
+        return self._client.storage.from_(self.bucket)
+
+    async def put(self, key: str, data: bytes) -> None:
+        # Overwriting keeps uploads idempotent, e.g. when a migration batch is retried
+        await (await self._bucket()).upload(key, data, {"upsert": "true"})
+
+    async def get(self, key: str) -> bytes:
+        try:
+            return await (await self._bucket()).download(key)
+        except Exception as e:
+            raise FileNotFoundInStorageError(f"File {key} not found in bucket {self.bucket}") from e
+
+    async def delete(self, keys: list[str]) -> None:
+        if keys:
+            await (await self._bucket()).remove(keys)
+
+
+class LocalFileStorage(FileStorage):
+    """Keeps files in a directory, a stand-in for object storage in tests and local development."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid key {key}")
+
+        return path
+
+    async def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+
+        def write() -> None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+        await asyncio.to_thread(write)
+
+    async def get(self, key: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._path(key).read_bytes)
+        except FileNotFoundError as e:
+            raise FileNotFoundInStorageError(f"File {key} not found in {self.root}") from e
+
+    async def delete(self, keys: list[str]) -> None:
+        for key in keys:
+            await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+
+def create_file_storage() -> FileStorage:
+    if settings.FILE_STORAGE_BACKEND == "local":
+        return LocalFileStorage(Path(settings.FILE_STORAGE_PATH))
+
+    return SupabaseFileStorage(settings.FILE_STORAGE_BUCKET)
+
+
+file_storage = create_file_storage()
@@ -0,0 +1,332 @@
+import asyncio
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+import openai
+from openai import AsyncOpenAI, AsyncStream
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from src.logger import logger
+from src.models.llm_metrics import HistogramMetrics, ModelLatencyMetrics
+
+TTFT_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+THROUGHPUT_BUCKETS = (5, 10, 20, 40, 80, 160, 320)
+
+
+class Histogram:
+    """Counts observations in fixed buckets, the last bucket holds everything above the highest bound."""
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def metrics(self) -> HistogramMetrics:
+        count = sum(self.counts)
+
+        return HistogramMetrics(
+            bounds=list(self.bounds),
+            counts=list(self.counts),
+            count=count,
+            mean=self.total / count if count else None,
+        )
+
+
+class ModelLatencyStats:
+    """Time to first token and throughput of the requests to one model."""
+
+    def __init__(self, window: int = 200) -> None:
+        self.ttft_ms = Histogram(TTFT_BUCKETS_MS)
+        self.tokens_per_second = Histogram(THROUGHPUT_BUCKETS)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self._recent_ttft_ms: deque[float] = deque(maxlen=window)
+
+    def observe_ttft(self, ttft_ms: float) -> None:
+        self.ttft_ms.observe(ttft_ms)
+        self._recent_ttft_ms.append(ttft_ms)
+
+    def p95_ttft_ms(self, min_samples: int) -> float | None:
+        """The 95th percentile of the recent times to first token, or None with fewer than `min_samples`."""
+
+        if len(self._recent_ttft_ms) < max(min_samples, 1):
+            return None
+
+        ordered = sorted(self._recent_ttft_ms)
+
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def metrics(self, model: str, min_samples: int) -> ModelLatencyMetrics:
+        return ModelLatencyMetrics(
+            model=model,
+            requests=self.requests,
+            errors=self.errors,
+            retries=self.retries,
+            hedges=self.hedges,
+            hedge_wins=self.hedge_wins,
+            fallbacks=self.fallbacks,
+            p95_ttft_ms=self.p95_ttft_ms(min_samples),
+            ttft_ms=self.ttft_ms.metrics(),
+            tokens_per_second=self.tokens_per_second.metrics(),
+        )
+
+
+class PolicyStream:
+    """A chat completion stream opened by `LLMRequestPolicy`, starting with the chunk that was already received."""
+
+    def __init__(
+        self,
+        stream: AsyncStream[ChatCompletionChunk],
+        iterator: AsyncIterator[ChatCompletionChunk],
+        first_chunk: ChatCompletionChunk | None,
+        stats: ModelLatencyStats,
+    ) -> None:
+        self._stream = stream
+        self._iterator = iterator
+        self._first_chunk = first_chunk
+        self._stats = stats
+
+    async def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        started_at = time.perf_counter()
+        chunks = 0
+        completion_tokens: int | None = None
+
+        if self._first_chunk is not None:
+            chunks += 1
+            yield self._first_chunk
+
+        async for chunk in self._iterator:
+            chunks += 1
+
+            if chunk.usage is not None:
+                completion_tokens = chunk.usage.completion_tokens
+
+            yield chunk
+
+        elapsed = time.perf_counter() - started_at
+
+        # Without a usage chunk every content chunk counts as one token, which is close for most providers
+        if elapsed > 0 and chunks > 1:
+            self._stats.tokens_per_second.observe((completion_tokens or chunks) / elapsed)
+
+    async def close(self) -> None:
+        await self._stream.close()
+
+
+class LLMRequestPolicy:
+    """Wraps `AsyncOpenAI` with fallback models, hedged streams and backoff for chat completions.
+
+    `chat.completions.create` behaves like the OpenAI client:
+    - Rate limits, server errors and connection errors are retried with exponential backoff. After `max_retries`
+      the next model of the fallback chain of the requested model is tried.
+    - With `hedge_enabled`, when a stream has not produced its first chunk within the rolling p95 time to first token
+      of its model, a second identical request is started. The first stream to produce a chunk is used and the other
+      one is closed. Both requests are billed, so hedging trades cost for tail latency and is off by default.
+    - Time to first token and throughput are recorded per model, see `metrics`.
+
+    The policy is the only retry layer for chat completions, it sends them through a copy of the client with the SDK
+    retries turned off. Otherwise every attempt of the policy would be retried by the SDK as well, multiplying the load
+    during an outage and delaying the fallback. Anything else, e.g. `embeddings`, is passed through to the wrapped
+    client as is.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        fallback_models: dict[str, list[str]] | None = None,
+        max_retries: int = 2,
+        retry_base_delay: float = 0.5,
+        hedge_enabled: bool = False,
+        hedge_min_samples: int = 20,
+    ) -> None:
+        self.client = client
+        self.completions_client = client.with_options(max_retries=0)
+        self.fallback_models = fallback_models or {}
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.chat = _Chat(self)
+        self._stats: dict[str, ModelLatencyStats] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def stats(self, model: str) -> ModelLatencyStats:
+        if model not in self._stats:
+            self._stats[model] = ModelLatencyStats()
+
+        return self._stats[model]
+
+    def metrics(self) -> list[ModelLatencyMetrics]:
+        return [stats.metrics(model, self.hedge_min_samples) for model, stats in sorted(self._stats.items())]
+
+    async def create(self, **kwargs: Any) -> PolicyStream | ChatCompletion:
+        """Create a chat completion, with the same arguments as `client.chat.completions.create`.
+
+        Raises:
+            openai.APIError: The error of the last model in the chain, when none of them succeeded.
+        """
+
+        model: str = kwargs.pop("model")
+        models = [model, *self.fallback_models.get(model, [])]
+
+        for index, candidate in enumerate(models):
+            if index > 0:
+                self.stats(candidate).fallbacks += 1
+                logger.warning(f"Falling back from {models[index - 1]} to {candidate}")
+
+            try:
+                return await self._create_with_retries(candidate, kwargs)
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError, openai.NotFoundError):
+                if index == len(models) - 1:
+                    raise
+
+        raise AssertionError("The model chain is never empty")
+
+    async def _create_with_retries(self, model: str, kwargs: dict[str, Any]) -> PolicyStream | ChatCompletion:
+        stats = self.stats(model)
+
+        for attempt in range(self.max_retries + 1):
+            stats.requests += 1
+
+            try:
+                if kwargs.get("stream"):
+                    return await self._open_hedged(model, kwargs)
+
+                started_at = time.perf_counter()
+                completion = await self.completions_client.chat.completions.create(model=model, **kwargs)
+                stats.observe_ttft((time.perf_counter() - started_at) * 1000)
+
+                return completion
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                stats.errors += 1
+
+                if attempt == self.max_retries:
+                    raise
+
+                stats.retries += 1
+                delay = _retry_after(e) or self.retry_base_delay * 2**attempt * random.uniform(0.8, 1.2)
+
+                logger.warning(f"Request to {model} failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+
+                await asyncio.sleep(delay)
+            except openai.APIError:
+                stats.errors += 1
+                raise
+
+        raise AssertionError("The last attempt either returns or raises")
+
+    async def _open_hedged(self, model: str, kwargs: dict[str, Any]) -> PolicyStream:
+        stats = self.stats(model)
+        started_at = time.perf_counter()
+        hedge_after_ms = stats.p95_ttft_ms(self.hedge_min_samples) if self.hedge_enabled else None
+
+        primary = asyncio.create_task(self._open(model, kwargs))
+        tasks = [primary]
+        winner: asyncio.Task | None = None
+
+        try:
+            if hedge_after_ms is not None:
+                done, _ = await asyncio.wait([primary], timeout=hedge_after_ms / 1000)
+
+                if not done:
+                    stats.hedges += 1
+                    tasks.append(asyncio.create_task(self._open(model, kwargs)))
+
+            winner = await _first_successful(tasks)
+        finally:
+            losers = [task for task in tasks if task is not winner]
+
+            for task in losers:
+                task.cancel()
+
+            if losers:
+                await asyncio.wait(losers)
+
+            # A request that also produced its first chunk in the meantime is not needed anymore
+            for task in losers:
+                if not task.cancelled() and task.exception() is None:
+                    await task.result()[0].close()
+
+        if winner is not primary:
+            stats.hedge_wins += 1
+
+        stats.observe_ttft((time.perf_counter() - started_at) * 1000)
+
+        return PolicyStream(*winner.result(), stats)
+
+    async def _open(
+        self, model: str, kwargs: dict[str, Any]
+    ) -> tuple[AsyncStream[ChatCompletionChunk], AsyncIterator[ChatCompletionChunk], ChatCompletionChunk | None]:
+        stream = await self.completions_client.chat.completions.create(model=model, **kwargs)
+        iterator = stream.__aiter__()
+
+        try:
+            first_chunk = await anext(iterator, None)
+        except BaseException:
+            await stream.close()
+            raise
+
+        return stream, iterator, first_chunk
+
+
+class _Completions:
+    def __init__(self, policy: LLMRequestPolicy) -> None:
+        self._policy = policy
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._policy.client.chat.completions, name)
+
+    async def create(self, **kwargs: Any) -> PolicyStream | ChatCompletion:
+        return await self._policy.create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, policy: LLMRequestPolicy) -> None:
+        self._policy = policy
+        self.completions = _Completions(policy)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._policy.client.chat, name)
+
+
+async def _first_successful(tasks: list[asyncio.Task[Any]]) -> asyncio.Task[Any]:
+    """Wait for the first task that succeeds, raising the error of the last one when all of them fail."""
+
+    pending = set(tasks)
+    error: BaseException | None = None
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            if task.exception() is None:
+                return task
+
+            error = task.exception()
+
+    assert error is not None
+    raise error
+
+
+def _retry_after(error: openai.APIError) -> float | None:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+
+    try:
+        return min(float(value), 30.0) if value is not None else None
+    except ValueError:
+        return None
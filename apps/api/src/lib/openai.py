@@ -1,8 +1,19 @@
 from openai import AsyncOpenAI
 
+from src.lib.llm_request_policy import LLMRequestPolicy
 from src.settings import settings
 
 openai_client = AsyncOpenAI(
     api_key=settings.OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
+    base_url=settings.OPENROUTER_BASE_URL,
+)
+
+# Agents use this for their model calls, see `LLMRequestPolicy`
+llm_client = LLMRequestPolicy(
+    openai_client,
+    fallback_models=settings.LLM_FALLBACK_MODELS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_base_delay=settings.LLM_RETRY_BASE_DELAY_MS / 1000,
+    hedge_enabled=settings.LLM_HEDGE_ENABLED,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
 )
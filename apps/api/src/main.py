@@ -13,6 +13,7 @@ from graphiti_core import Graphiti
 from graphiti_core.llm_client import LLMConfig, OpenAIClient
 from weaviate.classes.config import DataType, Property
 
+from src.agents.agent_loader import AgentLoader
 from src.api import health, knowledge, messages, patient_reports, steps, threads
 from src.lib import graphiti as graphiti_lib
 from src.lib.openai import openai_client
@@ -21,6 +22,7 @@ from src.lib.scheduler import scheduler
 from src.lib.weaviate import weaviate_client
 from src.logger import logger
 from src.security.api_token import verify_api_key
+from src.services.messages.message_service import MessageService
 from src.services.super_agent.super_agent_service import SuperAgentService
 from src.settings import settings
 
@@ -71,10 +73,19 @@ async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
 
     scheduler.start()
 
+    AgentLoader.load()
+
+    agent_watcher = asyncio.create_task(AgentLoader.watch()) if settings.AGENT_HOT_RELOAD else None
+
     await SuperAgentService.register_super_agents()
 
     yield
 
+    if agent_watcher is not None:
+        agent_watcher.cancel()
+
+    await MessageService.turn_writer.close()
+
     await prisma.disconnect()
 
     scheduler.shutdown()
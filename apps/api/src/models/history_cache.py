@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+
+
+class HistoryCacheMetrics(BaseModel):
+    hits: int = Field(..., description="The number of history lookups served from the cache.")
+    misses: int = Field(..., description="The number of history lookups that had to load the whole thread.")
+    evictions: int = Field(..., description="The number of threads dropped because the cache was full.")
+    invalidations: int = Field(..., description="The number of threads dropped because messages were deleted.")
+    threads: int = Field(..., description="The number of threads currently cached.")
+    max_threads: int = Field(..., description="The maximum number of cached threads.")
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+
+
+class HistogramMetrics(BaseModel):
+    bounds: list[float] = Field(..., description="The upper bounds of the buckets, the last bucket is unbounded.")
+    counts: list[int] = Field(..., description="The number of observations per bucket.")
+    count: int = Field(..., description="The total number of observations.")
+    mean: float | None = Field(..., description="The mean of the observations, if there are any.")
+
+
+class ModelLatencyMetrics(BaseModel):
+    model: str = Field(..., description="The model the requests were sent to.")
+    requests: int = Field(..., description="The number of requests, including retries.")
+    errors: int = Field(..., description="The number of requests that failed.")
+    retries: int = Field(..., description="The number of requests that were retried after a failure.")
+    hedges: int = Field(..., description="The number of hedged requests started because the first was slow.")
+    hedge_wins: int = Field(..., description="The number of hedged requests that answered first.")
+    fallbacks: int = Field(..., description="The number of times this model was used as a fallback.")
+    p95_ttft_ms: float | None = Field(..., description="The rolling p95 time to first token, used as hedge delay.")
+    ttft_ms: HistogramMetrics = Field(..., description="The time to first token in milliseconds.")
+    tokens_per_second: HistogramMetrics = Field(..., description="The output throughput of completed streams.")
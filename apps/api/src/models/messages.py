@@ -60,10 +60,15 @@ class ImageContent(BaseContent):
 class FileContent(BaseContent):
     type: Literal["file"] = Field(default="file")
 
-    file_data: str = Field(..., description="The file data of the message.")
+    file_data: str | None = Field(
+        default=None,
+        description="The file data of the message. Not included in listings, get it from the file endpoint.",
+    )
 
     file_name: str = Field(..., description="The name of the file.")
 
+    file_size: int | None = Field(default=None, description="The size of the file in bytes.")
+
 
 # TODO: Add annotation content
 # class AnnotationContent(BaseContent):
@@ -92,4 +97,8 @@ class MessageResponse(BaseModel):
 
     tool_use_id: str | None = None
 
+    is_cancelled: bool = Field(
+        default=False, description="Whether the turn was cancelled while producing this message."
+    )
+
     content: list[Annotated[MessageContent, Field(discriminator="type")]]
@@ -1,6 +1,6 @@
 from typing import Generic, TypeVar
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 T = TypeVar("T")
 
@@ -9,3 +9,7 @@ class Pagination(BaseModel, Generic[T]):
     data: list[T]
     limit: int
     offset: int
+    next_cursor: str | None = Field(
+        default=None,
+        description="Pass as `cursor` to get the next page, None when this is the last page.",
+    )
@@ -0,0 +1,21 @@
+from openai.types.completion_usage import CompletionUsage
+from pydantic import BaseModel
+
+
+class PromptUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_tokens
+
+    def add(self, usage: CompletionUsage) -> None:
+        self.calls += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+
+        if usage.prompt_tokens_details is not None and usage.prompt_tokens_details.cached_tokens is not None:
+            self.cached_tokens += usage.prompt_tokens_details.cached_tokens
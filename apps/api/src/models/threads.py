@@ -2,7 +2,7 @@ import datetime
 
 from pydantic import BaseModel, Field
 
-from src.models.messages import MessageResponse
+from src.models.messages import MessageResponse, MessageRole
 
 
 class ThreadCreateInput(BaseModel):
@@ -19,3 +19,23 @@ class ThreadResponse(BaseModel):
     updated_at: datetime.datetime
     metadata: dict
     messages: list[MessageResponse]
+
+
+class ThreadLastMessage(BaseModel):
+    id: str
+    role: MessageRole
+    preview: str = Field(description="The start of the text of the message.")
+    created_at: datetime.datetime
+
+
+class ThreadSummaryResponse(BaseModel):
+    id: str
+    external_id: str | None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    metadata: dict
+    message_count: int
+    last_activity_at: datetime.datetime | None = Field(description="When the last message was created.")
+    last_message: ThreadLastMessage | None = Field(
+        description="The last user or assistant message with text, None when the thread has none."
+    )
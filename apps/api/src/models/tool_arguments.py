@@ -0,0 +1,9 @@
+from pydantic import BaseModel, Field
+
+
+class ToolArgumentsMetrics(BaseModel):
+    decoded: int = Field(..., description="The number of tool calls whose arguments could be decoded.")
+    repaired: int = Field(..., description="The number of decoded tool calls whose arguments had to be repaired.")
+    failed: int = Field(..., description="The number of tool calls whose arguments could not be decoded.")
+    repair_rate: float = Field(..., description="The share of all tool calls whose arguments were repaired.")
+    failure_rate: float = Field(..., description="The share of all tool calls whose arguments could not be decoded.")
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, cast
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.lib.file_storage import file_storage
+from src.utils.file_refs import decode_file_ref
+
+
+async def store_file(thread_id: str, content_id: str, data: bytes) -> str:
+    """Upload the payload of a file content to the file storage.
+
+    Args:
+        thread_id (str): The ID of the thread, files are grouped per thread.
+        content_id (str): The ID of the content row that references the file.
+        data (bytes): The payload, as it was stored in `message_contents.file_data`.
+
+    Returns:
+        str: The key of the file, for `message_contents.file_ref`.
+    """
+
+    key = f"{thread_id}/{content_id}"
+
+    await file_storage.put(key, data)
+
+    return key
+
+
+async def load_file_data(file_ref: str) -> str:
+    """Get the `file_data` of a file content from the file storage."""
+
+    return (await file_storage.get(file_ref)).decode("utf-8")
+
+
+async def resolve_file_refs(messages: list[ChatCompletionMessageParam]) -> list[ChatCompletionMessageParam]:
+    """Replace the placeholders of files in the file storage with their data, for messages sent to the model.
+
+    History conversion leaves placeholders, so only the files of the turns that are actually sent are fetched. The
+    messages are not changed, messages with files are replaced by copies.
+
+    Args:
+        messages (list[ChatCompletionMessageParam]): The messages, e.g. the windowed history of a thread.
+
+    Returns:
+        list[ChatCompletionMessageParam]: The messages with the file data.
+    """
+
+    keys = {
+        file_ref[0]
+        for message in messages
+        for part in _file_parts(message)
+        if (file_ref := decode_file_ref(part["file"].get("file_data", "")))
+    }
+
+    if not keys:
+        return messages
+
+    data = dict(zip(keys, await asyncio.gather(*(load_file_data(key) for key in keys)), strict=True))
+
+    def resolve(part: dict[str, Any]) -> dict[str, Any]:
+        file_ref = decode_file_ref(part["file"].get("file_data", "")) if part.get("type") == "file" else None
+
+        return {**part, "file": {**part["file"], "file_data": data[file_ref[0]]}} if file_ref else part
+
+    return [
+        cast(ChatCompletionMessageParam, {**message, "content": [resolve(part) for part in message["content"]]})  # type: ignore[typeddict-item]
+        if _file_parts(message)
+        else message
+        for message in messages
+    ]
+
+
+def _file_parts(message: ChatCompletionMessageParam) -> list[dict[str, Any]]:
+    content = message.get("content")
+
+    if not isinstance(content, list):
+        return []
+
+    return [cast(dict, part) for part in content if cast(dict, part).get("type") == "file"]
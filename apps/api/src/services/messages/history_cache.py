@@ -0,0 +1,148 @@
+import bisect
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.models.history_cache import HistoryCacheMetrics
+
+
+class CachedHistory:
+    """The converted history of a thread, in (created_at, id) order, and the IDs of the rows it was built from."""
+
+    def __init__(self) -> None:
+        self.messages: list[ChatCompletionMessageParam] = []
+        self.last_created_at: datetime | None = None
+
+        # The (created_at, id) of every message, to insert rows that commit late at their place
+        self.keys: list[tuple[datetime, str]] = []
+        self.message_ids: set[str] = set()
+
+    def covers(self, message_id: str) -> bool:
+        """Whether a row is already part of this history."""
+
+        return message_id in self.message_ids
+
+    def add(self, message_id: str, created_at: datetime, message: ChatCompletionMessageParam | None) -> None:
+        self.message_ids.add(message_id)
+
+        if self.last_created_at is None or created_at > self.last_created_at:
+            self.last_created_at = created_at
+
+        if message is None:
+            return
+
+        key = (created_at, message_id)
+        index = bisect.bisect(self.keys, key)
+
+        self.keys.insert(index, key)
+        self.messages.insert(index, message)
+
+
+class HistoryCache:
+    """An in-process LRU cache of the provider-ready history of the most recently used threads.
+
+    Entries are only ever extended with newer rows, so a message deleted by another process is not noticed until the
+    entry is evicted or invalidated here. Callers get a copy of the cached list and can extend it freely.
+
+    A row can commit after rows with a later `created_at` were already read, e.g. when its transaction took a while or
+    another process wrote it. Fetches therefore start `lookback` before the newest cached row and skip the rows the
+    entry already has by ID, so such a row is added at its place in the history instead of being lost.
+    """
+
+    def __init__(self, max_threads: int = 256, lookback: timedelta = timedelta(seconds=60)) -> None:
+        self.max_threads = max_threads
+        self.lookback = lookback
+
+        self._entries: OrderedDict[str, CachedHistory] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, thread_id: str) -> CachedHistory | None:
+        entry = self._entries.get(thread_id)
+
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._entries.move_to_end(thread_id)
+
+        return entry
+
+    def fetch_from(self, entry: CachedHistory | None) -> datetime | None:
+        """The `created_at` from which rows have to be fetched to complete an entry, None to fetch all of them."""
+
+        if entry is None or entry.last_created_at is None:
+            return None
+
+        return entry.last_created_at - self.lookback
+
+    def extend(
+        self,
+        thread_id: str,
+        base: CachedHistory | None,
+        rows: list[tuple[str, datetime, ChatCompletionMessageParam | None]],
+    ) -> list[ChatCompletionMessageParam]:
+        """Append newly fetched rows to the entry of a thread, creating it if needed.
+
+        Rows the entry already covers are skipped, so concurrent fetches of the same rows are harmless.
+
+        Args:
+            thread_id (str): The ID of the thread.
+            base (CachedHistory | None): The entry returned by `get` before the rows were fetched.
+            rows (list[tuple[str, datetime, ChatCompletionMessageParam | None]]): The id, creation time and converted
+                message of every fetched row. Rows that do not convert to a message pass None.
+
+        Returns:
+            list[ChatCompletionMessageParam]: A copy of the complete cached history of the thread.
+        """
+
+        entry = self._entries.get(thread_id)
+
+        if base is not None and entry is not base or self.max_threads <= 0:
+            # The entry was invalidated or evicted while the rows were fetched, they only complete a copy of it
+            entry = CachedHistory()
+
+            if base is not None:
+                entry.messages = list(base.messages)
+                entry.keys = list(base.keys)
+                entry.message_ids = set(base.message_ids)
+
+            for message_id, created_at, message in rows:
+                if not entry.covers(message_id):
+                    entry.add(message_id, created_at, message)
+
+            return entry.messages
+
+        if entry is None:
+            entry = CachedHistory()
+            self._entries[thread_id] = entry
+
+        for message_id, created_at, message in rows:
+            if not entry.covers(message_id):
+                entry.add(message_id, created_at, message)
+
+        self._entries.move_to_end(thread_id)
+
+        while len(self._entries) > self.max_threads:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+        return list(entry.messages)
+
+    def invalidate(self, thread_id: str) -> None:
+        if self._entries.pop(thread_id, None) is not None:
+            self._invalidations += 1
+
+    def metrics(self) -> HistoryCacheMetrics:
+        return HistoryCacheMetrics(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            invalidations=self._invalidations,
+            threads=len(self._entries),
+            max_threads=self.max_threads,
+        )
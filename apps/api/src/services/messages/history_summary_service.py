@@ -0,0 +1,185 @@
+import asyncio
+from collections.abc import Sequence
+from typing import Any
+
+from openai.types.chat import ChatCompletionMessageParam, ChatCompletionSystemMessageParam
+
+from src.lib.openai import llm_client
+from src.lib.prisma import prisma
+from src.logger import logger
+from src.services.messages.history_window import find_turn_starts, find_window_start
+from src.settings import settings
+from src.utils.token_estimator import estimate_messages_tokens
+from src.utils.truncate import truncate
+
+SUMMARY_PROMPT = """You maintain the running summary of a long conversation between a user and an assistant.
+
+Update the existing summary with the new messages. Keep every fact that matters for the rest of the conversation: \
+who the user is, their goals, preferences, agreements, open questions, and results of tool calls that are still \
+relevant. Drop small talk. Write in the language of the conversation, at most 400 words, as plain text.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+class HistorySummaryService:
+    """Keeps the history sent to the model within `HISTORY_TOKEN_BUDGET` tokens.
+
+    Recent turns are sent verbatim, everything before them is replaced by the latest summary checkpoint of the
+    thread. Checkpoints are updated incrementally in the background, folding only the messages that left the window
+    since the previous checkpoint into its summary, so windowing never adds a model call before the first token.
+    Until a checkpoint catches up, the messages it does not cover yet are sent verbatim.
+    """
+
+    _updating: set[str] = set()
+    _tasks: set[asyncio.Task[None]] = set()
+
+    @classmethod
+    async def window(
+        cls, thread_id: str, history: list[ChatCompletionMessageParam]
+    ) -> list[ChatCompletionMessageParam]:
+        """Get the history to send to the model for a thread.
+
+        Args:
+            thread_id (str): The ID of the thread.
+            history (list[ChatCompletionMessageParam]): The complete history of the thread, in creation order.
+
+        Returns:
+            list[ChatCompletionMessageParam]: The latest summary followed by the messages it does not cover.
+        """
+
+        if settings.HISTORY_TOKEN_BUDGET <= 0:
+            return history
+
+        checkpoint = await prisma.thread_summaries.find_first(
+            where={"thread_id": thread_id},
+            order={"created_at": "desc"},
+        )
+
+        # A checkpoint covering more messages than exist is outdated by a deletion
+        covered = checkpoint.message_count if checkpoint and checkpoint.message_count <= len(history) else 0
+        summary = checkpoint.summary if checkpoint and covered else None
+
+        window_start = find_window_start(
+            history,
+            settings.HISTORY_TOKEN_BUDGET,
+            min_turns=settings.HISTORY_MIN_VERBATIM_TURNS,
+            offset=covered,
+        )
+
+        stale_messages = history[covered:window_start]
+
+        if stale_messages and estimate_messages_tokens(stale_messages) >= settings.HISTORY_SUMMARY_MIN_TOKENS:
+            # Long backlogs, e.g. of threads that predate summaries, are folded in budget-sized steps
+            fold_end = window_start
+            fold_tokens = 0
+            previous_start = covered
+
+            for turn_start in find_turn_starts(history):
+                if turn_start <= covered or turn_start > window_start:
+                    continue
+
+                fold_tokens += estimate_messages_tokens(history[previous_start:turn_start])
+
+                if fold_tokens > settings.HISTORY_TOKEN_BUDGET and previous_start > covered:
+                    fold_end = previous_start
+                    break
+
+                previous_start = turn_start
+
+            cls._schedule_update(thread_id, summary, history[covered:fold_end], fold_end)
+
+        if summary is None:
+            return history
+
+        return [
+            ChatCompletionSystemMessageParam(
+                role="system",
+                content=f"Summary of the earlier conversation in this thread:\n\n{summary}",
+            ),
+            *history[covered:],
+        ]
+
+    @classmethod
+    async def invalidate(cls, thread_id: str) -> None:
+        """Drop the checkpoints of a thread, needed when messages they cover are deleted."""
+
+        await prisma.thread_summaries.delete_many(where={"thread_id": thread_id})
+
+    @classmethod
+    def _schedule_update(
+        cls,
+        thread_id: str,
+        summary: str | None,
+        messages: Sequence[ChatCompletionMessageParam],
+        message_count: int,
+    ) -> None:
+        if thread_id in cls._updating:
+            return
+
+        cls._updating.add(thread_id)
+
+        task = asyncio.create_task(cls._update(thread_id, summary, messages, message_count))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def _update(
+        cls,
+        thread_id: str,
+        summary: str | None,
+        messages: Sequence[ChatCompletionMessageParam],
+        message_count: int,
+    ) -> None:
+        try:
+            response = await llm_client.chat.completions.create(
+                model=settings.HISTORY_SUMMARY_MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": SUMMARY_PROMPT.format(
+                            summary=summary or "(none yet)",
+                            messages="\n".join(_message_to_text(message) for message in messages),
+                        ),
+                    }
+                ],
+                max_tokens=1000,
+                temperature=0.1,
+            )
+
+            new_summary = response.choices[0].message.content
+
+            if not new_summary:
+                raise ValueError("The summary model returned no content")
+
+            await prisma.thread_summaries.create(
+                data={
+                    "thread_id": thread_id,
+                    "summary": new_summary,
+                    "message_count": message_count,
+                }
+            )
+
+            logger.info(f"Updated the history summary of thread {thread_id}, it now covers {message_count} messages")
+        except Exception as e:
+            logger.warning(f"Error updating the history summary of thread {thread_id}: {e}")
+        finally:
+            cls._updating.discard(thread_id)
+
+
+def _message_to_text(message: ChatCompletionMessageParam) -> str:
+    content: Any = message.get("content")
+
+    if isinstance(content, list):
+        content = " ".join(part.get("text", f"[{part.get('type')}]") for part in content)
+
+    lines = [f"{message['role']}: {truncate(content or '', 1000)}"]
+
+    for tool_call in message.get("tool_calls", None) or []:
+        function = tool_call.get("function", {})
+        lines.append(f"{message['role']} called {function.get('name')}({truncate(function.get('arguments', ''), 300)})")
+
+    return "\n".join(lines)
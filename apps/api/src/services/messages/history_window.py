@@ -0,0 +1,55 @@
+from collections.abc import Sequence
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.utils.token_estimator import estimate_message_tokens
+
+
+def find_turn_starts(history: Sequence[ChatCompletionMessageParam]) -> list[int]:
+    """Get the indexes at which a turn starts, a turn being a user message and everything the agent did after it."""
+
+    return [index for index, message in enumerate(history) if message["role"] == "user"]
+
+
+def find_window_start(
+    history: Sequence[ChatCompletionMessageParam],
+    token_budget: int,
+    min_turns: int = 1,
+    offset: int = 0,
+) -> int:
+    """Find where the verbatim part of the history starts.
+
+    Whole turns are kept from the newest backwards for as long as they fit in `token_budget`, and at least the last
+    `min_turns` turns are always kept. The window only starts at a turn boundary, so tool calls and their results are
+    never separated.
+
+    Args:
+        history (Sequence[ChatCompletionMessageParam]): The complete history of the thread.
+        token_budget (int): The maximum number of estimated tokens of the verbatim part.
+        min_turns (int): The number of most recent turns that are kept regardless of the budget.
+        offset (int): The index before which the history is already summarized, the window never starts before it.
+
+    Returns:
+        int: The index of the first message that is kept verbatim.
+    """
+
+    turn_starts = [index for index in find_turn_starts(history) if index > offset]
+
+    window_start = offset
+    tokens = 0
+    turn_end = len(history)
+
+    for turn_number, turn_start in enumerate(reversed(turn_starts)):
+        tokens += sum(estimate_message_tokens(message) for message in history[turn_start:turn_end])
+
+        if tokens > token_budget and turn_number >= min_turns:
+            return turn_end
+
+        window_start = turn_start
+        turn_end = turn_start
+
+    # Everything after the offset fits, including messages before the first turn start
+    if sum(estimate_message_tokens(message) for message in history[offset:window_start]) + tokens <= token_budget:
+        return offset
+
+    return window_start
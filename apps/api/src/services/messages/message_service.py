@@ -1,12 +1,19 @@
+import asyncio
 import uuid
-from collections.abc import AsyncGenerator, Iterable
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime, timedelta
+from typing import cast
 
 from openai.types.chat import ChatCompletionMessageParam
 from prisma import Base64, Json
 from prisma.enums import message_content_type, message_role, widget_type
+from prisma.types import (
+    message_contentsCreateWithoutRelationsInput,
+    messagesCreateWithoutRelationsInput,
+    messagesWhereInput,
+)
 
 from src.agents.agent_loader import AgentLoader
-from src.agents.base_agent import BaseAgent
 from src.lib.prisma import prisma
 from src.logger import logger
 from src.models.message_create import (
@@ -25,16 +32,120 @@ from src.models.messages import (
     ToolResultContent,
     ToolUseContent,
 )
+from src.services.messages.file_contents import resolve_file_refs, store_file
+from src.services.messages.history_cache import HistoryCache
+from src.services.messages.history_summary_service import HistorySummaryService
+from src.services.messages.turn_engine import TurnState, run_turn
 from src.services.messages.utils.db_message_to_openai_param import db_message_to_openai_param
 from src.services.messages.utils.generated_message_to_openai_param import generated_message_to_openai_param
 from src.services.messages.utils.input_message_to_openai_param import input_content_to_openai_param
+from src.services.messages.utils.materialize_openai_param import materialize_openai_param
+from src.settings import settings
+from src.utils.write_behind_queue import WriteBehindQueue
 
 
 class AgentNotFoundError(Exception):
     pass
 
 
+TurnRows = tuple[list[messagesCreateWithoutRelationsInput], list[message_contentsCreateWithoutRelationsInput]]
+
+
+async def _write_turns(turns: list[TurnRows]) -> None:
+    """Write the rows of one or more turns in a single transaction."""
+
+    message_rows = [row for message_rows, _ in turns for row in message_rows]
+
+    if not message_rows:
+        return
+
+    content_rows = [row for _, content_rows in turns for row in content_rows]
+
+    async with prisma.tx() as transaction:
+        # Stamp the rows with the clock of the database like every other writer, so the history cache can rely on
+        # `created_at` alone. The rows keep the spacing `save_turn` gave them, which orders rows of the same turn.
+        clock = await transaction.query_first("SELECT (extract(epoch FROM clock_timestamp()) * 1000)::bigint AS now_ms")
+        first_created_at: datetime = min(row["created_at"] for row in message_rows)  # type: ignore[typeddict-item]
+        shift = datetime.fromtimestamp(clock["now_ms"] / 1000, UTC) - first_created_at
+
+        for row in [*message_rows, *content_rows]:
+            row["created_at"] += shift  # type: ignore[typeddict-item]
+
+        await transaction.messages.create_many(data=message_rows)
+
+        if content_rows:
+            await transaction.message_contents.create_many(data=content_rows)
+
+
 class MessageService:
+    history_cache = HistoryCache(
+        max_threads=settings.HISTORY_CACHE_MAX_THREADS,
+        lookback=timedelta(seconds=settings.HISTORY_CACHE_LOOKBACK_SECONDS),
+    )
+    turn_writer: WriteBehindQueue[TurnRows] = WriteBehindQueue(_write_turns)
+
+    @classmethod
+    async def get_thread_history(cls, thread_id: str) -> list[ChatCompletionMessageParam]:
+        """Get the provider-ready history of a thread, only fetching and converting rows the cache does not cover.
+
+        Args:
+            thread_id (str): The ID of the thread.
+
+        Returns:
+            list[ChatCompletionMessageParam]: The history of the thread in creation order, owned by the caller.
+        """
+
+        cached = cls.history_cache.get(thread_id)
+
+        where = messagesWhereInput(thread_id=thread_id)
+
+        fetch_from = cls.history_cache.fetch_from(cached)
+
+        if fetch_from is not None:
+            where["created_at"] = {"gte": fetch_from}
+
+        # Contents are only loaded for rows without a materialized `openai_param`, such as messages with files
+        messages = await prisma.messages.find_many(where=where, order=[{"created_at": "asc"}, {"id": "asc"}])
+
+        unmaterialized_ids = [
+            message.id
+            for message in messages
+            if message.openai_param is None and (cached is None or not cached.covers(message.id))
+        ]
+
+        converted: dict[str, ChatCompletionMessageParam] = (
+            {
+                message.id: db_message_to_openai_param(message)
+                for message in await prisma.messages.find_many(
+                    where={"id": {"in": unmaterialized_ids}},
+                    include={
+                        "contents": {
+                            "order_by": [{"created_at": "asc"}, {"type": "asc"}],
+                        }
+                    },
+                )
+                if message.contents is not None
+            }
+            if unmaterialized_ids
+            else {}
+        )
+
+        return cls.history_cache.extend(
+            thread_id,
+            cached,
+            [
+                (
+                    message.id,
+                    message.created_at,
+                    cast(ChatCompletionMessageParam, message.openai_param)
+                    if message.openai_param is not None
+                    else converted.get(message.id),
+                )
+                for message in messages
+                if cached is None or not cached.covers(message.id)
+            ],
+        )
+
     @classmethod
     async def forward_message(
         cls,
@@ -77,79 +188,65 @@ class MessageService:
         logger.info("Getting thread history")
 
         # Fetch the thread history including the new user message
-        thread_history: Iterable[ChatCompletionMessageParam] = [
-            *(
-                db_message_to_openai_param(message)
-                for message in await prisma.messages.find_many(
-                    where={
-                        "thread_id": thread_id,
-                    },
-                    include={
-                        "contents": {
-                            "order_by": [{"created_at": "asc"}, {"type": "asc"}],
-                        }
-                    },
-                    order={"created_at": "asc"},
-                )
-                if message.contents is not None
-            ),
-            input_content_to_openai_param(input_content),
-        ]
+        thread_history = await HistorySummaryService.window(thread_id, await cls.get_thread_history(thread_id))
+        # Files are only fetched for the turns that are sent after windowing
+        thread_history = await resolve_file_refs(thread_history)
+        thread_history.append(input_content_to_openai_param(input_content))
 
         logger.info(f"Thread history: {len(thread_history)} messages")
 
         logger.info("Forwarding message through agent")
 
         # Forward the history through the agent
-        generated_messages: list[MessageResponse] = []
-
-        yielded_messages: set[str] = set()
+        state = TurnState(thread_history)
 
         try:
-            async for content_chunk, messages in cls.call_agent(
-                agent, thread_history, generated_messages, max_recursion_depth
-            ):
-                generated_messages = messages
-
-                for message in messages:
-                    if message.id in yielded_messages:
-                        continue
+            async for content_chunk, new_message in run_turn(agent.forward_message, state, max_recursion_depth):
+                if new_message is not None:
+                    yield new_message
 
-                    yield MessageResponse(**message.model_dump(exclude={"content"}), content=[])
+                yield content_chunk
 
-                    yielded_messages.add(message.id)
+        except (asyncio.CancelledError, GeneratorExit):
+            logger.warning(f"Turn for thread {thread_id} was cancelled, saving the partial response")
+            state.interrupt()
 
-                yield content_chunk
+            # The write-behind queue finishes the write even if this task is cancelled again
+            await cls.save_turn(thread_id, agent_class, input_content, state.generated_messages)
+            raise
 
         except Exception as e:
             logger.error(f"Error forwarding message: {e}", exc_info=e)
             raise e
 
-        await prisma.messages.create(
-            data={
-                "agent_class": agent_class,
-                "thread": {"connect": {"id": thread_id}},
-                "role": message_role.user,
-                "contents": {
-                    "create": [
-                        {
-                            "type": message_content_type[content.type],
-                            "text": content.text if isinstance(content, MessageCreateInputTextContent) else None,
-                            "image_url": content.image_url
-                            if isinstance(content, MessageCreateInputImageContent)
-                            else None,
-                            "file_data": Base64.fromb64(content.file_data)
-                            if isinstance(content, MessageCreateInputFileContent)
-                            else None,
-                            "file_name": content.file_name
-                            if isinstance(content, MessageCreateInputFileContent)
-                            else None,
-                        }
-                        for content in input_content
-                    ]
-                },
-            },
-        )
+        if agent.prompt_usage.calls > 0:
+            usage = agent.prompt_usage
+            logger.info(
+                f"Prompt usage of thread {thread_id}: {usage.prompt_tokens} input tokens in {usage.calls} calls, "
+                f"{usage.cached_tokens} cached, {usage.uncached_tokens} uncached"
+            )
+
+        await cls.save_turn(thread_id, agent_class, input_content, state.generated_messages)
+
+    @classmethod
+    async def save_turn(
+        cls,
+        thread_id: str,
+        agent_class: str,
+        input_content: list[MessageCreateInputContent] | None,
+        generated_messages: list[MessageResponse],
+    ) -> None:
+        """Save the user message and the generated messages of a turn, together with their provider-ready form.
+
+        The turn is written in a single transaction by the write-behind queue, this returns once it is durable.
+
+        Args:
+            thread_id (str): The ID of the thread.
+            agent_class (str): The class of the agent.
+            input_content (list[MessageCreateInputContent] | None): The content of the user message, None for turns
+                the agent started itself.
+            generated_messages (list[MessageResponse]): The messages generated by the agent.
+        """
 
         for message in generated_messages:
             for content in message.content:
@@ -158,122 +255,96 @@ class MessageService:
                 elif isinstance(content, ToolResultContent):
                     logger.info(f"Tool result content: {content.output}")
 
-            await prisma.messages.create(
-                data={
+        # Rows of a bulk insert share `now()`, explicit timestamps keep the order in which the turn happened. The
+        # writer moves them onto the clock of the database.
+        created_at = datetime.now(UTC)
+        message_rows: list[messagesCreateWithoutRelationsInput] = []
+        content_rows: list[message_contentsCreateWithoutRelationsInput] = []
+
+        def next_created_at() -> datetime:
+            nonlocal created_at
+            created_at += timedelta(milliseconds=1)
+            return created_at
+
+        if input_content is not None:
+            user_message_id = str(uuid.uuid4())
+
+            message_rows.append(
+                {
+                    "id": user_message_id,
+                    "agent_class": agent_class,
+                    "thread_id": thread_id,
+                    "role": message_role.user,
+                    "created_at": next_created_at(),
+                    **materialize_openai_param(input_content_to_openai_param(input_content)),  # type: ignore[typeddict-item]
+                }
+            )
+            content_rows.extend(
+                {
+                    "message_id": user_message_id,
+                    "type": message_content_type[content.type],
+                    "text": content.text if isinstance(content, MessageCreateInputTextContent) else None,
+                    "image_url": content.image_url if isinstance(content, MessageCreateInputImageContent) else None,
+                    "file_data": Base64.fromb64(content.file_data)
+                    if isinstance(content, MessageCreateInputFileContent)
+                    else None,
+                    "file_name": content.file_name if isinstance(content, MessageCreateInputFileContent) else None,
+                    "created_at": next_created_at(),
+                }
+                for content in input_content
+            )
+
+        for message in generated_messages:
+            message_rows.append(
+                {
                     "id": message.id,
                     "agent_class": agent_class,
                     "thread_id": thread_id,
                     "role": message_role[message.role],
                     "tool_use_id": message.tool_use_id,
-                    "contents": {
-                        "create": [
-                            {
-                                "id": content.id,
-                                "type": message_content_type[content.type],
-                                "text": content.text if isinstance(content, TextContent) else None,
-                                "image_url": content.image_url if isinstance(content, ImageContent) else None,
-                                "file_data": Base64.fromb64(content.file_data)
-                                if isinstance(content, FileContent)
-                                else None,
-                                "file_name": content.file_name if isinstance(content, FileContent) else None,
-                                "widget_type": widget_type[content.widget_type]
-                                if isinstance(content, ToolResultContent) and content.widget_type is not None
-                                else None,
-                                "tool_use_id": content.tool_use_id
-                                if isinstance(content, ToolResultContent) or isinstance(content, ToolUseContent)
-                                else None,
-                                "tool_name": content.name if isinstance(content, ToolUseContent) else None,
-                                "tool_input": Json(content.input) if isinstance(content, ToolUseContent) else Json({}),
-                                "tool_output": content.output if isinstance(content, ToolResultContent) else None,
-                            }
-                            for content in message.content
-                            if not isinstance(content, TextDeltaContent)
-                        ]
-                    },
+                    "is_cancelled": message.is_cancelled,
+                    "created_at": next_created_at(),
+                    **materialize_openai_param(generated_message_to_openai_param(message)),  # type: ignore[typeddict-item]
                 }
             )
+            content_rows.extend(
+                {
+                    "id": content.id,
+                    "message_id": message.id,
+                    "type": message_content_type[content.type],
+                    "text": content.text if isinstance(content, TextContent) else None,
+                    "image_url": content.image_url if isinstance(content, ImageContent) else None,
+                    "file_data": Base64.fromb64(content.file_data)
+                    if isinstance(content, FileContent) and content.file_data is not None
+                    else None,
+                    "file_name": content.file_name if isinstance(content, FileContent) else None,
+                    "widget_type": widget_type[content.widget_type]
+                    if isinstance(content, ToolResultContent) and content.widget_type is not None
+                    else None,
+                    "tool_use_id": content.tool_use_id
+                    if isinstance(content, ToolResultContent) or isinstance(content, ToolUseContent)
+                    else None,
+                    "tool_name": content.name if isinstance(content, ToolUseContent) else None,
+                    "tool_input": Json(content.input) if isinstance(content, ToolUseContent) else Json({}),
+                    "tool_output": content.output if isinstance(content, ToolResultContent) else None,
+                    "created_at": next_created_at(),
+                }
+                for content in message.content
+                if not isinstance(content, TextDeltaContent)
+            )
 
-    @classmethod
-    async def call_agent(
-        cls,
-        agent: BaseAgent,
-        thread_history: Iterable[ChatCompletionMessageParam],
-        initial_generated_messages: list[MessageResponse],
-        max_recursion_depth: int = 5,
-        current_depth: int = 0,
-    ) -> AsyncGenerator[tuple[MessageContent, list[MessageResponse]], None]:
-        """Call the agent with the thread history and return the response.
-
-        Args:
-            agent (BaseAgent): The agent to call.
-            thread_history (list[Message]): The thread history.
-            initial_generated_messages (list[MessageResponse]): Initial generated messages.
-            max_recursion_depth (int): Maximum depth for recursive calls.
-            current_depth (int): Current recursion depth.
-
-        Returns:
-            AsyncGenerator[tuple[MessageContent, list[MessageResponse]], None]:
-                A generator of message chunks and the current state of generated messages.
-        """
-
-        if current_depth >= max_recursion_depth:
-            logger.warning(f"Maximum recursion depth ({max_recursion_depth}) reached, stopping recursion")
-            return
-
-        generated_messages: list[MessageResponse] = []
-
-        is_cancelled: bool = False
-
-        async for content_chunk, should_stop in agent.forward_message(thread_history):
-            logger.info(f"Received chunk: {content_chunk.model_dump_json()[:2000]}")
+        # File payloads go to the file storage, the rows only keep a reference
+        await asyncio.gather(*(cls._store_file(thread_id, row) for row in content_rows if row.get("file_data")))
 
-            if should_stop:
-                is_cancelled = True
+        await cls.turn_writer.submit((message_rows, content_rows))
 
-            last_message = generated_messages[-1] if len(generated_messages) > 0 else None
+    @classmethod
+    async def _store_file(cls, thread_id: str, row: message_contentsCreateWithoutRelationsInput) -> None:
+        """Move the payload of a file content row to the file storage, leaving a reference in the row."""
 
-            if isinstance(content_chunk, ToolResultContent):
-                generated_messages.append(
-                    MessageResponse(
-                        id=str(uuid.uuid4()),
-                        role="tool",
-                        tool_use_id=content_chunk.tool_use_id,
-                        content=[],
-                    )
-                )
-            elif not last_message or last_message.role == "tool":
-                generated_messages.append(
-                    MessageResponse(
-                        id=str(uuid.uuid4()),
-                        role="assistant",
-                        content=[],
-                    )
-                )
+        data = Base64.decode(row["file_data"])  # type: ignore[arg-type]
 
-            if not isinstance(content_chunk, TextDeltaContent):
-                generated_messages[-1].content.append(content_chunk)
-
-            # First yield the current chunk before potential recursive calls
-            yield content_chunk, [*initial_generated_messages, *generated_messages]
-
-        if is_cancelled:
-            logger.warning("Agent call was cancelled, stopping recursion")
-            return
-
-        if any(generated_message.role == "tool" for generated_message in generated_messages):
-            new_thread_history = [
-                *thread_history,
-                *[generated_message_to_openai_param(message) for message in generated_messages],
-            ]
-
-            new_initial_generated_messages = [*initial_generated_messages, *generated_messages]
-
-            # Recursively call the agent if we have a tool call
-            async for nested_chunk, nested_messages in cls.call_agent(
-                agent,
-                new_thread_history,
-                new_initial_generated_messages,
-                max_recursion_depth,
-                current_depth + 1,
-            ):
-                yield nested_chunk, nested_messages
+        row.setdefault("id", str(uuid.uuid4()))
+        row["file_ref"] = await store_file(thread_id, row["id"], data)
+        row["file_size"] = len(data)
+        row["file_data"] = None
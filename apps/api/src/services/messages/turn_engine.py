@@ -0,0 +1,185 @@
+import uuid
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.logger import logger
+from src.models.messages import (
+    MessageContent,
+    MessageResponse,
+    TextContent,
+    TextDeltaContent,
+    ToolResultContent,
+    ToolUseContent,
+)
+from src.services.messages.utils.generated_message_to_openai_param import generated_message_to_openai_param
+
+AgentCall = Callable[[list[ChatCompletionMessageParam]], AsyncIterator[tuple[MessageContent, bool]]]
+
+
+class TurnState:
+    """The mutable state of a single agent turn.
+
+    Generated messages and the thread history sent to the agent are extended in place, so the work per chunk is
+    constant and the work per tool round is proportional to the messages produced in that round.
+    """
+
+    def __init__(self, thread_history: list[ChatCompletionMessageParam]) -> None:
+        self.thread_history = thread_history
+        self.generated_messages: list[MessageResponse] = []
+        self.is_cancelled = False
+        self.is_interrupted = False
+        self._round_start = 0
+        self._pending_text_id: str | None = None
+        self._pending_text_parts: list[str] = []
+
+    @property
+    def round_messages(self) -> list[MessageResponse]:
+        """The messages generated in the current round."""
+
+        return self.generated_messages[self._round_start :]
+
+    def start_round(self) -> None:
+        self._round_start = len(self.generated_messages)
+
+    def add_chunk(self, content_chunk: MessageContent) -> MessageResponse | None:
+        """Add a chunk to the turn.
+
+        Returns:
+            MessageResponse | None: A snapshot of the message without content when the chunk starts a new message.
+        """
+
+        last_message = self.generated_messages[-1] if len(self.generated_messages) > self._round_start else None
+        new_message: MessageResponse | None = None
+
+        if isinstance(content_chunk, ToolResultContent):
+            new_message = MessageResponse(
+                id=str(uuid.uuid4()),
+                role="tool",
+                tool_use_id=content_chunk.tool_use_id,
+                content=[],
+            )
+        elif not last_message or last_message.role == "tool":
+            new_message = MessageResponse(
+                id=str(uuid.uuid4()),
+                role="assistant",
+                content=[],
+            )
+
+        snapshot: MessageResponse | None = None
+
+        if new_message is not None:
+            snapshot = new_message.model_copy(update={"content": []})
+            self.generated_messages.append(new_message)
+
+        if isinstance(content_chunk, TextDeltaContent):
+            # Deltas are only kept until the full text arrives, so an interrupted turn can still save what was streamed
+            if content_chunk.id != self._pending_text_id:
+                self._pending_text_id = content_chunk.id
+                self._pending_text_parts = []
+
+            self._pending_text_parts.append(content_chunk.delta)
+        else:
+            if content_chunk.id == self._pending_text_id:
+                self._pending_text_id = None
+                self._pending_text_parts = []
+
+            self.generated_messages[-1].content.append(content_chunk)
+
+        return snapshot
+
+    def interrupt(self) -> None:
+        """Close the turn after it was stopped halfway, e.g. because the client cancelled it.
+
+        Text that was only streamed as deltas becomes a regular text content, and every tool call without a result gets
+        an error result, so the saved messages still form a valid history for the next turn. The last message is marked
+        as cancelled.
+        """
+
+        self.is_interrupted = True
+
+        if self._pending_text_id is not None and self.generated_messages:
+            self.generated_messages[-1].content.append(
+                TextContent(id=self._pending_text_id, text="".join(self._pending_text_parts))
+            )
+            self._pending_text_id = None
+            self._pending_text_parts = []
+
+        answered_tool_use_ids = {
+            message.tool_use_id for message in self.generated_messages if message.role == "tool"
+        }
+        unanswered_tool_uses = [
+            content
+            for message in self.generated_messages
+            for content in message.content
+            if isinstance(content, ToolUseContent) and content.tool_use_id not in answered_tool_use_ids
+        ]
+
+        for tool_use in unanswered_tool_uses:
+            self.add_chunk(
+                ToolResultContent(
+                    id=str(uuid.uuid4()),
+                    tool_use_id=tool_use.tool_use_id,
+                    output="The tool call was cancelled before it finished.",
+                    is_error=True,
+                )
+            )
+
+        if self.generated_messages:
+            self.generated_messages[-1].is_cancelled = True
+
+    def commit_round(self) -> bool:
+        """Append the messages of the current round to the thread history.
+
+        Returns:
+            bool: Whether the round produced tool results, meaning the agent has to be called again.
+        """
+
+        round_messages = self.round_messages
+
+        if not any(message.role == "tool" for message in round_messages):
+            return False
+
+        self.thread_history.extend(generated_message_to_openai_param(message) for message in round_messages)
+
+        return True
+
+
+async def run_turn(
+    call_agent: AgentCall,
+    state: TurnState,
+    max_rounds: int = 15,
+) -> AsyncGenerator[tuple[MessageContent, MessageResponse | None], None]:
+    """Call the agent in a loop until it stops requesting tool rounds.
+
+    Args:
+        call_agent (AgentCall): The agent entry point, e.g. `agent.forward_message` or `agent.run_super_agent`.
+        state (TurnState): The state of the turn, updated in place.
+        max_rounds (int): The maximum number of agent calls in this turn.
+
+    Yields:
+        tuple[MessageContent, MessageResponse | None]: Each chunk, together with a content-less snapshot of the
+            message it starts, if any.
+    """
+
+    for _ in range(max_rounds):
+        state.start_round()
+
+        async for content_chunk, should_stop in call_agent(state.thread_history):
+            # Text deltas arrive once per token, logging them would dominate the cost of streaming
+            if not isinstance(content_chunk, TextDeltaContent):
+                logger.info(f"Received chunk: {content_chunk.model_dump_json()[:2000]}")
+
+            if should_stop:
+                state.is_cancelled = True
+
+            yield content_chunk, state.add_chunk(content_chunk)
+
+        if state.is_cancelled:
+            logger.warning("Agent call was cancelled, stopping the turn")
+            return
+
+        if not state.commit_round():
+            return
+
+    logger.warning(f"Maximum number of agent rounds ({max_rounds}) reached, stopping the turn")
@@ -0,0 +1,88 @@
+import json
+from collections.abc import Sequence
+from functools import lru_cache
+
+from openai.types.chat import ChatCompletionMessageParam, ChatCompletionToolMessageParam
+
+
+def compact_tool_outputs(
+    messages: Sequence[ChatCompletionMessageParam],
+    keep_turns: int,
+    min_chars: int = 1000,
+) -> list[ChatCompletionMessageParam]:
+    """Replace large tool outputs older than the last `keep_turns` turns with a short stub.
+
+    A turn starts at a user message. The stub names the tool, the size of the output and a one-line digest, and
+    points to `tool_get_tool_output` for the full output, which stays stored in `message_contents`. The input is not
+    modified, compacted messages are new objects.
+
+    Args:
+        messages (Sequence[ChatCompletionMessageParam]): The history, in creation order.
+        keep_turns (int): The number of most recent turns whose tool outputs are kept as they are, at least 1 because
+            the agent still has to read the outputs of the current turn.
+        min_chars (int): Outputs shorter than this are kept, a stub would not save much.
+
+    Returns:
+        list[ChatCompletionMessageParam]: The history with stale tool outputs compacted.
+    """
+
+    keep_turns = max(keep_turns, 1)
+    turn_starts = [index for index, message in enumerate(messages) if message["role"] == "user"]
+
+    if len(turn_starts) <= keep_turns:
+        return list(messages)
+
+    cutoff = turn_starts[-keep_turns]
+    tool_names: dict[str, str] = {}
+    compacted: list[ChatCompletionMessageParam] = []
+
+    for index, message in enumerate(messages):
+        if message["role"] == "assistant":
+            for tool_call in message.get("tool_calls", None) or []:
+                tool_names[tool_call["id"]] = tool_call["function"]["name"]
+
+        content = message.get("content")
+
+        if index >= cutoff or message["role"] != "tool" or not isinstance(content, str) or len(content) < min_chars:
+            compacted.append(message)
+            continue
+
+        tool_call_id = message["tool_call_id"]
+
+        compacted.append(
+            ChatCompletionToolMessageParam(
+                role="tool",
+                tool_call_id=tool_call_id,
+                content=(
+                    f"[Output of {tool_names.get(tool_call_id, 'unknown tool')} shortened, {len(content)} characters: "
+                    f"{_digest(content)}. Call tool_get_tool_output with tool_call_id {tool_call_id!r} if the full "
+                    "output is needed.]"
+                ),
+            )
+        )
+
+    return compacted
+
+
+# The same old outputs are compacted again on every agent call
+@lru_cache(maxsize=1024)
+def _digest(content: str) -> str:
+    """Describe an output in one line."""
+
+    if content.startswith("data:image/"):
+        return f"an image ({content[5:].split(';', 1)[0].split(',', 1)[0]})"
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+
+    if isinstance(data, dict):
+        return f"a JSON object with keys {', '.join(list(data)[:10])}"
+
+    if isinstance(data, list):
+        return f"a JSON list of {len(data)} items"
+
+    first_line = content.strip().split("\n", 1)[0]
+
+    return first_line if len(first_line) <= 120 else f"{first_line[:120]}..."
@@ -23,6 +23,7 @@ def db_message_to_message_model(message: messages) -> MessageResponse:
         id=message.id,
         role=cast(MessageRole, message.role),
         name=message.name,
+        is_cancelled=message.is_cancelled,
         content=[
             message_content
             for message_content in [
@@ -76,12 +77,21 @@ def file_param(content: message_contents) -> FileContent:
     if content.type != message_content_type.file:
         raise ValueError("File is required")
 
-    if content.file_data is None:
-        raise ValueError("File data is required")
-
     if content.file_name is None:
         raise ValueError("File name is required")
 
+    # Files in the file storage are not loaded with the message, clients get them from the file endpoint
+    if content.file_ref is not None:
+        return FileContent(
+            id=content.id,
+            type="file",
+            file_name=content.file_name,
+            file_size=content.file_size,
+        )
+
+    if content.file_data is None:
+        raise ValueError("File data is required")
+
     return FileContent(
         id=content.id,
         type="file",
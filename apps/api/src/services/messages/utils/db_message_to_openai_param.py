@@ -1,3 +1,5 @@
+import json
+
 from openai.types.chat import (
     ChatCompletionAssistantMessageParam,
     ChatCompletionContentPartImageParam,
@@ -14,6 +16,8 @@ from prisma import Base64
 from prisma.enums import message_content_type, message_role
 from prisma.models import message_contents, messages
 
+from src.utils.file_refs import encode_file_ref
+
 
 def db_message_to_openai_param(message: messages) -> ChatCompletionMessageParam:
     """Convert database message to OpenAI message parameter.
@@ -143,12 +147,22 @@ def file_param(content: message_contents) -> File:
     if content.type != message_content_type.file:
         raise ValueError("File is required")
 
-    if content.file_data is None:
-        raise ValueError("File data is required")
-
     if content.file_name is None:
         raise ValueError("File name is required")
 
+    # Files in the file storage get a placeholder, `resolve_file_refs` fetches the ones that are sent to the model
+    if content.file_ref is not None:
+        return File(
+            type="file",
+            file={
+                "file_data": encode_file_ref(content.file_ref, content.file_size or 0),
+                "filename": content.file_name,
+            },
+        )
+
+    if content.file_data is None:
+        raise ValueError("File data is required")
+
     return File(
         type="file",
         file={
@@ -176,7 +190,7 @@ def tool_call_param(content: message_contents) -> ChatCompletionMessageToolCallP
         type="function",
         function={
             "name": content.tool_name,
-            "arguments": str(content.tool_input),
+            "arguments": json.dumps(content.tool_input),
         },
     )
 
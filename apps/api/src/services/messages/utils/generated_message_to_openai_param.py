@@ -109,7 +109,7 @@ def file_content_to_openai_param(content: FileContent) -> File:
     return File(
         type="file",
         file={
-            "file_data": content.file_data,
+            "file_data": content.file_data or "",
             "filename": content.file_name,
         },
     )
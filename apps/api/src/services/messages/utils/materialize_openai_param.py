@@ -0,0 +1,26 @@
+from typing import Any, cast
+
+from openai.types.chat import ChatCompletionMessageParam
+from prisma import Json
+
+
+def materialize_openai_param(param: ChatCompletionMessageParam) -> dict[str, Any]:
+    """Get the `openai_param` column data for a message, so history loading can skip the conversion.
+
+    Messages with file parts are not materialized, their payload already lives in the file storage (or in
+    `message_contents.file_data` for older files) and would otherwise be stored twice. They are converted from their
+    contents when the history is loaded.
+
+    Args:
+        param (ChatCompletionMessageParam): The provider-ready message.
+
+    Returns:
+        dict[str, Any]: The fields to add to the `messages` create data, empty if the message is not materialized.
+    """
+
+    content = param.get("content")
+
+    if isinstance(content, list) and any(cast(dict, part).get("type") == "file" for part in content):
+        return {}
+
+    return {"openai_param": Json(param)}
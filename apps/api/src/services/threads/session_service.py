@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytz
+from openai.types.chat import ChatCompletionAssistantMessageParam
+from prisma import Json
+from prisma.models import messages, threads
+
+from src.lib.prisma import prisma
+from src.logger import logger
+from src.services.messages.utils.materialize_openai_param import materialize_openai_param
+from src.services.threads.welcome import decide_welcome, welcome_agent_class
+
+TIMEZONE = pytz.timezone("Europe/Amsterdam")
+
+
+class SessionService:
+    @classmethod
+    async def ensure_welcome_message(
+        cls, thread: threads, has_messages: bool | None = None
+    ) -> tuple[messages, threads] | None:
+        """Add a welcome message to a thread that is opened for the first time or after a while.
+
+        The decision only needs the metadata of the thread and whether it has any messages, which the
+        `(thread_id, created_at, id)` index of `messages` answers without reading them. The message and the new
+        metadata are written in one transaction.
+
+        Args:
+            thread (threads): The thread that is opened, its messages do not have to be included.
+            has_messages (bool | None): Whether the thread has any messages, if the caller already knows.
+
+        Returns:
+            tuple[messages, threads] | None: The welcome message with its contents and the updated thread, so the
+                caller does not have to fetch them again. None if no welcome message was added.
+        """
+
+        agent_class = welcome_agent_class(thread.external_id)
+
+        if agent_class is None:
+            return None
+
+        metadata = dict(thread.metadata) if thread.metadata else {}
+
+        if has_messages is None:
+            has_messages = await prisma.messages.count(where={"thread_id": thread.id}, take=1) > 0
+
+        now = datetime.now(TIMEZONE)
+        decision = decide_welcome(metadata, has_messages, now)
+
+        if decision is None:
+            return None
+
+        logger.info(
+            f"Adding welcome message to thread {thread.id} (reason: {decision.reason}, agent: {agent_class}, "
+            f"welcome_back: {decision.is_welcome_back})"
+        )
+
+        metadata["last_interaction_time"] = now.isoformat()
+
+        if decision.is_welcome_back:
+            metadata["last_welcome_date"] = now.date().isoformat()
+
+        async with prisma.tx() as transaction:
+            message = await transaction.messages.create(
+                data={
+                    "thread_id": thread.id,
+                    "role": "assistant",
+                    "agent_class": agent_class,
+                    "contents": {"create": [{"type": "text", "text": decision.text}]},
+                    **materialize_openai_param(
+                        ChatCompletionAssistantMessageParam(role="assistant", content=decision.text)
+                    ),  # type: ignore[typeddict-item]
+                },
+                include={"contents": True},
+            )
+            updated_thread = await transaction.threads.update(
+                where={"id": thread.id}, data={"metadata": Json(metadata)}
+            )
+
+        assert updated_thread is not None
+
+        return message, updated_thread
@@ -0,0 +1,82 @@
+from datetime import UTC, datetime
+from typing import Literal
+
+from src.lib.prisma import prisma
+from src.models.threads import ThreadSummaryResponse
+
+PREVIEW_LENGTH = 200
+
+
+class ThreadSummaryService:
+    @classmethod
+    async def list_summaries(
+        cls,
+        limit: int,
+        offset: int,
+        order: Literal["asc", "desc"] = "desc",
+        after: tuple[datetime, str] | None = None,
+    ) -> list[ThreadSummaryResponse]:
+        """List threads with their message count, last activity and a preview of the last message.
+
+        Everything is aggregated by the database in a single query, no message or content rows are transferred.
+
+        Args:
+            limit (int): The maximum number of threads.
+            offset (int): The number of threads to skip.
+            order (Literal["asc", "desc"]): The order of the threads by creation time.
+            after (tuple[datetime, str] | None): Only threads after this decoded cursor, see `src.utils.cursor`.
+
+        Returns:
+            list[ThreadSummaryResponse]: The summaries of the threads.
+        """
+
+        # `order` is a literal, never user input, so it is safe to interpolate
+        direction, operator = ("ASC", ">") if order == "asc" else ("DESC", "<")
+
+        rows = await prisma.query_raw(
+            f"""
+            SELECT
+                t.id,
+                t.external_id,
+                t.created_at,
+                t.updated_at,
+                t.metadata,
+                stats.message_count,
+                stats.last_activity_at,
+                last_message.data AS last_message
+            FROM threads t
+            CROSS JOIN LATERAL (
+                SELECT count(*)::int AS message_count, max(m.created_at) AS last_activity_at
+                FROM messages m
+                WHERE m.thread_id = t.id
+            ) stats
+            LEFT JOIN LATERAL (
+                SELECT jsonb_build_object(
+                    'id', m.id,
+                    'role', m.role,
+                    'preview', left(text_contents.text, $3),
+                    'created_at', m.created_at
+                ) AS data
+                FROM messages m
+                JOIN LATERAL (
+                    SELECT string_agg(c.text, '' ORDER BY c.created_at) AS text
+                    FROM message_contents c
+                    WHERE c.message_id = m.id AND c.type = 'text' AND c.text <> ''
+                ) text_contents ON text_contents.text IS NOT NULL
+                WHERE m.thread_id = t.id AND m.role IN ('user', 'assistant')
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT 1
+            ) last_message ON true
+            WHERE $4::timestamp IS NULL OR (t.created_at, t.id) {operator} ($4::timestamp, $5::uuid)
+            ORDER BY t.created_at {direction}, t.id {direction}
+            LIMIT $1 OFFSET $2
+            """,
+            limit,
+            offset,
+            PREVIEW_LENGTH,
+            # `created_at` is stored as UTC without a time zone
+            after[0].astimezone(UTC).replace(tzinfo=None).isoformat() if after else None,
+            after[1] if after else None,
+        )
+
+        return [ThreadSummaryResponse.model_validate(row) for row in rows]
@@ -0,0 +1,123 @@
+import re
+from datetime import datetime, timedelta
+from typing import Any
+
+from pydantic import BaseModel
+
+from src.logger import logger
+
+# Order matters, more specific patterns first
+AGENT_CLASS_BY_EXTERNAL_ID = {
+    "mumc-server-test": "MUMCAgentTest",
+    "mumc-server": "MUMCAgent",
+}
+
+SESSION_TIMEOUT = timedelta(hours=4)
+
+FIRST_VISIT_TEXT = (
+    "👋 Hallo!\n\n"
+    "Welkom bij de 1e testversie van de nieuwe "
+    "E-Supporter app van Easylog en het MUMC+.\n\n"
+    "Zullen we beginnen met testen?"
+)
+
+# Memories end with the time they were saved, e.g. "(datum: 2025-06-02 23:12)"
+_MEMORY_DATE = re.compile(r"\s*\(datum:\s*[^)]+\)\s*")
+_NOT_A_NAME = ("goal", "zlm", "score", "stappen", "medicatie")
+
+
+class WelcomeDecision(BaseModel):
+    reason: str
+    text: str
+    is_welcome_back: bool
+
+
+def welcome_agent_class(external_id: str | None) -> str | None:
+    """The agent that welcomes users of a thread, None for threads that get no welcome message."""
+
+    if not external_id:
+        return None
+
+    return next(
+        (agent_class for pattern, agent_class in AGENT_CLASS_BY_EXTERNAL_ID.items() if pattern in external_id), None
+    )
+
+
+def extract_user_name(memories: Any) -> str | None:
+    """Find the name of the user in the memories of a thread.
+
+    Memories are a list of `{"id": "...", "memory": "text"}`. A name is recognized as `[name]`, `naam: name` or a
+    short capitalized memory that is not about goals, scores or medication. Empty and malformed memories are
+    skipped.
+    """
+
+    if not isinstance(memories, list):
+        return None
+
+    for memory in memories:
+        if not isinstance(memory, dict) or not isinstance(memory.get("memory"), str):
+            continue
+
+        text = _MEMORY_DATE.sub("", memory["memory"].strip()).strip()
+        lower = text.lower()
+
+        if not text:
+            continue
+
+        if text.startswith("[") and text.endswith("]"):
+            return text[1:-1].strip()
+
+        if "naam" in lower and ":" in text:
+            label, value = text.split(":", 1)
+
+            if "naam" in label.lower():
+                return value.split(",")[0].strip()
+        elif len(text.split()) <= 3 and text[0].isupper() and not any(word in lower for word in _NOT_A_NAME):
+            return text
+
+    return None
+
+
+def decide_welcome(metadata: dict[str, Any], has_messages: bool, now: datetime) -> WelcomeDecision | None:
+    """Decide whether a thread that is opened now starts with a welcome message.
+
+    A thread without messages that was never welcomed gets the onboarding message. A thread with messages gets a
+    personal welcome back once the last welcome is longer than `SESSION_TIMEOUT` ago.
+
+    Args:
+        metadata (dict[str, Any]): The metadata of the thread.
+        has_messages (bool): Whether the thread has any messages.
+        now (datetime): The current time, timezone aware.
+
+    Returns:
+        WelcomeDecision | None: The welcome message to add, None if there is none.
+    """
+
+    last_interaction = metadata.get("last_interaction_time")
+
+    if not has_messages:
+        if last_interaction is not None:
+            return None
+
+        return WelcomeDecision(reason="first_time", text=FIRST_VISIT_TEXT, is_welcome_back=False)
+
+    if not last_interaction:
+        return None
+
+    try:
+        inactive = now - datetime.fromisoformat(last_interaction)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid last_interaction_time {last_interaction!r}: {e}")
+        return None
+
+    if inactive <= SESSION_TIMEOUT:
+        return None
+
+    user_name = extract_user_name(metadata.get("memories", []))
+    greeting = f"👋 Hallo {user_name}!" if user_name else "👋 Hallo!"
+
+    return WelcomeDecision(
+        reason=f"welcome_back_{inactive.total_seconds() / 60:.0f}min",
+        text=f"{greeting}\n\nFijn dat je er weer bent. Hoe gaat het vandaag met je?",
+        is_welcome_back=True,
+    )
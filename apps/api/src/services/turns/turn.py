@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import json
+import uuid
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterable
+
+from src.logger import logger
+from src.utils.sse import create_sse_event
+
+
+class Turn:
+    """An agent turn that runs detached from the HTTP request that started it.
+
+    The SSE frames produced by the turn are numbered and buffered, so clients can (re)attach at any time and receive
+    every frame after the last one they saw. Frame ids have the form `<turn id>:<sequence number>`, which is what
+    browsers and SSE clients send back in the `Last-Event-ID` header.
+
+    The buffer is bounded by `buffer_bytes`, the oldest frames are dropped first. Frames an attached subscriber has not
+    received yet are never dropped, so a slow consumer falls behind but is not cut off mid-turn. Only clients that
+    reattach after their frames were dropped have to refetch the thread.
+
+    When `abandon_after` is set, the turn is cancelled once it has had no subscribers for that many seconds, so a
+    client that went away for good does not keep the model generating.
+    """
+
+    def __init__(self, thread_id: str, buffer_bytes: int = 4 * 1024 * 1024, abandon_after: float | None = None) -> None:
+        self.id = str(uuid.uuid4())
+        self.thread_id = thread_id
+        self.is_done = False
+        self.is_cancelled = False
+
+        # (sequence number, frame, size in bytes)
+        self._frames: deque[tuple[int, str, int]] = deque()
+        self._buffer_bytes = buffer_bytes
+        self._buffered_bytes = 0
+        # The next sequence number of every attached subscriber, frames from the lowest one on are kept
+        self._positions: dict[object, int] = {}
+        self._next_sequence = 0
+        self._condition = asyncio.Condition()
+        self._task: asyncio.Task[None] | None = None
+
+        self._abandon_after = abandon_after
+        self._subscriber_count = 0
+        self._abandon_handle: asyncio.TimerHandle | None = None
+
+    @property
+    def task(self) -> asyncio.Task[None] | None:
+        return self._task
+
+    def start(self, frames: AsyncIterable[str]) -> None:
+        """Start producing frames in a background task."""
+
+        if self._task is not None:
+            raise RuntimeError(f"Turn {self.id} was already started")
+
+        self._task = asyncio.create_task(self._run(frames))
+
+    async def cancel(self) -> None:
+        """Cancel the turn and wait until it has shut down, including saving its partial output."""
+
+        if self._task is None:
+            return
+
+        self._cancel()
+
+        await asyncio.wait([self._task])
+
+    def parse_event_id(self, event_id: str | None) -> int | None:
+        """Return the sequence number of an event id of this turn, or None if it belongs to another turn."""
+
+        if not event_id:
+            return None
+
+        turn_id, _, sequence = event_id.rpartition(":")
+
+        if turn_id != self.id or not sequence.isdigit():
+            return None
+
+        return int(sequence)
+
+    async def subscribe(self, after: int | None = None) -> AsyncGenerator[str, None]:
+        """Yield the frames after sequence number `after` (all frames if None) until the turn is done."""
+
+        next_sequence = 0 if after is None else after + 1
+        subscriber = object()
+
+        self._subscriber_count += 1
+        self._positions[subscriber] = next_sequence
+
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(
+                        lambda after=next_sequence: self._next_sequence > after or self.is_done
+                    )
+
+                    oldest_sequence = self._frames[0][0] if self._frames else self._next_sequence
+                    is_expired = next_sequence < oldest_sequence
+                    offset = next_sequence - oldest_sequence
+                    frames = (
+                        [] if is_expired else [frame for _, frame, _ in itertools.islice(self._frames, offset, None)]
+                    )
+                    is_done = self.is_done
+
+                if is_expired:
+                    logger.warning(f"Turn {self.id} no longer buffers event {next_sequence}, client has to refetch")
+                    yield create_sse_event(
+                        "error",
+                        json.dumps({"detail": "The requested events are no longer available, refetch the thread"}),
+                    )
+                    return
+
+                for frame in frames:
+                    yield frame
+
+                next_sequence += len(frames)
+                self._positions[subscriber] = next_sequence
+                self._trim()
+
+                if is_done and not frames:
+                    return
+        finally:
+            self._subscriber_count -= 1
+            del self._positions[subscriber]
+            self._trim()
+
+            if self._subscriber_count == 0 and self._abandon_after is not None and not self.is_done:
+                self._abandon_handle = asyncio.get_running_loop().call_later(self._abandon_after, self._abandon)
+
+    async def _publish(self, frame: str) -> None:
+        async with self._condition:
+            frame = f"id: {self.id}:{self._next_sequence}\n{frame}"
+            size = len(frame.encode())
+
+            self._frames.append((self._next_sequence, frame, size))
+            self._buffered_bytes += size
+            self._next_sequence += 1
+            self._trim()
+            self._condition.notify_all()
+
+    def _trim(self) -> None:
+        """Drop the oldest frames over the byte budget that no attached subscriber still has to receive."""
+
+        pinned = min(self._positions.values(), default=self._next_sequence)
+
+        while self._buffered_bytes > self._buffer_bytes and self._frames and self._frames[0][0] < pinned:
+            self._buffered_bytes -= self._frames.popleft()[2]
+
+    def _cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self.is_cancelled = True
+            self._task.cancel()
+
+    def _abandon(self) -> None:
+        self._abandon_handle = None
+
+        if self._subscriber_count == 0:
+            logger.info(f"Turn {self.id} has no subscribers left, cancelling it")
+            self._cancel()
+
+    async def _run(self, frames: AsyncIterable[str]) -> None:
+        try:
+            async for frame in frames:
+                await self._publish(frame)
+        except asyncio.CancelledError:
+            await self._publish(create_sse_event("cancelled", json.dumps({"turn_id": self.id})))
+            raise
+        except Exception as e:
+            logger.error(f"Error in detached turn {self.id} for thread {self.thread_id}: {e}", exc_info=e)
+        finally:
+            async with self._condition:
+                self.is_done = True
+                self._condition.notify_all()
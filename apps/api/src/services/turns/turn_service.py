@@ -0,0 +1,63 @@
+import asyncio
+from collections.abc import AsyncIterable
+
+from src.logger import logger
+from src.services.turns.turn import Turn
+from src.settings import settings
+
+
+class TurnAlreadyRunningError(Exception):
+    pass
+
+
+class TurnService:
+    """Keeps track of the detached agent turn of every thread in this process.
+
+    Turns live in process memory, so reattaching only works against the instance that runs the turn. Finished turns
+    stay available for `TURN_RETENTION_SECONDS` so clients that were backgrounded can still collect the output. A turn
+    without subscribers is cancelled after `TURN_ABANDON_AFTER_SECONDS`, a negative value keeps it running.
+    """
+
+    _turns: dict[str, Turn] = {}
+
+    @classmethod
+    def start(cls, thread_id: str, frames: AsyncIterable[str]) -> Turn:
+        """Start a detached turn for a thread, it becomes the current turn of that thread.
+
+        Raises:
+            TurnAlreadyRunningError: If the thread already has a turn that is not done. Its output would otherwise be
+                unreachable for reattaching clients while both turns write to the thread.
+        """
+
+        current = cls._turns.get(thread_id)
+
+        if current is not None and not current.is_done:
+            raise TurnAlreadyRunningError(f"Turn {current.id} of thread {thread_id} is still running")
+
+        turn = Turn(
+            thread_id,
+            buffer_bytes=settings.TURN_EVENT_BUFFER_BYTES,
+            abandon_after=settings.TURN_ABANDON_AFTER_SECONDS if settings.TURN_ABANDON_AFTER_SECONDS >= 0 else None,
+        )
+        turn.start(frames)
+
+        cls._turns[thread_id] = turn
+
+        if turn.task is not None:
+            turn.task.add_done_callback(lambda _: cls._schedule_removal(turn))
+
+        logger.info(f"Started detached turn {turn.id} for thread {thread_id}")
+
+        return turn
+
+    @classmethod
+    def get_current(cls, thread_id: str) -> Turn | None:
+        return cls._turns.get(thread_id)
+
+    @classmethod
+    def _schedule_removal(cls, turn: Turn) -> None:
+        def remove() -> None:
+            if cls._turns.get(turn.thread_id) is turn:
+                del cls._turns[turn.thread_id]
+
+        asyncio.get_running_loop().call_later(settings.TURN_RETENTION_SECONDS, remove)
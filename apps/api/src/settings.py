@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -10,6 +12,7 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str
 
     OPENROUTER_API_KEY: str
+    OPENROUTER_BASE_URL: str = Field(default="https://openrouter.ai/api/v1")
     MISTRAL_API_KEY: str
 
     # SSH Settings
@@ -34,8 +37,40 @@ class Settings(BaseSettings):
     WEAVIATE_PORT: str = Field(default="8080")
 
     SUPABASE_ORIGIN_OVERRIDE: str | None = Field(default=None)
+
+    # SSE text delta coalescing, a delay of 0 sends every provider token as its own event
+    SSE_COALESCE_MAX_DELAY_MS: int = Field(default=40)
+    SSE_COALESCE_MAX_CHARS: int = Field(default=512)
+    # Bytes of SSE frames a turn keeps for clients that reattach, frames of attached clients are always kept
+    TURN_EVENT_BUFFER_BYTES: int = Field(default=4 * 1024 * 1024)
+    TURN_RETENTION_SECONDS: int = Field(default=300)
+    TURN_ABANDON_AFTER_SECONDS: int = Field(default=30)
+    HISTORY_CACHE_MAX_THREADS: int = Field(default=256)
+    # How far before its newest row a cached history is refetched, to pick up rows that committed late
+    HISTORY_CACHE_LOOKBACK_SECONDS: int = Field(default=60)
+    HISTORY_TOKEN_BUDGET: int = Field(default=24000)
+    HISTORY_MIN_VERBATIM_TURNS: int = Field(default=2)
+    HISTORY_SUMMARY_MIN_TOKENS: int = Field(default=2000)
+    HISTORY_SUMMARY_MODEL: str = Field(default="google/gemini-2.5-flash")
+
+    # Chat completion request policy, fallback models are a JSON object from a model to the models to try after it
+    LLM_FALLBACK_MODELS: dict[str, list[str]] = Field(default={})
+    LLM_MAX_RETRIES: int = Field(default=2)
+    LLM_RETRY_BASE_DELAY_MS: int = Field(default=500)
+    # Hedging starts a second, billed completion whenever the first token is slower than the p95, so it is opt-in
+    LLM_HEDGE_ENABLED: bool = Field(default=False)
+    LLM_HEDGE_MIN_SAMPLES: int = Field(default=20)
+
+    # Reload the agent registry when an implementation changes, for development only
+    AGENT_HOT_RELOAD: bool = Field(default=False)
+
+    # Where message files are stored, `local` keeps them in FILE_STORAGE_PATH instead, e.g. for tests
+    FILE_STORAGE_BACKEND: Literal["supabase", "local"] = Field(default="supabase")
+    FILE_STORAGE_BUCKET: str = Field(default="message-files")
+    FILE_STORAGE_PATH: str = Field(default=".file-storage")
+
     OPENAI_API_KEY: str
-    
+
     ONESIGNAL_APPERTO_API_KEY: str = Field(default="")
     ONESIGNAL_HEALTH_API_KEY: str = Field(default="")
     ONESIGNAL_HEUVEL_API_KEY: str = Field(default="")
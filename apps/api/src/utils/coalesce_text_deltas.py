@@ -0,0 +1,125 @@
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterable
+from typing import TypeVar
+
+from src.models.messages import TextDeltaContent
+
+T = TypeVar("T")
+
+_END_OF_STREAM = object()
+
+
+class _SourceError:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+async def coalesce_text_deltas(
+    chunks: AsyncIterable[T],
+    max_delay: float,
+    max_chars: int,
+) -> AsyncGenerator[T | TextDeltaContent, None]:
+    """Merge consecutive text deltas with the same id into a single delta.
+
+    Pending text is flushed once it is `max_delay` seconds old, once it reaches `max_chars` characters, and before
+    any other chunk, so the relative order of all chunks is preserved. The source is consumed in a separate task, so
+    the time window is honoured even while the source is waiting for the next token.
+
+    Args:
+        chunks (AsyncIterable[T]): The chunks to forward.
+        max_delay (float): The maximum time in seconds a delta is held back.
+        max_chars (int): The number of buffered characters that triggers a flush.
+
+    Yields:
+        T | TextDeltaContent: The chunks of the source, with text deltas merged.
+    """
+
+    if max_delay <= 0 or max_chars <= 1:
+        async for chunk in chunks:
+            yield chunk
+
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[object] = asyncio.Queue(maxsize=256)
+
+    async def produce() -> None:
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(_SourceError(e))
+            return
+        finally:
+            # When cancelled while waiting for the queue, the source is suspended at a yield and has to be closed
+            if isinstance(chunks, AsyncGenerator):
+                await chunks.aclose()
+
+        await queue.put(_END_OF_STREAM)
+
+    producer = asyncio.create_task(produce())
+
+    pending_id: str | None = None
+    pending_parts: list[str] = []
+    pending_chars = 0
+    flush_at = 0.0
+
+    def flush() -> TextDeltaContent:
+        nonlocal pending_id, pending_chars
+
+        delta = TextDeltaContent.model_construct(id=pending_id, delta="".join(pending_parts))
+
+        pending_id = None
+        pending_parts.clear()
+        pending_chars = 0
+
+        return delta
+
+    try:
+        while True:
+            if pending_id is None:
+                item = await queue.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(flush_at - loop.time(), 0))
+                except TimeoutError:
+                    yield flush()
+                    continue
+
+            if item is _END_OF_STREAM:
+                break
+
+            if isinstance(item, _SourceError):
+                if pending_id is not None:
+                    yield flush()
+
+                raise item.error
+
+            if isinstance(item, TextDeltaContent):
+                if pending_id is not None and item.id != pending_id:
+                    yield flush()
+
+                if pending_id is None:
+                    pending_id = item.id
+                    flush_at = loop.time() + max_delay
+
+                pending_parts.append(item.delta)
+                pending_chars += len(item.delta)
+
+                if pending_chars >= max_chars:
+                    yield flush()
+
+                continue
+
+            if pending_id is not None:
+                yield flush()
+
+            yield item  # type: ignore[misc]
+
+        if pending_id is not None:
+            yield flush()
+    finally:
+        producer.cancel()
+
+        # Wait for the source to shut down, so cancelling the consumer also finishes the work of the source
+        await asyncio.wait([producer])
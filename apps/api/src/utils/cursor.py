@@ -0,0 +1,60 @@
+import base64
+import binascii
+import json
+from datetime import UTC, datetime
+from typing import Any, Literal
+
+
+class InvalidCursorError(ValueError):
+    """The cursor was not created by `encode_cursor`, or was changed."""
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode the position of a row in `(created_at, id)` order as an opaque cursor.
+
+    Args:
+        created_at (datetime): The creation time of the last row of a page.
+        row_id (str): The ID of the last row of a page.
+
+    Returns:
+        str: A URL-safe cursor that continues after the row.
+    """
+
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=UTC)
+
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor created by `encode_cursor`.
+
+    Raises:
+        InvalidCursorError: The cursor is malformed.
+    """
+
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def keyset_where(cursor: tuple[datetime, str], order: Literal["asc", "desc"]) -> dict[str, Any]:
+    """A Prisma filter for the rows after `cursor` in `(created_at, id)` order.
+
+    Args:
+        cursor (tuple[datetime, str]): The decoded cursor.
+        order (Literal["asc", "desc"]): The order of the pages.
+
+    Returns:
+        dict[str, Any]: The filter, to combine with the other conditions with `AND`.
+    """
+
+    created_at, row_id = cursor
+    operator = "gt" if order == "asc" else "lt"
+
+    return {"OR": [{"created_at": {operator: created_at}}, {"created_at": created_at, "id": {operator: row_id}}]}
@@ -0,0 +1,25 @@
+import hashlib
+
+
+def make_etag(*parts: object) -> str:
+    """Create a strong ETag from the values that identify a version of a representation.
+
+    Args:
+        *parts (object): The values, e.g. the path and the version of the resource.
+
+    Returns:
+        str: The quoted ETag.
+    """
+
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an `If-None-Match` header matches an ETag, using the weak comparison RFC 9110 requires for it."""
+
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
@@ -0,0 +1,29 @@
+FILE_REF_PREFIX = "file-ref:"
+
+
+def encode_file_ref(key: str, size: int) -> str:
+    """The placeholder `file_data` of a file in the file storage, until it is resolved for the model.
+
+    Args:
+        key (str): The key of the file in the file storage.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        str: The placeholder.
+    """
+
+    return f"{FILE_REF_PREFIX}{size}:{key}"
+
+
+def decode_file_ref(file_data: str) -> tuple[str, int] | None:
+    """The key and size of a placeholder created by `encode_file_ref`, None for actual file data."""
+
+    if not file_data.startswith(FILE_REF_PREFIX):
+        return None
+
+    size, _, key = file_data.removeprefix(FILE_REF_PREFIX).partition(":")
+
+    if not size.isdigit() or not key:
+        return None
+
+    return key, int(size)
@@ -1,8 +1,15 @@
+import enum
 import inspect
+import types
 from collections.abc import Callable
-from typing import Any, cast, get_type_hints
+from typing import Any, Literal, Union, cast, get_args, get_origin, get_type_hints
 
 from openai.types.chat import ChatCompletionToolParam
+from pydantic import BaseModel, TypeAdapter
+
+# Schemas by code object, annotations, name and description. Agents define their tools as closures or bound methods
+# that are recreated on every call, but share the code object of their definition.
+_tool_schema_cache: dict[tuple[Any, ...], ChatCompletionToolParam] = {}
 
 
 def function_to_openai_tool(
@@ -11,6 +18,8 @@ def function_to_openai_tool(
     """
     Converts a Python function to an OpenAI tool specification by inspecting its signature.
 
+    The specification is computed once per function definition and shared afterwards, it must not be modified.
+
     Args:
         func: The Python function to convert
         name: Optional custom name for the tool (defaults to function name)
@@ -19,6 +28,30 @@ def function_to_openai_tool(
     Returns:
         ChatCompletionToolParam containing the tool specification
     """
+    tool_name = name or func.__name__
+    tool_description = description or func.__doc__ or ""
+
+    function = inspect.unwrap(getattr(func, "__func__", func))
+    code = getattr(function, "__code__", None)
+
+    if code is None:
+        return _build_tool_spec(func, tool_name, tool_description)
+
+    # Closures can annotate parameters with values of their config, e.g. a `Literal` of the available roles
+    cache_key = (code, tuple(getattr(function, "__annotations__", {}).items()), tool_name, tool_description)
+
+    try:
+        return _tool_schema_cache[cache_key]
+    except KeyError:
+        tool_spec = _tool_schema_cache[cache_key] = _build_tool_spec(func, tool_name, tool_description)
+    except TypeError:
+        # Annotations that are not hashable
+        return _build_tool_spec(func, tool_name, tool_description)
+
+    return tool_spec
+
+
+def _build_tool_spec(func: Callable, name: str, description: str) -> ChatCompletionToolParam:
     # Get function signature
     sig = inspect.signature(func)
 
@@ -26,14 +59,19 @@ def function_to_openai_tool(
     type_hints = get_type_hints(func)
 
     # Build parameters schema
-    parameters = {"type": "object", "properties": {}, "required": []}
+    parameters: dict[str, Any] = {"type": "object", "properties": {}, "required": []}
+    definitions: dict[str, Any] = {}
+
+    for index, (param_name, param) in enumerate(sig.parameters.items()):
+        # Unbound methods, e.g. when schemas are built from the agent class, are bound to an instance when called
+        if index == 0 and param_name == "self":
+            continue
 
-    for param_name, param in sig.parameters.items():
         # Get parameter type
         param_type = type_hints.get(param_name, Any)
 
         # Convert Python type to JSON schema type
-        json_type_info = _python_type_to_json_schema(param_type)
+        json_type_info = _python_type_to_json_schema(param_type, definitions)
 
         # Handle both string types and dictionary schema definitions
         if isinstance(json_type_info, str):
@@ -52,12 +90,16 @@ def function_to_openai_tool(
         if param.default == inspect.Parameter.empty:
             parameters["required"].append(param_name)
 
+    # Nested pydantic models reference their definitions from the root of the parameters
+    if definitions:
+        parameters["$defs"] = definitions
+
     # Build tool specification
     tool_spec = {
         "type": "function",
         "function": {
-            "name": name or func.__name__,
-            "description": description or func.__doc__ or "",
+            "name": name,
+            "description": description,
             "parameters": parameters,
         },
     }
@@ -65,16 +107,20 @@ def function_to_openai_tool(
     return cast(ChatCompletionToolParam, tool_spec)
 
 
-def _python_type_to_json_schema(py_type: type) -> str | dict:
+def _python_type_to_json_schema(py_type: Any, definitions: dict[str, Any] | None = None) -> str | dict:
     """
     Convert Python type to JSON Schema type.
 
     Args:
         py_type: Python type to convert
+        definitions: Collects the definitions referenced by pydantic models, placed in `$defs` of the parameters
 
     Returns:
         Corresponding JSON Schema type as string or dict for complex types
     """
+    if definitions is None:
+        definitions = {}
+
     # Handle basic types
     type_map = {
         str: "string",
@@ -89,14 +135,48 @@ def _python_type_to_json_schema(py_type: type) -> str | dict:
     if py_type in type_map:
         return type_map[py_type]
 
-    # Handle List type from typing module
-    origin = getattr(py_type, "__origin__", None)
-    if origin is list or origin is list:
-        # For lists, return a more complex schema
+    origin = get_origin(py_type)
+    args = get_args(py_type)
+
+    # Optional parameters are described by their type, leaving them out is how the model passes None
+    if origin is Union or origin is types.UnionType:
+        non_none_args = [arg for arg in args if arg is not type(None)]
+
+        if len(non_none_args) == 1:
+            return _python_type_to_json_schema(non_none_args[0], definitions)
+
+        return {"anyOf": [_as_schema(_python_type_to_json_schema(arg, definitions)) for arg in non_none_args]}
+
+    if origin is list or py_type is list:
         return {
             "type": "array",
-            "items": {},  # Could enhance further to specify item types
+            "items": _as_schema(_python_type_to_json_schema(args[0], definitions)) if args else {},
+        }
+
+    if origin is dict:
+        return {
+            "type": "object",
+            "additionalProperties": _as_schema(_python_type_to_json_schema(args[1], definitions))
+            if len(args) == 2
+            else True,
         }
 
+    if origin is Literal:
+        return {"type": _python_type_to_json_schema(type(args[0]), definitions), "enum": list(args)}
+
+    if inspect.isclass(py_type) and issubclass(py_type, enum.Enum):
+        return {"type": "string", "enum": [member.value for member in py_type]}
+
+    if inspect.isclass(py_type) and issubclass(py_type, BaseModel):
+        schema = TypeAdapter(py_type).json_schema(ref_template="#/$defs/{model}")
+        definitions.update(schema.pop("$defs", {}))
+        schema.pop("title", None)
+
+        return schema
+
     # Default fallback
     return "string"
+
+
+def _as_schema(json_type_info: str | dict) -> dict:
+    return {"type": json_type_info} if isinstance(json_type_info, str) else json_type_info
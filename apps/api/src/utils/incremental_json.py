@@ -0,0 +1,49 @@
+class IncrementalJsonScanner:
+    """Detects when a JSON object or array that arrives in fragments has been closed.
+
+    The scanner only tracks nesting depth and string state, it does not validate or decode the document. Once the
+    top-level value is closed `is_complete` is set. Input that cannot belong to a single object or array (a scalar
+    at the top level, or anything but whitespace after the closing bracket) marks the document as invalid for good.
+    """
+
+    __slots__ = ("_depth", "_in_string", "_is_escaped", "_is_invalid", "is_complete")
+
+    def __init__(self) -> None:
+        self._depth = 0
+        self._in_string = False
+        self._is_escaped = False
+        self._is_invalid = False
+        self.is_complete = False
+
+    def feed(self, fragment: str) -> bool:
+        """Consume the next fragment and return whether the top-level value is complete."""
+
+        if self._is_invalid:
+            return False
+
+        for char in fragment:
+            if self._in_string:
+                if self._is_escaped:
+                    self._is_escaped = False
+                elif char == "\\":
+                    self._is_escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char.isspace():
+                continue
+            elif self.is_complete or (self._depth == 0 and char not in "{["):
+                self._is_invalid = True
+                self.is_complete = False
+
+                return False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+
+                if self._depth == 0:
+                    self.is_complete = True
+
+        return self.is_complete
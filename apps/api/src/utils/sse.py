@@ -1,2 +1,18 @@
+import json
+from functools import lru_cache
+
+
 def create_sse_event(event: str, data: str) -> str:
     return f"event: {event}\ndata: {data}\n\n"
+
+
+def text_delta_json(content_id: str, delta: str) -> str:
+    """Serialize a text delta to the same JSON as `TextDeltaContent.model_dump_json()`, without building the model."""
+
+    return f"{_text_delta_json_prefix(content_id)}{json.dumps(delta, ensure_ascii=False)}}}"
+
+
+@lru_cache(maxsize=256)
+def _text_delta_json_prefix(content_id: str) -> str:
+    # All deltas of one text content share the id, so the frame up to the delta value is encoded once per content
+    return f'{{"id":{json.dumps(content_id, ensure_ascii=False)},"type":"text_delta","delta":'
@@ -0,0 +1,78 @@
+from collections.abc import Callable, Iterable
+from functools import cache, lru_cache
+from typing import Any
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.logger import logger
+from src.utils.file_refs import decode_file_ref
+
+# Fixed costs, close to what OpenAI-compatible providers bill for a message envelope and a detail=auto image
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 765
+
+# Used when no tokenizer is available, a slight overestimate for Dutch and English text
+CHARS_PER_TOKEN = 3.5
+
+
+@cache
+def _get_encoder() -> Callable[[str], int]:
+    """Load the tokenizer once, falling back to a character estimate when its encoding is not available offline."""
+
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("o200k_base")
+
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating tokens from characters: {e}")
+
+        return lambda text: int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+# History is re-estimated every turn, memoizing keeps that proportional to the new messages
+@lru_cache(maxsize=8192)
+def estimate_text_tokens(text: str) -> int:
+    return _get_encoder()(text) if text else 0
+
+
+def estimate_message_tokens(message: ChatCompletionMessageParam) -> int:
+    """Estimate the prompt tokens of a single message without calling the API.
+
+    Args:
+        message (ChatCompletionMessageParam): The provider-ready message.
+
+    Returns:
+        int: The estimated number of prompt tokens.
+    """
+
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content: Any = message.get("content")
+
+    if isinstance(content, str):
+        tokens += estimate_text_tokens(content)
+    elif isinstance(content, Iterable):
+        for part in content:
+            if part.get("type") == "text":
+                tokens += estimate_text_tokens(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            elif part.get("type") == "file":
+                file_data = part.get("file", {}).get("file_data", "")
+
+                # Files in the file storage are only fetched when they are sent, estimate them from their size
+                if file_ref := decode_file_ref(file_data):
+                    tokens += int(min(file_ref[1], 100_000) / CHARS_PER_TOKEN)
+                else:
+                    tokens += estimate_text_tokens(file_data[:100_000])
+
+    for tool_call in message.get("tool_calls", None) or []:
+        function = tool_call.get("function", {})
+        tokens += estimate_text_tokens(function.get("name", "")) + estimate_text_tokens(function.get("arguments", ""))
+
+    return tokens
+
+
+def estimate_messages_tokens(messages: Iterable[ChatCompletionMessageParam]) -> int:
+    return sum(estimate_message_tokens(message) for message in messages)
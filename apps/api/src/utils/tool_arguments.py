@@ -0,0 +1,173 @@
+import ast
+import json
+from typing import Any
+
+from src.models.tool_arguments import ToolArgumentsMetrics
+
+
+class ToolArgumentsError(ValueError):
+    """The arguments of a tool call could not be decoded into an object, not even after repairing them."""
+
+
+def decode_tool_arguments(raw: str | None) -> tuple[dict[str, Any], bool]:
+    """Decode the arguments of a tool call, repairing slightly malformed JSON.
+
+    Repairs, in order: markdown code fences, trailing commas, output that was cut off (open strings, objects and
+    arrays are closed) and Python literals such as single quotes or `True`.
+
+    Args:
+        raw (str | None): The arguments as streamed by the model.
+
+    Returns:
+        tuple[dict[str, Any], bool]: The arguments and whether they had to be repaired.
+
+    Raises:
+        ToolArgumentsError: The arguments are not an object, or could not be repaired.
+    """
+
+    text = (raw or "").strip()
+
+    if not text:
+        return {}, False
+
+    try:
+        return _as_object(json.loads(text)), False
+    except json.JSONDecodeError:
+        pass
+
+    for candidate in _repair_candidates(_strip_code_fence(text)):
+        try:
+            return _as_object(json.loads(candidate)), True
+        except json.JSONDecodeError:
+            continue
+
+    try:
+        return _as_object(ast.literal_eval(_strip_code_fence(text))), True
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError) as e:
+        raise ToolArgumentsError(f"The arguments are not valid JSON: {e}") from e
+
+
+class ToolArgumentsDecoder:
+    """Decodes tool call arguments with `decode_tool_arguments` and counts how often they needed a repair."""
+
+    def __init__(self) -> None:
+        self._decoded = 0
+        self._repaired = 0
+        self._failed = 0
+
+    def decode(self, raw: str | None) -> dict[str, Any]:
+        """Decode and count the arguments of a tool call.
+
+        Raises:
+            ToolArgumentsError: The arguments could not be decoded.
+        """
+
+        try:
+            arguments, is_repaired = decode_tool_arguments(raw)
+        except ToolArgumentsError:
+            self._failed += 1
+            raise
+
+        self._decoded += 1
+
+        if is_repaired:
+            self._repaired += 1
+
+        return arguments
+
+    def metrics(self) -> ToolArgumentsMetrics:
+        total = self._decoded + self._failed
+
+        return ToolArgumentsMetrics(
+            decoded=self._decoded,
+            repaired=self._repaired,
+            failed=self._failed,
+            repair_rate=self._repaired / total if total else 0.0,
+            failure_rate=self._failed / total if total else 0.0,
+        )
+
+
+def _as_object(value: Any) -> dict[str, Any]:
+    # Some models encode the arguments object as a JSON string
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+
+    if not isinstance(value, dict):
+        raise ToolArgumentsError(f"The arguments must be a JSON object, not {type(value).__name__}")
+
+    return value
+
+
+def _strip_code_fence(text: str) -> str:
+    if not text.startswith("```"):
+        return text
+
+    text = text[3:]
+
+    # Drop the language tag, e.g. ```json
+    text = text.split("\n", 1)[1] if "\n" in text else text
+
+    return text.rsplit("```", 1)[0].strip() if text.rstrip().endswith("```") else text.strip()
+
+
+def _repair_candidates(text: str) -> list[str]:
+    """Remove trailing commas and complete cut off output, returning the possible repairs to try in order."""
+
+    output: list[str] = []
+    closers: list[str] = []
+    in_string = False
+    is_escaped = False
+    pending_comma = False
+
+    for char in text:
+        if in_string:
+            output.append(char)
+
+            if is_escaped:
+                is_escaped = False
+            elif char == "\\":
+                is_escaped = True
+            elif char == '"':
+                in_string = False
+
+            continue
+
+        if char.isspace():
+            output.append(char)
+            continue
+
+        if char == ",":
+            if pending_comma:
+                continue
+
+            pending_comma = True
+            continue
+
+        if pending_comma:
+            pending_comma = False
+
+            # A trailing comma before a closing bracket is dropped
+            if char not in "}]":
+                output.append(",")
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+
+        output.append(char)
+
+    if in_string:
+        output.append("\\" if is_escaped else "")
+        output.append('"')
+
+    repaired = "".join(output).rstrip()
+    closing = "".join(reversed(closers))
+
+    # Output cut off after a key or a colon needs a value before it can be closed
+    return [f"{repaired}{closing}", f"{repaired}: null{closing}", f"{repaired} null{closing}"]
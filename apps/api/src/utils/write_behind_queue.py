@@ -0,0 +1,85 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+from src.logger import logger
+
+T = TypeVar("T")
+
+
+class WriteBehindQueue(Generic[T]):
+    """Hands writes to a single background worker that commits everything queued so far as one batch.
+
+    `submit` returns once the item is durable, so callers can confirm it, but the write itself does not depend on the
+    caller: a cancelled caller does not interrupt a batch that is being written. When a batch fails, its items are
+    retried one by one so a single bad item only fails its own caller.
+    """
+
+    def __init__(self, write_batch: Callable[[list[T]], Awaitable[None]], max_batch_size: int = 32) -> None:
+        self._write_batch = write_batch
+        self._max_batch_size = max_batch_size
+        self._queue: asyncio.Queue[tuple[T, asyncio.Future[None]]] = asyncio.Queue()
+        self._worker: asyncio.Task[None] | None = None
+
+    async def submit(self, item: T) -> None:
+        """Queue an item and wait until it is written.
+
+        Raises:
+            Exception: The error of the write, if the item could not be written.
+        """
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+
+        await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """Write everything that is still queued and stop the worker."""
+
+        if self._worker is None:
+            return
+
+        await self._queue.join()
+
+        self._worker.cancel()
+        await asyncio.wait([self._worker])
+        self._worker = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+
+            while len(batch) < self._max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list[tuple[T, asyncio.Future[None]]]) -> None:
+        try:
+            await self._write_batch([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+
+                if not future.done():
+                    future.set_exception(e)
+
+                return
+
+            logger.warning(f"Writing a batch of {len(batch)} items failed, retrying them one by one: {e}")
+
+            for entry in batch:
+                await self._write([entry])
+
+            return
+
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
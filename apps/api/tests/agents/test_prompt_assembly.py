@@ -0,0 +1,29 @@
+from src.agents.prompt_assembly import PromptSection, assemble_system_message, split_volatile_values
+
+
+def test_volatile_values_do_not_change_the_prompt_prefix() -> None:
+    template = "You are {{name}}. It is {{current_time}}. {{unknown}}"
+
+    first = split_volatile_values(template, {"name": "Mumc", "current_time": "10:00"}, ["current_time"])
+    second = split_volatile_values(template, {"name": "Mumc", "current_time": "10:05"}, ["current_time"])
+
+    assert first[0] == second[0]
+    assert "[missing:unknown]" in first[0].content
+    assert first[1].volatility == "turn"
+    assert "10:00" in first[1].content
+
+
+def test_sections_are_ordered_with_cache_breakpoints() -> None:
+    sections = [
+        PromptSection(content="time", volatility="turn"),
+        PromptSection(content="role", volatility="session"),
+        PromptSection(content="base"),
+    ]
+
+    message = assemble_system_message(sections, use_cache_control=True)
+    parts = list(message["content"])
+
+    assert [part["text"] for part in parts] == ["base", "role", "time"]
+    assert ["cache_control" in part for part in parts] == [True, True, False]
+
+    assert assemble_system_message(sections, use_cache_control=False)["content"] == "base\n\nrole\n\ntime"
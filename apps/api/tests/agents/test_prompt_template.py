@@ -0,0 +1,24 @@
+from src.agents.prompt_template import CompiledTemplate, compile_template
+
+
+def test_render_reports_missing_keys() -> None:
+    template = CompiledTemplate("Hi {{name}}, it is {{current_time}}. {{name}} has {{unknown}}{{}}")
+    values = {"name": "Jan", "current_time": "10:00"}
+
+    assert template.render(values) == "Hi Jan, it is 10:00. Jan has [missing:unknown]{{}}"
+    assert template.missing_keys(values) == ["unknown"]
+    assert template.keys == {"name", "current_time", "unknown"}
+
+
+def test_values_are_not_substituted_again() -> None:
+    template = compile_template("{{a}} {{b}}")
+
+    assert template.render({"a": "{{b}}", "b": 1}) == "{{b}} 1"
+    assert compile_template("{{a}} {{b}}") is template
+
+
+def test_partial_binds_static_values() -> None:
+    template = CompiledTemplate("Role: {{role}}, time: {{current_time}}, again {{role}}").partial({"role": "coach"})
+
+    assert template.keys == {"current_time"}
+    assert template.render({"current_time": "10:00"}) == "Role: coach, time: 10:00, again coach"
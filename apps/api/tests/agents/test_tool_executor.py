@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+
+from src.agents.tool_executor import SpeculativeToolCalls, ToolCallExecutor
+from src.models.stream_tool_call import StreamToolCall
+
+
+def _sleeper(name: str, delay: float, events: list[str]):
+    async def run() -> str:
+        events.append(f"start:{name}")
+        await asyncio.sleep(delay)
+        events.append(f"end:{name}")
+        return name
+
+    return run
+
+
+@pytest.mark.asyncio
+async def test_independent_calls_run_concurrently():
+    events: list[str] = []
+    executor: ToolCallExecutor[str] = ToolCallExecutor(max_concurrency=3)
+
+    started_at = time.perf_counter()
+    tasks = [executor.submit(_sleeper(name, 0.1, events)) for name in ("a", "b", "c")]
+    results = [await task for task in tasks]
+    elapsed = time.perf_counter() - started_at
+
+    assert results == ["a", "b", "c"]
+    assert elapsed < 0.25
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_is_respected():
+    running = 0
+    peak = 0
+
+    async def run() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    executor: ToolCallExecutor[None] = ToolCallExecutor(max_concurrency=2)
+    await asyncio.gather(*[executor.submit(run) for _ in range(6)])
+
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_serial_call_never_overlaps():
+    events: list[str] = []
+    executor: ToolCallExecutor[str] = ToolCallExecutor(max_concurrency=4)
+
+    tasks = [
+        executor.submit(_sleeper("read_1", 0.02, events)),
+        executor.submit(_sleeper("write", 0.01, events), is_serial=True),
+        executor.submit(_sleeper("read_2", 0.01, events)),
+    ]
+    await asyncio.gather(*tasks)
+
+    assert events.index("end:read_1") < events.index("start:write")
+    assert events.index("end:write") < events.index("start:read_2")
+
+
+@pytest.mark.asyncio
+async def test_sequential_by_default():
+    events: list[str] = []
+    executor: ToolCallExecutor[str] = ToolCallExecutor()
+
+    await asyncio.gather(*[executor.submit(_sleeper(name, 0.01, events)) for name in ("a", "b")])
+
+    assert events == ["start:a", "end:a", "start:b", "end:b"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_pending_calls():
+    events: list[str] = []
+    executor: ToolCallExecutor[str] = ToolCallExecutor()
+
+    first = executor.submit(_sleeper("a", 0.01, events))
+    second = executor.submit(_sleeper("b", 0.01, events))
+    await asyncio.sleep(0)
+    executor.cancel()
+
+    for task in (first, second):
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert events == ["start:a"]
+
+
+def _speculative(executor: ToolCallExecutor[str], tool_calls: dict[int, StreamToolCall], started: list[str]):
+    def create_run(tool_call: StreamToolCall, arguments: dict):
+        async def run() -> str:
+            started.append(tool_call.name)
+            return f"{tool_call.name}:{arguments}"
+
+        return run
+
+    return SpeculativeToolCalls(
+        executor,
+        tool_calls,
+        can_speculate=lambda tool_call: not tool_call.name.startswith("tool_update"),
+        create_run=create_run,
+    )
+
+
+def _stream_arguments(
+    speculative: SpeculativeToolCalls[str], tool_calls: dict[int, StreamToolCall], index: int, name: str, fragment: str
+) -> None:
+    if index not in tool_calls:
+        tool_calls[index] = StreamToolCall(tool_call_id=f"call_{index}", name=name, arguments=fragment)
+    else:
+        tool_calls[index].arguments += fragment
+
+    speculative.on_arguments(index, fragment)
+
+
+@pytest.mark.asyncio
+async def test_speculative_call_starts_when_arguments_close():
+    started: list[str] = []
+    tool_calls: dict[int, StreamToolCall] = {}
+    speculative = _speculative(ToolCallExecutor(), tool_calls, started)
+
+    _stream_arguments(speculative, tool_calls, 0, "tool_get_resources", '{"id"')
+    await asyncio.sleep(0)
+    assert started == []
+
+    _stream_arguments(speculative, tool_calls, 0, "tool_get_resources", ": 1}")
+    await asyncio.sleep(0)
+    assert started == ["tool_get_resources"]
+
+    task = speculative.pop(tool_calls[0])
+    assert task is not None
+    assert await task == "tool_get_resources:{'id': 1}"
+
+
+@pytest.mark.asyncio
+async def test_next_index_completes_previous_call():
+    started: list[str] = []
+    tool_calls: dict[int, StreamToolCall] = {}
+    speculative = _speculative(ToolCallExecutor(), tool_calls, started)
+
+    _stream_arguments(speculative, tool_calls, 0, "tool_get_resources", "")
+    _stream_arguments(speculative, tool_calls, 1, "tool_get_planning_project", '{"project_id": ')
+    await asyncio.sleep(0)
+
+    assert started == ["tool_get_resources"]
+    assert speculative.pop(tool_calls[1]) is None
+
+
+@pytest.mark.asyncio
+async def test_speculation_stops_at_serial_call():
+    started: list[str] = []
+    tool_calls: dict[int, StreamToolCall] = {}
+    speculative = _speculative(ToolCallExecutor(), tool_calls, started)
+
+    _stream_arguments(speculative, tool_calls, 0, "tool_update_planning_phase", '{"phase_id": 1}')
+    _stream_arguments(speculative, tool_calls, 1, "tool_get_resources", "{}")
+    await asyncio.sleep(0)
+
+    assert started == []
+    assert speculative.pop(tool_calls[0]) is None
+    assert speculative.pop(tool_calls[1]) is None
+
+
+@pytest.mark.asyncio
+async def test_changed_arguments_discard_speculative_result():
+    started: list[str] = []
+    tool_calls: dict[int, StreamToolCall] = {}
+    speculative = _speculative(ToolCallExecutor(), tool_calls, started)
+
+    _stream_arguments(speculative, tool_calls, 0, "tool_get_resources", "{}")
+    tool_calls[0].arguments += "{}"
+
+    assert speculative.pop(tool_calls[0]) is None
@@ -0,0 +1,26 @@
+"""The database of benchmarks that write to it, which is never the database of `.env`."""
+
+import os
+
+import pytest
+
+
+def use_benchmark_database() -> None:
+    """Point `DATABASE_URL` at `BENCHMARK_DATABASE_URL`, a scratch database the benchmark may fill and clean up.
+
+    Benchmarks create, change and delete threads and messages, so they only run when that database is set explicitly.
+    Otherwise they are skipped under pytest and exit when run from the command line. Call this before any `src` module
+    reads the settings.
+    """
+
+    url = os.environ.get("BENCHMARK_DATABASE_URL")
+
+    if not url:
+        message = "Set BENCHMARK_DATABASE_URL to a scratch database to run this benchmark, it writes to the database"
+
+        if "PYTEST_VERSION" in os.environ:
+            pytest.skip(message, allow_module_level=True)
+
+        raise SystemExit(message)
+
+    os.environ["DATABASE_URL"] = url
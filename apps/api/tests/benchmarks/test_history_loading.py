@@ -0,0 +1,94 @@
+"""Benchmark of the history loading at the start of a turn, for a 500-message thread.
+
+Compares rows with a materialized `openai_param` against rows that are converted from their contents. Needs a
+scratch database, run with `BENCHMARK_DATABASE_URL=... pytest -m benchmark tests/benchmarks/test_history_loading.py -s`.
+"""
+
+import time
+import uuid
+
+import pytest
+from dotenv import load_dotenv
+
+from tests.benchmarks.database import use_benchmark_database
+
+# The other settings may come from `.env`, the database never does
+load_dotenv()
+use_benchmark_database()
+
+from src.lib.prisma import prisma  # noqa: E402
+from src.models.messages import MessageResponse, TextContent, ToolResultContent, ToolUseContent  # noqa: E402
+from src.services.messages.message_service import MessageService  # noqa: E402
+
+MESSAGES = 500
+RUNS = 20
+
+
+def _generated_messages(count: int) -> list[MessageResponse]:
+    messages: list[MessageResponse] = []
+
+    while len(messages) < count:
+        tool_use_id = str(uuid.uuid4())
+
+        messages.append(
+            MessageResponse(
+                id=str(uuid.uuid4()),
+                role="assistant",
+                content=[
+                    TextContent(id=str(uuid.uuid4()), text="Hoe gaat het vandaag met je? " * 10),
+                    ToolUseContent(
+                        id=str(uuid.uuid4()),
+                        tool_use_id=tool_use_id,
+                        name="tool_get_steps_data",
+                        input={"start_date": "2025-01-01", "end_date": "2025-01-31"},
+                    ),
+                ],
+            )
+        )
+        messages.append(
+            MessageResponse(
+                id=str(uuid.uuid4()),
+                role="tool",
+                tool_use_id=tool_use_id,
+                content=[ToolResultContent(id=str(uuid.uuid4()), tool_use_id=tool_use_id, output="{}" * 200)],
+            )
+        )
+
+    return messages[:count]
+
+
+async def _time_history_loading(thread_id: str) -> float:
+    started_at = time.perf_counter()
+
+    for _ in range(RUNS):
+        MessageService.history_cache.invalidate(thread_id)
+        history = await MessageService.get_thread_history(thread_id)
+
+        assert len(history) == MESSAGES
+
+    return (time.perf_counter() - started_at) / RUNS
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_history_loading_latency():
+    await prisma.connect()
+
+    thread = await prisma.threads.create(data={"external_id": f"benchmark-{uuid.uuid4()}"})
+
+    try:
+        await MessageService.save_turn(thread.id, "Benchmark", None, _generated_messages(MESSAGES))
+
+        materialized = await _time_history_loading(thread.id)
+
+        await prisma.execute_raw("UPDATE messages SET openai_param = NULL WHERE thread_id = $1::uuid", thread.id)
+
+        converted = await _time_history_loading(thread.id)
+
+        print(
+            f"\n{MESSAGES} messages: {materialized * 1000:.1f} ms materialized, "
+            f"{converted * 1000:.1f} ms converted from contents"
+        )
+    finally:
+        await prisma.threads.delete(where={"id": thread.id})
+        await prisma.disconnect()
@@ -0,0 +1,291 @@
+"""End-to-end load test of `POST /threads/{thread_id}/messages` with many concurrent SSE clients.
+
+The API runs in-process with uvicorn, against the scratch database from `BENCHMARK_DATABASE_URL`. The model,
+Weaviate and Supabase storage are replaced by the fakes in `tests/fakes`, so no API keys are needed and results are
+comparable between runs.
+Reports p50/p95 time to first token, total turn time, event loop lag of the API and peak RSS.
+
+Run with `BENCHMARK_DATABASE_URL=... pytest -m benchmark tests/benchmarks/test_load.py -s`, or with different
+parameters through `python -m tests.benchmarks.test_load --clients 100 --turns 3`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import Any
+
+import httpx
+import pytest
+import uvicorn
+from pydantic import BaseModel, Field
+
+from tests.benchmarks.database import use_benchmark_database
+from tests.fakes.openai_server import FakeLLMScript, FakeOpenAIServer, FakeToolCall, free_port
+
+use_benchmark_database()
+
+# Only the database is real, the other settings just have to exist
+for key in (
+    "API_SECRET_KEY",
+    "SUPABASE_URL",
+    "SUPABASE_KEY",
+    "OPENROUTER_API_KEY",
+    "MISTRAL_API_KEY",
+    "OPENAI_API_KEY",
+):
+    os.environ.setdefault(key, "load-test")
+
+from openai.types.chat import ChatCompletionMessageParam  # noqa: E402
+
+from src.agents.agent_loader import AgentLoader  # noqa: E402
+from src.agents.base_agent import BaseAgent  # noqa: E402
+from src.agents.tool_registry import ToolRegistry  # noqa: E402
+from src.settings import settings  # noqa: E402
+from tests.fakes.services import service_fakes  # noqa: E402
+
+
+class LoadTestAgentConfig(BaseModel):
+    model: str = Field(default="fake/load-test")
+    prompt: str = Field(default="Je bent een behulpzame assistent. Het is nu {{current_time}}.\n\n" + "Regel. " * 2000)
+
+
+class LoadTestAgent(BaseAgent[LoadTestAgentConfig]):
+    """Builds its prompt and calls the model like the production agents, with one cheap tool."""
+
+    def on_init(self) -> None:
+        pass
+
+    async def on_message(self, messages: Iterable[ChatCompletionMessageParam], retry_count: int = 0) -> Any:
+        tools = ToolRegistry([self.tool_lookup_order])
+
+        stream = await self.client.chat.completions.create(
+            model=self.config.model,
+            messages=[
+                self.build_system_message(
+                    self.config.prompt, {"current_time": datetime.now().isoformat()}, self.config.model
+                ),
+                *messages,
+            ],
+            stream=True,
+            stream_options={"include_usage": True},
+            tools=tools.openai_tools,
+            tool_choice="auto",
+        )
+
+        return stream, tools
+
+    async def on_super_agent_call(self, messages: Iterable[ChatCompletionMessageParam]) -> None:
+        return None
+
+    async def tool_lookup_order(self, order_id: str) -> str:
+        """Look up the status of an order.
+
+        Args:
+            order_id (str): The ID of the order.
+        """
+
+        return json.dumps({"order_id": order_id, "status": "shipped", "items": [{"sku": "A-1", "quantity": 2}]})
+
+
+class LoadTestReport(BaseModel):
+    clients: int
+    turns: int
+    failed_turns: int
+    duration_s: float
+    ttft_p50_ms: float | None
+    ttft_p95_ms: float | None
+    turn_p50_ms: float | None
+    turn_p95_ms: float | None
+    loop_lag_p95_ms: float | None
+    loop_lag_max_ms: float | None
+    peak_rss_mb: float
+    llm_requests: int
+
+
+class _ApiServer:
+    """Runs the API in a thread with its own event loop, sampling the lag of that loop."""
+
+    def __init__(self, port: int, lag_interval: float = 0.01) -> None:
+        from src.main import app
+
+        self.port = port
+        self.lag_samples_ms: list[float] = []
+        self._lag_interval = lag_interval
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name="load-test-api", daemon=True)
+
+    async def _serve(self) -> None:
+        monitor = asyncio.create_task(self._monitor_lag())
+
+        try:
+            await self._server.serve()
+        finally:
+            monitor.cancel()
+
+    async def _monitor_lag(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self._lag_interval)
+            self.lag_samples_ms.append((time.perf_counter() - started_at - self._lag_interval) * 1000)
+
+    def start(self) -> None:
+        self._thread.start()
+
+        deadline = time.monotonic() + 60
+
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("The API did not start")
+
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+async def _run_client(base_url: str, turns: int, ttfts: list[float], durations: list[float]) -> int:
+    """Chat through one thread, returning the number of failed turns."""
+
+    failed = 0
+    headers = {"Authorization": f"Bearer {settings.API_SECRET_KEY}"}
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120) as client:
+        thread = (await client.post("/threads", json={})).raise_for_status().json()
+
+        try:
+            for turn in range(turns):
+                started_at = time.perf_counter()
+                first_token_at: float | None = None
+                is_done = False
+                event = ""
+
+                async with client.stream(
+                    "POST",
+                    f"/threads/{thread['id']}/messages",
+                    json={
+                        "content": [{"type": "text", "text": f"Waar is bestelling {turn}?"}],
+                        "agent_config": {"agent_class": LoadTestAgent.__name__},
+                    },
+                ) as response:
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[7:]
+                        elif line.startswith("data: ") and event == "content" and first_token_at is None:
+                            if '"type":"text_delta"' in line:
+                                first_token_at = time.perf_counter()
+                        elif line.startswith("data: ") and event == "done":
+                            is_done = True
+                        elif line.startswith("data: ") and event == "error":
+                            break
+
+                if not is_done or first_token_at is None:
+                    failed += 1
+                    continue
+
+                ttfts.append((first_token_at - started_at) * 1000)
+                durations.append((time.perf_counter() - started_at) * 1000)
+        finally:
+            await client.delete(f"/threads/{thread['id']}")
+
+    return failed
+
+
+def _percentile(values: Sequence[float], percentile: float) -> float | None:
+    if not values:
+        return None
+
+    ordered = sorted(values)
+
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * percentile))], 1)
+
+
+def run_load_test(clients: int = 20, turns: int = 2, script: FakeLLMScript | None = None) -> LoadTestReport:
+    """Run `clients` concurrent conversations of `turns` turns each against an in-process API.
+
+    Args:
+        clients (int): The number of concurrent SSE clients, each with its own thread.
+        turns (int): The number of messages each client sends, one after the other.
+        script (FakeLLMScript | None): The behaviour of the fake model, by default one tool call per turn.
+
+    Returns:
+        LoadTestReport: The measurements.
+    """
+
+    script = script or FakeLLMScript(tool_calls=[FakeToolCall(name="tool_lookup_order", arguments={"order_id": "1"})])
+
+    AgentLoader.register(LoadTestAgent)
+
+    with FakeOpenAIServer(script) as llm, service_fakes(llm.base_url):
+        api = _ApiServer(port=free_port())
+        api.start()
+
+        ttfts: list[float] = []
+        durations: list[float] = []
+
+        async def run_clients() -> list[int]:
+            return await asyncio.gather(
+                *(_run_client(f"http://127.0.0.1:{api.port}", turns, ttfts, durations) for _ in range(clients))
+            )
+
+        started_at = time.perf_counter()
+
+        try:
+            failed = sum(asyncio.run(run_clients()))
+        finally:
+            api.stop()
+
+        return LoadTestReport(
+            clients=clients,
+            turns=turns,
+            failed_turns=failed,
+            duration_s=round(time.perf_counter() - started_at, 2),
+            ttft_p50_ms=_percentile(ttfts, 0.5),
+            ttft_p95_ms=_percentile(ttfts, 0.95),
+            turn_p50_ms=_percentile(durations, 0.5),
+            turn_p95_ms=_percentile(durations, 0.95),
+            loop_lag_p95_ms=_percentile(api.lag_samples_ms, 0.95),
+            loop_lag_max_ms=round(max(api.lag_samples_ms), 1) if api.lag_samples_ms else None,
+            # Linux reports kilobytes, this includes the clients and the fake model running in the same process
+            peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            llm_requests=llm.requests,
+        )
+
+
+@pytest.mark.benchmark
+def test_load():
+    report = run_load_test()
+
+    print(f"\n{report.model_dump_json(indent=2)}")
+
+    assert report.failed_turns == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--ttft-ms", type=float, default=FakeLLMScript().ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeLLMScript().tokens_per_second)
+    parser.add_argument("--no-tool-calls", action="store_true", help="Answer with text only, without a tool round")
+    args = parser.parse_args()
+
+    print(
+        run_load_test(
+            clients=args.clients,
+            turns=args.turns,
+            script=FakeLLMScript(
+                ttft_ms=args.ttft_ms,
+                tokens_per_second=args.tokens_per_second,
+                tool_calls=[]
+                if args.no_tool_calls
+                else [FakeToolCall(name="tool_lookup_order", arguments={"order_id": "1"})],
+            ),
+        ).model_dump_json(indent=2)
+    )
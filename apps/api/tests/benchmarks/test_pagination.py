@@ -0,0 +1,109 @@
+"""Benchmark of paging through a 10k-message thread with `offset` and with `cursor`.
+
+Needs a scratch database, run with
+`BENCHMARK_DATABASE_URL=... pytest -m benchmark tests/benchmarks/test_pagination.py -s`.
+"""
+
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from dotenv import load_dotenv
+
+from tests.benchmarks.database import use_benchmark_database
+
+# The other settings may come from `.env`, the database never does
+load_dotenv()
+use_benchmark_database()
+
+from src.api.dependencies import ThreadRead  # noqa: E402
+from src.api.messages import get_messages  # noqa: E402
+from src.lib.prisma import prisma  # noqa: E402
+
+MESSAGES = 10_000
+PAGE_SIZE = 100
+
+
+async def _create_thread_with_messages(count: int) -> str:
+    thread = await prisma.threads.create(data={"external_id": f"benchmark-{uuid.uuid4()}"})
+    started_at = datetime.now(UTC) - timedelta(days=1)
+    message_ids = [str(uuid.uuid4()) for _ in range(count)]
+
+    await prisma.messages.create_many(
+        data=[
+            {
+                "id": message_id,
+                "thread_id": thread.id,
+                "role": "user" if index % 2 == 0 else "assistant",
+                "agent_class": "Benchmark",
+                # Pairs of messages share a timestamp, so pages have to break ties on the ID
+                "created_at": started_at + timedelta(milliseconds=index // 2),
+            }
+            for index, message_id in enumerate(message_ids)
+        ]
+    )
+    await prisma.message_contents.create_many(
+        data=[
+            {"message_id": message_id, "type": "text", "text": f"Bericht {index}"}
+            for index, message_id in enumerate(message_ids)
+        ]
+    )
+
+    return thread.id
+
+
+async def _page_through(thread_id: str, use_cursor: bool) -> tuple[list[str], list[float]]:
+    """Read every page, returning the message IDs in order and the time of every page."""
+
+    # Conditional requests are not part of the benchmark, the route gets its thread as if there was no ETag
+    read = ThreadRead(await prisma.threads.find_unique(where={"id": thread_id}), None)
+    ids: list[str] = []
+    durations: list[float] = []
+    cursor: str | None = None
+
+    while True:
+        started_at = time.perf_counter()
+        page = await get_messages(
+            read=read,
+            thread_id=thread_id,
+            limit=PAGE_SIZE,
+            offset=0 if use_cursor else len(ids),
+            order="asc",
+            cursor=cursor,
+        )
+        durations.append(time.perf_counter() - started_at)
+
+        ids.extend(message.id for message in page.data)
+
+        if use_cursor:
+            cursor = page.next_cursor
+
+            if cursor is None:
+                return ids, durations
+        elif len(page.data) < PAGE_SIZE:
+            return ids, durations
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_pagination_latency():
+    await prisma.connect()
+
+    thread_id = await _create_thread_with_messages(MESSAGES)
+
+    try:
+        offset_ids, offset_durations = await _page_through(thread_id, use_cursor=False)
+        cursor_ids, cursor_durations = await _page_through(thread_id, use_cursor=True)
+
+        assert len(cursor_ids) == len(set(cursor_ids)) == MESSAGES
+        assert cursor_ids == offset_ids
+
+        for name, durations in (("offset", offset_durations), ("cursor", cursor_durations)):
+            print(
+                f"\n{name}: {sum(durations) * 1000:.0f} ms for {len(durations)} pages, "
+                f"first page {durations[0] * 1000:.1f} ms, last page {durations[-1] * 1000:.1f} ms"
+            )
+    finally:
+        await prisma.threads.delete(where={"id": thread_id})
+        await prisma.disconnect()
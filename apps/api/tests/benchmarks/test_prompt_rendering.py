@@ -0,0 +1,83 @@
+"""Benchmark of rendering the `{{placeholder}}` prompts of the agent configs in `implementations/json`.
+
+Compares the compiled templates against the per-key `str.replace` substitution the agents used, run with
+`pytest -m benchmark tests/benchmarks/test_prompt_rendering.py -s`.
+"""
+
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from src.agents.prompt_template import compile_template
+
+CONFIGS_PATH = Path(__file__).parents[2] / "src" / "agents" / "implementations" / "json"
+RUNS = 200
+
+
+def _legacy_substitute(template_string: str, data_dict: dict[str, Any]) -> str:
+    output_string = template_string
+
+    for key, value in data_dict.items():
+        output_string = output_string.replace("{{" + key + "}}", str(value))
+
+    return re.sub(r"\{\{([^}]+)\}\}", lambda match: f"[missing:{match.group(1)}]", output_string)
+
+
+def _templates(value: Any) -> list[str]:
+    if isinstance(value, dict):
+        return [template for item in value.values() for template in _templates(item)]
+
+    if isinstance(value, list):
+        return [template for item in value for template in _templates(item)]
+
+    return [value] if isinstance(value, str) and "{{" in value else []
+
+
+def _load_templates() -> list[str]:
+    templates: list[str] = []
+
+    for path in sorted(CONFIGS_PATH.glob("*.json")):
+        try:
+            templates.extend(_templates(json.loads(path.read_text(encoding="utf-8"))))
+        except ValueError:
+            continue
+
+    return templates
+
+
+@pytest.mark.benchmark
+def test_prompt_rendering_throughput():
+    templates = _load_templates()
+
+    assert templates, f"No templates found in {CONFIGS_PATH}"
+
+    # Values like the agents pass them: many keys, most of which do not occur in a given prompt
+    keys = {key for template in templates for key in compile_template(template).keys}
+    values = {key: f"value of {key} " * 20 for key in sorted(keys)[::2]}
+    values.update({f"questionaire_Q{index}_question": "Hoe gaat het?" for index in range(40)})
+
+    for template in templates:
+        assert compile_template(template).render(values) == _legacy_substitute(template, values)
+
+    started_at = time.perf_counter()
+    for _ in range(RUNS):
+        for template in templates:
+            _legacy_substitute(template, values)
+    legacy = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for _ in range(RUNS):
+        for template in templates:
+            compile_template(template).render(values)
+    compiled = time.perf_counter() - started_at
+
+    total_chars = sum(len(template) for template in templates)
+
+    print(
+        f"\n{len(templates)} templates, {total_chars} characters, {len(values)} values: "
+        f"{legacy / RUNS * 1000:.2f} ms legacy, {compiled / RUNS * 1000:.2f} ms compiled per render of all templates"
+    )
@@ -0,0 +1,562 @@
+"""Replay exported threads through an agent against the fake model, recording what every turn costs.
+
+Exports are CSVs of the `messages` and `message_contents` tables, such as `tests/api/messages_rows.csv` and
+`tests/api/message_contents_rows.csv`. Every exported thread is copied into a new thread of the scratch database from
+`BENCHMARK_DATABASE_URL` and deleted afterwards, the replay does not run without it. Each recorded user message is
+sent again through `MessageService.forward_message`, with the recorded messages before it as the history. The messages
+the agent generates are removed again before the next turn, so the history always matches the export and every turn
+loads it cold, which keeps runs comparable.
+
+Per turn the replay records the database queries, the time spent loading and converting the history, the prompt tokens
+reported to the agent, the latency of every tool call and the turn time. Comparing two reports shows regressions from
+changes to history loading, prompt assembly or persistence:
+
+    BENCHMARK_DATABASE_URL=... python -m tests.benchmarks.test_replay run --output before.json
+    BENCHMARK_DATABASE_URL=... python -m tests.benchmarks.test_replay run --output after.json
+    BENCHMARK_DATABASE_URL=... python -m tests.benchmarks.test_replay compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import base64
+import csv
+import importlib
+import json
+import sys
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from pydantic import BaseModel, Field
+
+# isort: off
+# Sets the environment the `src` modules need, including `use_benchmark_database`, so it comes before them
+from tests.benchmarks.test_load import LoadTestAgent
+# isort: on
+
+from prisma import Base64, Json
+from prisma.enums import message_content_type, message_role, widget_type
+
+from src.agents.agent_loader import AgentLoader
+from src.agents.base_agent import BaseAgent
+from src.lib.prisma import prisma
+from src.models.message_create import (
+    MessageCreateInputContent,
+    MessageCreateInputFileContent,
+    MessageCreateInputImageContent,
+    MessageCreateInputTextContent,
+)
+from src.models.messages import MessageResponse
+from src.services.messages import message_service
+from src.services.messages.history_summary_service import HistorySummaryService
+from src.services.messages.message_service import MessageService
+from tests.fakes.openai_server import FakeLLMScript, FakeOpenAIServer, FakeToolCall
+from tests.fakes.services import service_fakes
+
+FIXTURES = Path(__file__).parent.parent / "api"
+
+# Timings move a little between runs, they only count as a regression above this change
+TIMING_MIN_DELTA_MS = 5.0
+
+
+class ToolTiming(BaseModel):
+    name: str
+    ms: float
+
+
+class ReplayTurn(BaseModel):
+    thread_id: str = Field(description="The ID of the exported thread.")
+    message_id: str = Field(description="The ID of the exported user message.")
+    history_messages: int = Field(description="The number of recorded messages before this turn.")
+    db_queries: int
+    history_ms: float = Field(description="The time spent in `MessageService.get_thread_history`.")
+    conversion_ms: float = Field(description="The part of `history_ms` spent converting rows to provider messages.")
+    prompt_tokens: int
+    llm_calls: int
+    tool_ms: float
+    tools: list[ToolTiming]
+    turn_ms: float
+    error: str | None = None
+
+
+class ReplayReport(BaseModel):
+    agent_class: str
+    created_at: datetime
+    turns: list[ReplayTurn]
+
+
+class Regression(BaseModel):
+    metric: str
+    turn: str | None = Field(description="`thread_id/message_id` of the turn, None for the total of all turns.")
+    before: float
+    after: float
+
+
+class _TurnRecorder:
+    """Counts queries and times history loading, conversion and tool calls while installed."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.db_queries = 0
+        self.history_ms = 0.0
+        self.conversion_ms = 0.0
+        self.tools: list[ToolTiming] = []
+        self.agents: list[BaseAgent] = []
+
+    @contextmanager
+    def install(self) -> Iterator["_TurnRecorder"]:
+        recorder = self
+        execute = type(prisma)._execute
+        get_thread_history = MessageService.get_thread_history.__func__  # type: ignore[attr-defined]
+        convert = message_service.db_message_to_openai_param
+        handle_tool_call = BaseAgent._handle_tool_call
+        get_agent = AgentLoader.get_agent.__func__  # type: ignore[attr-defined]
+
+        # Transactions run on a copy of the client, patching the class counts their queries too
+        async def counted_execute(client: Any, **kwargs: Any) -> Any:
+            recorder.db_queries += 1
+            return await execute(client, **kwargs)
+
+        async def timed_get_thread_history(cls: type[MessageService], thread_id: str) -> Any:
+            started_at = time.perf_counter()
+
+            try:
+                return await get_thread_history(cls, thread_id)
+            finally:
+                recorder.history_ms += (time.perf_counter() - started_at) * 1000
+
+        def timed_convert(message: Any) -> Any:
+            started_at = time.perf_counter()
+
+            try:
+                return convert(message)
+            finally:
+                recorder.conversion_ms += (time.perf_counter() - started_at) * 1000
+
+        async def timed_handle_tool_call(agent: BaseAgent, name: str, *args: Any, **kwargs: Any) -> Any:
+            started_at = time.perf_counter()
+
+            try:
+                return await handle_tool_call(agent, name, *args, **kwargs)
+            finally:
+                recorder.tools.append(ToolTiming(name=name, ms=round((time.perf_counter() - started_at) * 1000, 2)))
+
+        def recorded_get_agent(cls: type[AgentLoader], *args: Any, **kwargs: Any) -> BaseAgent | None:
+            agent = get_agent(cls, *args, **kwargs)
+
+            if agent is not None:
+                recorder.agents.append(agent)
+
+            return agent
+
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(type(prisma), "_execute", counted_execute))
+            stack.enter_context(
+                patch.object(MessageService, "get_thread_history", classmethod(timed_get_thread_history))
+            )
+            stack.enter_context(patch.object(message_service, "db_message_to_openai_param", timed_convert))
+            stack.enter_context(patch.object(BaseAgent, "_handle_tool_call", timed_handle_tool_call))
+            stack.enter_context(patch.object(AgentLoader, "get_agent", classmethod(recorded_get_agent)))
+
+            yield self
+
+
+def _value(row: dict[str, str], key: str) -> str | None:
+    # The exports write NULL as `null`
+    value = row.get(key)
+
+    return None if value is None or value == "null" else value
+
+
+def _timestamp(row: dict[str, str]) -> datetime:
+    return datetime.fromisoformat(row["created_at"])
+
+
+def _file_data(value: str) -> str:
+    """The base64 of an exported `bytea`, which Postgres exports as hex."""
+
+    return base64.b64encode(bytes.fromhex(value[2:])).decode() if value.startswith("\\x") else value
+
+
+def load_export(messages_csv: Path, contents_csv: Path) -> dict[str, list[tuple[dict[str, str], list[dict[str, str]]]]]:
+    """Read an export into the messages of every thread with their contents, both in creation order.
+
+    Args:
+        messages_csv (Path): The export of the `messages` table.
+        contents_csv (Path): The export of the `message_contents` table.
+
+    Returns:
+        dict[str, list[tuple[dict[str, str], list[dict[str, str]]]]]: The rows by thread ID.
+    """
+
+    contents: dict[str, list[dict[str, str]]] = defaultdict(list)
+
+    with contents_csv.open(newline="") as file:
+        for row in csv.DictReader(file):
+            contents[row["message_id"]].append(row)
+
+    threads: dict[str, list[tuple[dict[str, str], list[dict[str, str]]]]] = defaultdict(list)
+
+    with messages_csv.open(newline="") as file:
+        for row in sorted(csv.DictReader(file), key=_timestamp):
+            threads[row["thread_id"]].append((row, sorted(contents[row["id"]], key=_timestamp)))
+
+    return dict(threads)
+
+
+def _input_content(contents: list[dict[str, str]]) -> list[MessageCreateInputContent]:
+    input_content: list[MessageCreateInputContent] = []
+
+    for content in contents:
+        if content["type"] == "image" and (image_url := _value(content, "image_url")):
+            input_content.append(MessageCreateInputImageContent(image_url=image_url))
+        elif content["type"] == "file" and (file_data := _value(content, "file_data")):
+            input_content.append(
+                MessageCreateInputFileContent(
+                    file_data=_file_data(file_data), file_name=_value(content, "file_name") or "file"
+                )
+            )
+        elif content["type"] == "text":
+            input_content.append(MessageCreateInputTextContent(text=_value(content, "text") or ""))
+
+    return input_content
+
+
+async def _insert_recorded(
+    thread_id: str, agent_class: str, recorded: list[tuple[dict[str, str], list[dict[str, str]]]]
+) -> None:
+    """Copy recorded messages into the thread with new IDs, timestamped now so they follow the replayed turn."""
+
+    created_at = datetime.now(UTC)
+    message_rows: list[Any] = []
+    content_rows: list[Any] = []
+
+    def next_created_at() -> datetime:
+        nonlocal created_at
+        created_at += timedelta(milliseconds=1)
+        return created_at
+
+    for row, contents in recorded:
+        message_id = str(uuid.uuid4())
+
+        message_rows.append(
+            {
+                "id": message_id,
+                "thread_id": thread_id,
+                "role": message_role(row["role"]),
+                "name": _value(row, "name"),
+                "tool_use_id": _value(row, "tool_use_id"),
+                "refusal": _value(row, "refusal"),
+                "agent_class": _value(row, "agent_class") or agent_class,
+                "created_at": next_created_at(),
+            }
+        )
+
+        for content in contents:
+            tool_input = _value(content, "tool_input")
+            file_data = _value(content, "file_data")
+            content_widget_type = _value(content, "widget_type")
+
+            content_rows.append(
+                {
+                    "message_id": message_id,
+                    "type": message_content_type(content["type"]),
+                    "image_url": _value(content, "image_url"),
+                    "file_data": Base64.fromb64(_file_data(file_data)) if file_data else None,
+                    "file_name": _value(content, "file_name"),
+                    "text": _value(content, "text"),
+                    "widget_type": widget_type(content_widget_type) if content_widget_type else None,
+                    "tool_use_id": _value(content, "tool_use_id"),
+                    "tool_name": _value(content, "tool_name"),
+                    "tool_input": Json(json.loads(tool_input)) if tool_input else Json({}),
+                    "tool_output": _value(content, "tool_output"),
+                    "created_at": next_created_at(),
+                }
+            )
+
+    if not message_rows:
+        return
+
+    async with prisma.tx() as transaction:
+        await transaction.messages.create_many(data=message_rows)
+
+        if content_rows:
+            await transaction.message_contents.create_many(data=content_rows)
+
+
+async def _replay_thread(
+    exported_thread_id: str,
+    messages: list[tuple[dict[str, str], list[dict[str, str]]]],
+    agent_class: str,
+    agent_config: dict[str, Any],
+    metadata: dict[str, Any],
+    recorder: _TurnRecorder,
+) -> list[ReplayTurn]:
+    thread = await prisma.threads.create(data={"metadata": Json(metadata)})
+    turns: list[ReplayTurn] = []
+    recorded: list[tuple[dict[str, str], list[dict[str, str]]]] = []
+    generated_ids: list[str] = []
+    history_messages = 0
+
+    try:
+        for row, contents in messages:
+            if row["role"] != "user":
+                recorded.append((row, contents))
+                continue
+
+            # Replace what the agent generated in the previous turn with what was recorded
+            if generated_ids:
+                await prisma.messages.delete_many(where={"id": {"in": generated_ids}})
+                MessageService.history_cache.invalidate(thread.id)
+                await HistorySummaryService.invalidate(thread.id)
+                generated_ids = []
+
+            await _insert_recorded(thread.id, agent_class, recorded)
+            history_messages += len(recorded)
+            recorded = []
+
+            recorder.reset()
+            started_at = time.perf_counter()
+            error: str | None = None
+
+            try:
+                async for chunk in MessageService.forward_message(
+                    thread_id=thread.id,
+                    input_content=_input_content(contents),
+                    agent_class=agent_class,
+                    agent_config={"agent_class": agent_class, **agent_config},
+                    headers={},
+                ):
+                    if isinstance(chunk, MessageResponse):
+                        generated_ids.append(chunk.id)
+            except Exception as e:
+                error = f"{e.__class__.__name__}: {e}"
+
+            turn_ms = (time.perf_counter() - started_at) * 1000
+
+            turns.append(
+                ReplayTurn(
+                    thread_id=exported_thread_id,
+                    message_id=row["id"],
+                    history_messages=history_messages,
+                    db_queries=recorder.db_queries,
+                    history_ms=round(recorder.history_ms, 2),
+                    conversion_ms=round(recorder.conversion_ms, 2),
+                    prompt_tokens=sum(agent.prompt_usage.prompt_tokens for agent in recorder.agents),
+                    llm_calls=sum(agent.prompt_usage.calls for agent in recorder.agents),
+                    tool_ms=round(sum(tool.ms for tool in recorder.tools), 2),
+                    tools=recorder.tools,
+                    turn_ms=round(turn_ms, 2),
+                    error=error,
+                )
+            )
+
+            # The replayed user message stays, it stands in for the recorded one
+            history_messages += 1
+    finally:
+        await prisma.threads.delete(where={"id": thread.id})
+
+    return turns
+
+
+def _resolve_agent(agent: str) -> str:
+    """Register an agent given as `module:Class` and return its name, names of loaded agents are returned as is."""
+
+    if ":" not in agent:
+        return agent
+
+    module_name, class_name = agent.split(":", 1)
+    agent_class = getattr(importlib.import_module(module_name), class_name)
+    AgentLoader.register(agent_class)
+
+    return agent_class.__name__
+
+
+def run_replay(
+    messages_csv: Path = FIXTURES / "messages_rows.csv",
+    contents_csv: Path = FIXTURES / "message_contents_rows.csv",
+    agent: str = f"{LoadTestAgent.__module__}:{LoadTestAgent.__name__}",
+    agent_config: dict[str, Any] | None = None,
+    metadata: dict[str, Any] | None = None,
+    script: FakeLLMScript | None = None,
+) -> ReplayReport:
+    """Replay every user turn of an export through an agent, see the module docstring.
+
+    Args:
+        messages_csv (Path): The export of the `messages` table.
+        contents_csv (Path): The export of the `message_contents` table.
+        agent (str): The agent class, as `module:Class` or the name of a loaded agent.
+        agent_config (dict[str, Any] | None): The config of the agent, without `agent_class`.
+        metadata (dict[str, Any] | None): The metadata of the replayed threads.
+        script (FakeLLMScript | None): The behaviour of the fake model, by default one `tool_lookup_order` call per
+            turn with no artificial latency.
+
+    Returns:
+        ReplayReport: The measurements of every turn.
+    """
+
+    script = script or FakeLLMScript(
+        ttft_ms=0,
+        tokens_per_second=100_000,
+        tool_calls=[FakeToolCall(name="tool_lookup_order", arguments={"order_id": "1"})],
+    )
+
+    AgentLoader.load()
+    agent_class = _resolve_agent(agent)
+    threads = load_export(messages_csv, contents_csv)
+    recorder = _TurnRecorder()
+
+    async def replay() -> list[ReplayTurn]:
+        await prisma.connect()
+
+        try:
+            with recorder.install():
+                return [
+                    turn
+                    for thread_id, messages in threads.items()
+                    for turn in await _replay_thread(
+                        thread_id, messages, agent_class, agent_config or {}, metadata or {}, recorder
+                    )
+                ]
+        finally:
+            await MessageService.turn_writer.close()
+            await prisma.disconnect()
+
+    with FakeOpenAIServer(script) as llm, service_fakes(llm.base_url):
+        turns = asyncio.run(replay())
+
+    return ReplayReport(agent_class=agent_class, created_at=datetime.now(UTC), turns=turns)
+
+
+def compare_reports(before: ReplayReport, after: ReplayReport, threshold: float = 0.1) -> list[Regression]:
+    """Find the measurements that got worse between two replays of the same export.
+
+    Query and token counts are deterministic, so every increase of a turn is a regression. Timings are compared over
+    the total of the turns both reports have, and only count when they grew by more than `threshold` and more than
+    `TIMING_MIN_DELTA_MS`.
+
+    Args:
+        before (ReplayReport): The baseline.
+        after (ReplayReport): The replay to check.
+        threshold (float): The relative growth of a timing that is tolerated.
+
+    Returns:
+        list[Regression]: The regressions, empty when there are none.
+    """
+
+    before_turns = {(turn.thread_id, turn.message_id): turn for turn in before.turns}
+    pairs = [
+        (before_turns[(turn.thread_id, turn.message_id)], turn)
+        for turn in after.turns
+        if (turn.thread_id, turn.message_id) in before_turns
+    ]
+    regressions: list[Regression] = []
+
+    for metric in ("db_queries", "prompt_tokens", "llm_calls"):
+        regressions.extend(
+            Regression(
+                metric=metric,
+                turn=f"{new.thread_id}/{new.message_id}",
+                before=getattr(old, metric),
+                after=getattr(new, metric),
+            )
+            for old, new in pairs
+            if getattr(new, metric) > getattr(old, metric)
+        )
+
+    for metric in ("history_ms", "conversion_ms", "tool_ms", "turn_ms"):
+        old_total = sum(getattr(old, metric) for old, _ in pairs)
+        new_total = sum(getattr(new, metric) for _, new in pairs)
+
+        if new_total > old_total * (1 + threshold) and new_total - old_total > TIMING_MIN_DELTA_MS:
+            regressions.append(
+                Regression(metric=metric, turn=None, before=round(old_total, 2), after=round(new_total, 2))
+            )
+
+    return regressions
+
+
+@pytest.mark.benchmark
+def test_replay():
+    report = run_replay()
+
+    print(f"\n{report.model_dump_json(indent=2)}")
+
+    assert report.turns
+    assert all(turn.error is None for turn in report.turns)
+    assert all(turn.db_queries > 0 and turn.prompt_tokens > 0 for turn in report.turns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Replay an export and write the report")
+    run_parser.add_argument("--messages", type=Path, default=FIXTURES / "messages_rows.csv")
+    run_parser.add_argument("--contents", type=Path, default=FIXTURES / "message_contents_rows.csv")
+    run_parser.add_argument("--agent", default=f"{LoadTestAgent.__module__}:{LoadTestAgent.__name__}")
+    run_parser.add_argument("--agent-config", type=json.loads, default={}, help="JSON, without agent_class")
+    run_parser.add_argument("--metadata", type=json.loads, default={}, help="JSON metadata of the replayed threads")
+    run_parser.add_argument(
+        "--tool-call",
+        action="append",
+        default=None,
+        help="A tool the fake model calls on every turn, as NAME or NAME=JSON_ARGUMENTS. Repeatable.",
+    )
+    run_parser.add_argument("--output", type=Path, help="Write the report here instead of printing it")
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports, exits with 1 on regressions")
+    compare_parser.add_argument("before", type=Path)
+    compare_parser.add_argument("after", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        tool_calls = (
+            [
+                FakeToolCall(name=name, arguments=json.loads(arguments) if arguments else {})
+                for name, _, arguments in (tool_call.partition("=") for tool_call in args.tool_call)
+            ]
+            if args.tool_call is not None
+            else [FakeToolCall(name="tool_lookup_order", arguments={"order_id": "1"})]
+        )
+        report = run_replay(
+            messages_csv=args.messages,
+            contents_csv=args.contents,
+            agent=args.agent,
+            agent_config=args.agent_config,
+            metadata=args.metadata,
+            script=FakeLLMScript(ttft_ms=0, tokens_per_second=100_000, tool_calls=tool_calls),
+        )
+
+        if args.output:
+            args.output.write_text(report.model_dump_json(indent=2))
+        else:
+            print(report.model_dump_json(indent=2))
+    else:
+        before = ReplayReport.model_validate_json(args.before.read_text())
+        after = ReplayReport.model_validate_json(args.after.read_text())
+
+        for metric in ("db_queries", "prompt_tokens", "llm_calls", "history_ms", "conversion_ms", "tool_ms", "turn_ms"):
+            old_total = sum(getattr(turn, metric) for turn in before.turns)
+            new_total = sum(getattr(turn, metric) for turn in after.turns)
+            change = f"{(new_total - old_total) / old_total:+.1%}" if old_total else "n/a"
+            print(f"{metric:<14} {old_total:>12.1f} {new_total:>12.1f} {change:>8}")
+
+        regressions = compare_reports(before, after, args.threshold)
+
+        for regression in regressions:
+            turn = regression.turn or "total"
+            print(f"REGRESSION {regression.metric} {turn}: {regression.before} -> {regression.after}")
+
+        sys.exit(1 if regressions else 0)
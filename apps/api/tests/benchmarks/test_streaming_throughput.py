@@ -0,0 +1,83 @@
+"""Micro-benchmark of the token streaming path, from provider chunk to SSE frame.
+
+Run with `pytest -m benchmark tests/benchmarks/test_streaming_throughput.py -s`.
+"""
+
+import time
+from collections.abc import AsyncGenerator
+
+import pytest
+from dotenv import load_dotenv
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, Choice, ChoiceDelta
+from pydantic import BaseModel
+
+load_dotenv()
+
+from src.agents.base_agent import BaseAgent  # noqa: E402
+from src.agents.tool_registry import ToolRegistry  # noqa: E402
+from src.api.messages import create_content_sse_events  # noqa: E402
+from src.services.messages.turn_engine import TurnState, run_turn  # noqa: E402
+
+TOKENS = 20_000
+
+
+class StreamingBenchmarkAgent(BaseAgent[BaseModel]):
+    def on_init(self) -> None:
+        pass
+
+    async def on_message(self, messages, retry_count=0):  # noqa: ANN001, ANN201
+        raise NotImplementedError()
+
+    async def on_super_agent_call(self, messages):  # noqa: ANN001, ANN201
+        return None
+
+
+class _ProviderStream:
+    """Stands in for the `AsyncStream` of the OpenAI client."""
+
+    def __init__(self, tokens: int) -> None:
+        self.tokens = tokens
+
+    async def __aiter__(self) -> AsyncGenerator[ChatCompletionChunk, None]:
+        chunk = ChatCompletionChunk(
+            id="chatcmpl-benchmark",
+            object="chat.completion.chunk",
+            created=0,
+            model="benchmark",
+            choices=[Choice(index=0, delta=ChoiceDelta(content=" token"), finish_reason=None)],
+        )
+
+        for _ in range(self.tokens):
+            yield chunk
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_token_streaming_throughput():
+    agent = StreamingBenchmarkAgent(thread_id="benchmark", request_headers={})
+    state = TurnState([{"role": "user", "content": "benchmark"}])
+
+    frames = 0
+    chunk_count = 0
+
+    started_at = time.process_time()
+
+    async for content_chunk, _ in run_turn(
+        lambda messages: agent._handle_stream(_ProviderStream(TOKENS), ToolRegistry([]), messages),  # type: ignore[arg-type]
+        state,
+        max_rounds=1,
+    ):
+        frames += len(create_content_sse_events(content_chunk, chunk_count))
+        chunk_count += 1
+
+    cpu_seconds = time.process_time() - started_at
+
+    print(
+        f"\n{TOKENS} tokens, {frames} SSE frames in {cpu_seconds:.3f} CPU s: "
+        f"{TOKENS / cpu_seconds:,.0f} tokens/s/core"
+    )
+
+    assert chunk_count == TOKENS + 1
@@ -0,0 +1,196 @@
+"""A deterministic OpenAI-compatible chat completions server for benchmarks and replays.
+
+Serves `POST /chat/completions` with a scripted answer at a configurable time to first token and token rate. The
+first model call of a turn (the last message is from the user) answers with the scripted tool calls, if any, and the
+call after the tool results answers with text. Only depends on FastAPI and uvicorn, so it can be started before any
+`src` module reads the settings.
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+import uuid
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+
+class FakeToolCall(BaseModel):
+    name: str
+    arguments: dict[str, Any] = Field(default_factory=dict)
+
+
+class FakeLLMScript(BaseModel):
+    ttft_ms: float = Field(default=300, description="The delay before the first chunk.")
+    tokens_per_second: float = Field(default=80, description="The rate of the chunks after the first one.")
+    text: str = Field(
+        default="Dit is een gesimuleerd antwoord van het taalmodel, bedoeld om de doorvoer van de API te meten. " * 4,
+        description="The answer, streamed one word per chunk.",
+    )
+    tool_calls: list[FakeToolCall] = Field(default_factory=list, description="Called on the first call of a turn.")
+    failures: int = Field(default=0, description="The number of first requests answered with a 503.")
+
+
+class FakeOpenAIServer:
+    """Runs the fake server in a background thread, use as a context manager or with `start` and `stop`."""
+
+    def __init__(self, script: FakeLLMScript | None = None, host: str = "127.0.0.1", port: int | None = None) -> None:
+        self.script = script or FakeLLMScript()
+        self.host = host
+        self.port = port or free_port()
+        self.requests = 0
+        self.prompt_characters = 0
+        self._server = uvicorn.Server(
+            uvicorn.Config(create_fake_openai_app(self), host=self.host, port=self.port, log_level="warning")
+        )
+        self._thread = threading.Thread(target=self._server.run, name="fake-openai-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+
+        deadline = time.monotonic() + 10
+
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("The fake OpenAI server did not start")
+
+            time.sleep(0.01)
+
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+
+def create_fake_openai_app(server: FakeOpenAIServer) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/completions", response_model=None)
+    async def chat_completions(request: Request) -> StreamingResponse | JSONResponse:
+        body = await request.json()
+        messages: list[dict[str, Any]] = body.get("messages", [])
+        script = server.script
+
+        prompt_characters = len(json.dumps(messages))
+        server.requests += 1
+        server.prompt_characters += prompt_characters
+
+        if server.requests <= script.failures:
+            return JSONResponse({"error": {"message": "Scripted failure"}}, status_code=503)
+
+        is_tool_round = bool(script.tool_calls and body.get("tools") and messages and messages[-1]["role"] == "user")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "fake/model")
+        words = script.text.split(" ")
+        usage = {
+            "prompt_tokens": prompt_characters // 4,
+            "completion_tokens": len(script.tool_calls) * 20 if is_tool_round else len(words),
+            "total_tokens": 0,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(script.ttft_ms / 1000 + len(words) / script.tokens_per_second)
+
+            message: dict[str, Any] = (
+                {"role": "assistant", "content": None, "tool_calls": _tool_calls(script)}
+                if is_tool_round
+                else {"role": "assistant", "content": script.text}
+            )
+
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": message,
+                            "finish_reason": "tool_calls" if is_tool_round else "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        def chunk(delta: dict[str, Any], finish_reason: str | None = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream() -> Any:
+            await asyncio.sleep(script.ttft_ms / 1000)
+
+            if is_tool_round:
+                for index, tool_call in enumerate(_tool_calls(script)):
+                    yield chunk({"role": "assistant", "tool_calls": [{"index": index, **tool_call}]})
+
+                yield chunk({}, "tool_calls")
+            else:
+                for index, word in enumerate(words):
+                    if index > 0:
+                        await asyncio.sleep(1 / script.tokens_per_second)
+
+                    yield chunk({"role": "assistant", "content": word if index == 0 else f" {word}"})
+
+                yield chunk({}, "stop")
+
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage_chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def _tool_calls(script: FakeLLMScript) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {"name": tool_call.name, "arguments": json.dumps(tool_call.arguments)},
+        }
+        for tool_call in script.tool_calls
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+
+        return sock.getsockname()[1]
@@ -0,0 +1,137 @@
+"""In-memory stand-ins for Weaviate and Supabase storage, and a context manager that installs them with the fake LLM."""
+
+import uuid
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import patch
+
+from openai import AsyncOpenAI
+
+
+class FakeWeaviateCollection:
+    """Matches documents by the words of the query, enough for agents that search documents."""
+
+    def __init__(self) -> None:
+        self.objects: list[dict[str, Any]] = []
+        self.query = SimpleNamespace(hybrid=self._search, near_text=self._search, bm25=self._search)
+        self.data = SimpleNamespace(insert=self._insert)
+
+    async def _insert(self, properties: dict[str, Any], **_: Any) -> str:
+        self.objects.append(properties)
+
+        return str(uuid.uuid4())
+
+    async def _search(self, query: str, limit: int = 5, **_: Any) -> SimpleNamespace:
+        words = set(query.lower().split())
+        results = []
+
+        for properties in self.objects:
+            text = " ".join(str(value) for value in properties.values()).lower()
+            score = sum(1 for word in words if word in text) / max(len(words), 1)
+
+            if score > 0:
+                results.append(SimpleNamespace(properties=properties, metadata=SimpleNamespace(score=score)))
+
+        results.sort(key=lambda result: result.metadata.score, reverse=True)
+
+        return SimpleNamespace(objects=results[:limit])
+
+
+class FakeWeaviateClient:
+    def __init__(self) -> None:
+        self._collections: dict[str, FakeWeaviateCollection] = {}
+        self.collections = SimpleNamespace(
+            exists=self._exists,
+            create=self._create,
+            get=self._get,
+            list_all=self._list_all,
+        )
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def _exists(self, name: str) -> bool:
+        return name in self._collections
+
+    async def _create(self, name: str, **_: Any) -> FakeWeaviateCollection:
+        return self._get(name)
+
+    def _get(self, name: str) -> FakeWeaviateCollection:
+        return self._collections.setdefault(name, FakeWeaviateCollection())
+
+    async def _list_all(self) -> dict[str, FakeWeaviateCollection]:
+        return self._collections
+
+
+class FakeStorageBucket:
+    def __init__(self, files: dict[str, bytes], name: str) -> None:
+        self._files = files
+        self._name = name
+
+    async def upload(self, path: str, file: bytes, file_options: dict | None = None) -> SimpleNamespace:
+        self._files[f"{self._name}/{path}"] = file
+
+        return SimpleNamespace(path=path, full_path=f"{self._name}/{path}")
+
+    async def get_public_url(self, path: str) -> str:
+        return f"http://fake-storage.local/{self._name}/{path}"
+
+    async def download(self, path: str) -> bytes:
+        return self._files[f"{self._name}/{path}"]
+
+    async def remove(self, paths: list[Any]) -> list[dict]:
+        for path in paths:
+            self._files.pop(f"{self._name}/{path}", None)
+
+        return []
+
+
+class FakeSupabase:
+    """Storage only, files are kept in memory by `bucket/path`."""
+
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.storage = SimpleNamespace(from_=lambda bucket: FakeStorageBucket(self.files, bucket))
+
+
+@contextmanager
+def service_fakes(openai_base_url: str) -> Iterator[SimpleNamespace]:
+    """Point the model calls at a fake OpenAI server and replace Weaviate and Supabase storage while active.
+
+    The `src` modules must be importable, so the settings they need have to be in the environment.
+
+    Args:
+        openai_base_url (str): The base URL of the fake OpenAI server.
+
+    Yields:
+        SimpleNamespace: The installed `weaviate` and `supabase` fakes.
+    """
+
+    from src.lib.openai import llm_client
+
+    fake_openai = AsyncOpenAI(api_key="fake", base_url=openai_base_url)
+    fake_weaviate = FakeWeaviateClient()
+    fake_supabase = FakeSupabase()
+
+    async def create_fake_supabase() -> FakeSupabase:
+        return fake_supabase
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(llm_client, "client", fake_openai))
+        stack.enter_context(patch.object(llm_client, "completions_client", fake_openai.with_options(max_retries=0)))
+
+        for module in ("src.main", "src.agents.base_agent", "src.api.health", "src.api.knowledge"):
+            stack.enter_context(patch(f"{module}.weaviate_client", fake_weaviate))
+
+        for module in ("src.agents.base_agent", "src.api.knowledge"):
+            stack.enter_context(patch(f"{module}.create_supabase", create_fake_supabase))
+
+        yield SimpleNamespace(weaviate=fake_weaviate, supabase=fake_supabase)
@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import httpx
+import openai
+import pytest
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, Choice, ChoiceDelta
+
+from src.lib.llm_request_policy import LLMRequestPolicy
+from tests.fakes.openai_server import FakeLLMScript, FakeOpenAIServer
+
+
+def _chunk(content: str) -> ChatCompletionChunk:
+    return ChatCompletionChunk(
+        id="chunk",
+        choices=[Choice(index=0, delta=ChoiceDelta(content=content))],
+        created=0,
+        model="test",
+        object="chat.completion.chunk",
+    )
+
+
+class _FakeStream:
+    def __init__(self, name: str, first_chunk_delay: float) -> None:
+        self.name = name
+        self.first_chunk_delay = first_chunk_delay
+        self.is_closed = False
+
+    async def _iterate(self):
+        await asyncio.sleep(self.first_chunk_delay)
+
+        for part in ("Hallo", " daar"):
+            yield _chunk(f"{self.name}:{part}")
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def close(self) -> None:
+        self.is_closed = True
+
+
+class _FakeClient:
+    def __init__(self, responses: list[Any]) -> None:
+        self.responses = responses
+        self.models: list[str] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **_: Any) -> "_FakeClient":
+        return self
+
+    async def _create(self, model: str, **kwargs: Any) -> Any:
+        self.models.append(model)
+        response = self.responses.pop(0)
+
+        if isinstance(response, Exception):
+            raise response
+
+        return response
+
+
+def _rate_limit_error() -> openai.RateLimitError:
+    request = httpx.Request("POST", "http://localhost/chat/completions")
+
+    return openai.RateLimitError("Rate limited", response=httpx.Response(429, request=request), body=None)
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_is_hedged_and_closed() -> None:
+    slow, fast = _FakeStream("slow", 1), _FakeStream("fast", 0)
+    policy = LLMRequestPolicy(_FakeClient([slow, fast]), hedge_enabled=True, hedge_min_samples=5)  # type: ignore[arg-type]
+
+    for _ in range(5):
+        policy.stats("model").observe_ttft(20)
+
+    stream = await policy.chat.completions.create(model="model", messages=[], stream=True)
+    contents = [chunk.choices[0].delta.content async for chunk in stream]
+
+    assert contents == ["fast:Hallo", "fast: daar"]
+    assert slow.is_closed and not fast.is_closed
+
+    metrics = policy.metrics()[0]
+
+    assert (metrics.hedges, metrics.hedge_wins) == (1, 1)
+    assert metrics.tokens_per_second.count == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_are_retried_then_fall_back() -> None:
+    client = _FakeClient([_rate_limit_error(), _rate_limit_error(), _FakeStream("fallback", 0)])
+    policy = LLMRequestPolicy(
+        client,  # type: ignore[arg-type]
+        fallback_models={"primary": ["fallback"]},
+        max_retries=1,
+        retry_base_delay=0,
+    )
+
+    stream = await policy.chat.completions.create(model="primary", messages=[], stream=True)
+
+    assert [chunk.choices[0].delta.content async for chunk in stream][0] == "fallback:Hallo"
+    assert client.models == ["primary", "primary", "fallback"]
+    assert policy.stats("primary").retries == 1
+    assert policy.stats("fallback").fallbacks == 1
+
+
+@pytest.mark.asyncio
+async def test_streams_from_fake_openai_server() -> None:
+    script = FakeLLMScript(ttft_ms=10, tokens_per_second=1000, text="Hallo daar")
+
+    with FakeOpenAIServer(script) as server:
+        policy = LLMRequestPolicy(openai.AsyncOpenAI(api_key="fake", base_url=server.base_url))
+
+        stream = await policy.chat.completions.create(
+            model="fake/model", messages=[{"role": "user", "content": "Hoi"}], stream=True
+        )
+
+        assert (
+            "".join([chunk.choices[0].delta.content or "" async for chunk in stream if chunk.choices]) == "Hallo daar"
+        )
+        assert policy.metrics()[0].ttft_ms.count == 1
+
+
+@pytest.mark.asyncio
+async def test_sdk_does_not_retry_on_top_of_the_policy() -> None:
+    script = FakeLLMScript(ttft_ms=0, tokens_per_second=1000, failures=10)
+
+    with FakeOpenAIServer(script) as server:
+        # The client keeps the default SDK retries, as the application client does
+        policy = LLMRequestPolicy(
+            openai.AsyncOpenAI(api_key="fake", base_url=server.base_url), max_retries=1, retry_base_delay=0
+        )
+
+        with pytest.raises(openai.InternalServerError):
+            await policy.chat.completions.create(model="fake/model", messages=[], stream=True)
+
+        # One request and one retry by the policy, not three requests by the SDK for each of them
+        assert server.requests == 2
+        assert policy.stats("fake/model").retries == 1
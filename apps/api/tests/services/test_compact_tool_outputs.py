@@ -0,0 +1,54 @@
+import json
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.services.messages.utils.compact_tool_outputs import compact_tool_outputs
+
+
+def _turn(number: int, output: str) -> list[ChatCompletionMessageParam]:
+    return [
+        {"role": "user", "content": f"Vraag {number}"},
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [
+                {
+                    "id": f"call-{number}",
+                    "type": "function",
+                    "function": {"name": "tool_create_bar_chart", "arguments": "{}"},
+                }
+            ],
+        },
+        {"role": "tool", "tool_call_id": f"call-{number}", "content": output},
+        {"role": "assistant", "content": f"Antwoord {number}"},
+    ]
+
+
+CHART = json.dumps({"title": "Stappen", "data": [{"day": i, "steps": 1000 * i} for i in range(100)]})
+
+
+def test_only_large_outputs_of_old_turns_are_compacted():
+    history = [*_turn(0, CHART), *_turn(1, "kort"), *_turn(2, CHART), *_turn(3, CHART)]
+
+    compacted = compact_tool_outputs(history, keep_turns=2)
+
+    assert compacted[2]["content"].startswith(f"[Output of tool_create_bar_chart shortened, {len(CHART)} characters")  # type: ignore[union-attr]
+    assert "keys title, data" in compacted[2]["content"]  # type: ignore[operator]
+    assert compacted[6] is history[6]
+    assert compacted[10] is history[10] and compacted[14] is history[14]
+    assert history[2]["content"] == CHART
+
+
+def test_short_threads_are_returned_unchanged():
+    history = _turn(0, CHART)
+
+    assert compact_tool_outputs(history, keep_turns=3) == history
+
+
+def test_current_turn_is_kept_without_turns_to_keep():
+    history = [*_turn(0, CHART), *_turn(1, CHART)]
+
+    compacted = compact_tool_outputs(history, keep_turns=0)
+
+    assert compacted[2]["content"].startswith("[Output of tool_create_bar_chart shortened")  # type: ignore[union-attr]
+    assert compacted[6] is history[6]
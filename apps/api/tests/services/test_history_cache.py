@@ -0,0 +1,81 @@
+from datetime import UTC, datetime, timedelta
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.services.messages.history_cache import HistoryCache
+
+T0 = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def _row(message_id: str, seconds: int) -> tuple[str, datetime, ChatCompletionMessageParam]:
+    return message_id, T0 + timedelta(seconds=seconds), {"role": "user", "content": message_id}
+
+
+def test_only_new_rows_are_appended():
+    cache = HistoryCache()
+
+    assert cache.get("thread") is None
+    cache.extend("thread", None, [_row("a", 0), _row("b", 1), _row("c", 1)])
+
+    cached = cache.get("thread")
+    assert cached is not None and cached.last_created_at == T0 + timedelta(seconds=1)
+
+    # A `gte` fetch returns the boundary rows again, next to the rows written since
+    history = cache.extend("thread", cached, [_row("b", 1), _row("c", 1), _row("d", 1), _row("e", 2)])
+
+    assert [message["content"] for message in history] == ["a", "b", "c", "d", "e"]  # type: ignore[typeddict-item]
+    assert cache.metrics().hits == 1 and cache.metrics().misses == 1
+
+
+def test_row_that_commits_between_two_reads_is_inserted_at_its_place():
+    cache = HistoryCache(lookback=timedelta(seconds=5))
+    cache.extend("thread", None, [_row("a", 0), _row("c", 2)])
+
+    cached = cache.get("thread")
+    assert cache.fetch_from(cached) == T0 - timedelta(seconds=3)
+
+    # "b" was stamped by the database before "c" but only committed after the first read
+    history = cache.extend("thread", cached, [_row("a", 0), _row("b", 1), _row("c", 2), _row("d", 3)])
+
+    assert [message["content"] for message in history] == ["a", "b", "c", "d"]  # type: ignore[typeddict-item]
+
+    cached = cache.get("thread")
+    history = cache.extend("thread", cached, [_row("b", 1), _row("c", 2), _row("d", 3)])
+
+    assert [message["content"] for message in history] == ["a", "b", "c", "d"]  # type: ignore[typeddict-item]
+
+
+def test_returned_history_is_a_copy():
+    cache = HistoryCache()
+
+    history = cache.extend("thread", None, [_row("a", 0)])
+    history.append({"role": "user", "content": "not persisted"})
+
+    cached = cache.get("thread")
+    assert cached is not None and len(cached.messages) == 1
+
+
+def test_invalidated_entry_is_not_revived_by_a_running_fetch():
+    cache = HistoryCache()
+    cache.extend("thread", None, [_row("a", 0)])
+
+    cached = cache.get("thread")
+    cache.invalidate("thread")
+
+    history = cache.extend("thread", cached, [_row("a", 0), _row("b", 1)])
+
+    assert len(history) == 2
+    assert cache.metrics().threads == 0 and cache.metrics().invalidations == 1
+
+
+def test_least_recently_used_thread_is_evicted():
+    cache = HistoryCache(max_threads=2)
+
+    cache.extend("first", None, [_row("a", 0)])
+    cache.extend("second", None, [_row("b", 0)])
+    cache.get("first")
+    cache.extend("third", None, [_row("c", 0)])
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.metrics().evictions == 1
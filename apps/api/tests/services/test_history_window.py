@@ -0,0 +1,42 @@
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.services.messages.history_window import find_window_start
+from src.utils.token_estimator import estimate_messages_tokens
+
+
+def _turn(number: int) -> list[ChatCompletionMessageParam]:
+    return [
+        {"role": "user", "content": f"Vraag {number} " * 20},
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [
+                {"id": f"call-{number}", "type": "function", "function": {"name": "tool", "arguments": "{}"}}
+            ],
+        },
+        {"role": "tool", "tool_call_id": f"call-{number}", "content": "resultaat " * 50},
+        {"role": "assistant", "content": f"Antwoord {number} " * 20},
+    ]
+
+
+HISTORY = [message for number in range(10) for message in _turn(number)]
+TURN_TOKENS = estimate_messages_tokens(_turn(0))
+
+
+def test_whole_history_is_kept_when_it_fits():
+    assert find_window_start(HISTORY, token_budget=TURN_TOKENS * 20) == 0
+
+
+def test_window_starts_at_a_turn_boundary_within_budget():
+    window_start = find_window_start(HISTORY, token_budget=int(TURN_TOKENS * 3.5))
+
+    assert window_start == len(HISTORY) - 3 * 4
+    assert HISTORY[window_start]["role"] == "user"
+
+
+def test_minimum_turns_are_kept_over_budget():
+    assert find_window_start(HISTORY, token_budget=1, min_turns=2) == len(HISTORY) - 2 * 4
+
+
+def test_window_never_starts_before_the_summarized_part():
+    assert find_window_start(HISTORY, token_budget=TURN_TOKENS * 20, offset=8) == 8
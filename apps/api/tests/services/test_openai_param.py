@@ -0,0 +1,36 @@
+from prisma.enums import message_content_type, message_role
+from prisma.models import message_contents, messages
+
+from src.models.messages import MessageResponse, TextContent, ToolUseContent
+from src.services.messages.utils.db_message_to_openai_param import db_message_to_openai_param
+from src.services.messages.utils.generated_message_to_openai_param import generated_message_to_openai_param
+
+TOOL_INPUT = {"query": "bloeddruk", "limit": 5, "exact": True, "filters": None, "tags": ["a", "b"]}
+
+
+def test_backfilled_and_saved_rows_produce_identical_params():
+    generated = MessageResponse(
+        id="message",
+        role="assistant",
+        content=[
+            TextContent(id="text", text="Ik zoek het op."),
+            ToolUseContent(id="tool", tool_use_id="call_1", name="search", input=TOOL_INPUT),
+        ],
+    )
+    # The same message as read back from its content rows, which is what the backfill converts
+    stored = messages.model_construct(
+        id="message",
+        role=message_role.assistant,
+        contents=[
+            message_contents.model_construct(id="text", type=message_content_type.text, text="Ik zoek het op."),
+            message_contents.model_construct(
+                id="tool",
+                type=message_content_type.tool_use,
+                tool_use_id="call_1",
+                tool_name="search",
+                tool_input=TOOL_INPUT,
+            ),
+        ],
+    )
+
+    assert db_message_to_openai_param(stored) == generated_message_to_openai_param(generated)
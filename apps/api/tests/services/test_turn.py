@@ -0,0 +1,124 @@
+import asyncio
+import uuid
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from src.services.turns.turn import Turn
+
+# The size of one frame of `frames` with fewer than ten events, including its id line
+FRAME_BYTES = len(f"id: {uuid.uuid4()}:0\nevent: content\ndata: 0\n\n")
+
+
+async def frames(count: int, gate: asyncio.Event | None = None) -> AsyncGenerator[str, None]:
+    for i in range(count):
+        if gate is not None and i == count // 2:
+            await gate.wait()
+
+        yield f"event: content\ndata: {i}\n\n"
+
+
+async def collect(turn: Turn, after: int | None = None) -> list[str]:
+    return [frame async for frame in turn.subscribe(after)]
+
+
+@pytest.mark.asyncio
+async def test_turn_keeps_running_without_subscribers() -> None:
+    turn = Turn("thread")
+    turn.start(frames(10))
+
+    assert turn.task is not None
+    await turn.task
+
+    received = await collect(turn)
+
+    assert turn.is_done
+    assert len(received) == 10
+    assert received[0] == f"id: {turn.id}:0\nevent: content\ndata: 0\n\n"
+
+
+@pytest.mark.asyncio
+async def test_turn_resumes_after_last_event_id() -> None:
+    gate = asyncio.Event()
+    turn = Turn("thread")
+    turn.start(frames(10, gate))
+
+    first_connection = turn.subscribe()
+    received = [await anext(first_connection) for _ in range(3)]
+    await first_connection.aclose()
+
+    last_event_id = received[-1].split("\n", 1)[0].removeprefix("id: ")
+    gate.set()
+
+    resumed = await collect(turn, turn.parse_event_id(last_event_id))
+
+    assert [frame.split("\n", 1)[0] for frame in received + resumed] == [f"id: {turn.id}:{i}" for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_turn_reports_expired_events() -> None:
+    turn = Turn("thread", buffer_bytes=4 * FRAME_BYTES)
+    turn.start(frames(10))
+
+    assert turn.task is not None
+    await turn.task
+
+    assert turn.parse_event_id("other-turn:3") is None
+    assert len(await collect(turn, 5)) == 4
+
+    received = await collect(turn, 1)
+
+    assert len(received) == 1
+    assert received[0].startswith("event: error")
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_not_cut_off() -> None:
+    turn = Turn("thread", buffer_bytes=4 * FRAME_BYTES)
+    turn.start(frames(500))
+
+    subscriber = turn.subscribe()
+    received = [await anext(subscriber)]
+
+    # The turn produces all its frames while the subscriber has only read the first one
+    assert turn.task is not None
+    await turn.task
+
+    received += [frame async for frame in subscriber]
+
+    assert [frame.split("\n", 1)[0] for frame in received] == [f"id: {turn.id}:{i}" for i in range(500)]
+
+    # Once it is done, the buffer shrinks back to its budget for clients that reattach
+    assert await collect(turn, 497) == received[-2:]
+    assert (await collect(turn, 0))[0].startswith("event: error")
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_the_turn_and_notifies_subscribers() -> None:
+    turn = Turn("thread")
+    turn.start(frames(10, asyncio.Event()))
+
+    subscriber = asyncio.create_task(collect(turn))
+    await asyncio.sleep(0)
+    await turn.cancel()
+
+    received = await subscriber
+
+    assert turn.is_done and turn.is_cancelled
+    assert len(received) == 6
+    assert received[-1].startswith(f"id: {turn.id}:5\nevent: cancelled")
+
+
+@pytest.mark.asyncio
+async def test_turn_is_cancelled_once_abandoned() -> None:
+    turn = Turn("thread", abandon_after=0.01)
+    turn.start(frames(10, asyncio.Event()))
+
+    first_connection = turn.subscribe()
+    await anext(first_connection)
+    await first_connection.aclose()
+
+    assert turn.task is not None
+    await asyncio.wait_for(asyncio.wait([turn.task]), timeout=1)
+
+    assert turn.is_cancelled
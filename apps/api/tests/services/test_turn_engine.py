@@ -0,0 +1,174 @@
+import statistics
+import tracemalloc
+import uuid
+from collections.abc import AsyncGenerator
+
+import pytest
+from openai.types.chat import ChatCompletionMessageParam
+
+from src.models.messages import (
+    MessageContent,
+    MessageResponse,
+    TextContent,
+    TextDeltaContent,
+    ToolResultContent,
+    ToolUseContent,
+)
+from src.services.messages import turn_engine
+from src.services.messages.turn_engine import TurnState, run_turn
+from src.services.messages.utils.generated_message_to_openai_param import generated_message_to_openai_param
+
+
+class FakeToolLoopAgent:
+    """Requests one tool round per call until `tool_rounds` rounds are done, then answers with text."""
+
+    def __init__(self, tool_rounds: int, deltas_per_round: int = 20) -> None:
+        self.tool_rounds = tool_rounds
+        self.deltas_per_round = deltas_per_round
+        self.calls: list[tuple[int, int]] = []
+
+    async def forward_message(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> AsyncGenerator[tuple[MessageContent, bool], None]:
+        self.calls.append((id(messages), len(messages)))
+
+        text_id = str(uuid.uuid4())
+
+        for _ in range(self.deltas_per_round):
+            yield TextDeltaContent(id=text_id, delta="x"), False
+
+        yield TextContent(id=text_id, text="x" * self.deltas_per_round), False
+
+        if len(self.calls) > self.tool_rounds:
+            return
+
+        tool_use_id = str(uuid.uuid4())
+
+        yield ToolUseContent(id=str(uuid.uuid4()), tool_use_id=tool_use_id, name="tool_noop", input={}), False
+        yield ToolResultContent(id=str(uuid.uuid4()), tool_use_id=tool_use_id, output="None"), False
+
+
+@pytest.mark.asyncio
+async def test_tool_loop_extends_history_in_place():
+    agent = FakeToolLoopAgent(tool_rounds=15)
+    history: list[ChatCompletionMessageParam] = [{"role": "user", "content": "hi"}]
+    state = TurnState(history)
+
+    chunks = [chunk async for chunk in run_turn(agent.forward_message, state, max_rounds=16)]
+
+    # The agent always receives the same list, grown by the assistant and tool message of each round
+    assert len(agent.calls) == 16
+    assert {history_id for history_id, _ in agent.calls} == {id(history)}
+    assert [length for _, length in agent.calls] == [1 + 2 * round_index for round_index in range(16)]
+
+    # 15 tool rounds of assistant + tool message and one final assistant message
+    assert len(state.generated_messages) == 31
+    assert len(chunks) == 15 * 23 + 21
+
+
+@pytest.mark.asyncio
+async def test_tool_loop_allocates_linearly(monkeypatch: pytest.MonkeyPatch):
+    converted: list[str] = []
+
+    def convert(message: MessageResponse) -> ChatCompletionMessageParam:
+        converted.append(message.id)
+
+        return generated_message_to_openai_param(message)
+
+    monkeypatch.setattr(turn_engine, "generated_message_to_openai_param", convert)
+
+    async def run(memory_per_call: list[int]) -> TurnState:
+        agent = FakeToolLoopAgent(tool_rounds=15)
+        state = TurnState([{"role": "user", "content": "hi"}])
+
+        async def call_agent(
+            messages: list[ChatCompletionMessageParam],
+        ) -> AsyncGenerator[tuple[MessageContent, bool], None]:
+            memory_per_call.append(tracemalloc.get_traced_memory()[0])
+
+            async for item in agent.forward_message(messages):
+                yield item
+
+        _ = [chunk async for chunk in run_turn(call_agent, state, max_rounds=16)]
+
+        return state
+
+    # A first turn warms up the caches of pydantic and the logger, which would make the first rounds look cheaper
+    await run([])
+    converted.clear()
+
+    memory_per_call: list[int] = []
+    tracemalloc.start()
+
+    try:
+        state = await run(memory_per_call)
+    finally:
+        tracemalloc.stop()
+
+    # Every generated message is converted once, not again in every later round
+    assert sorted(converted) == sorted(message.id for message in state.generated_messages[:30])
+
+    # Memory retained per tool round. Copying the history every round would make later rounds grow with the number
+    # of rounds before them, a linear loop keeps every round at about the same cost.
+    growth = [after - before for before, after in zip(memory_per_call, memory_per_call[1:], strict=False)]
+
+    assert len(growth) == 15
+    # Medians, as the occasional resize of a list or dict makes single rounds more expensive
+    assert statistics.median(growth[10:]) < 1.2 * statistics.median(growth[1:6])
+
+
+@pytest.mark.asyncio
+async def test_snapshots_are_only_emitted_for_new_messages():
+    agent = FakeToolLoopAgent(tool_rounds=15)
+    state = TurnState([])
+
+    snapshots = [new_message async for _, new_message in run_turn(agent.forward_message, state, max_rounds=16)]
+    emitted = [snapshot for snapshot in snapshots if snapshot is not None]
+
+    assert [snapshot.id for snapshot in emitted] == [message.id for message in state.generated_messages]
+    assert all(snapshot.content == [] for snapshot in emitted)
+    assert [message.role for message in state.generated_messages[:2]] == ["assistant", "tool"]
+
+
+@pytest.mark.asyncio
+async def test_max_rounds_stops_the_turn():
+    agent = FakeToolLoopAgent(tool_rounds=15)
+    state = TurnState([])
+
+    _ = [chunk async for chunk in run_turn(agent.forward_message, state, max_rounds=3)]
+
+    assert len(agent.calls) == 3
+    assert len(state.generated_messages) == 6
+
+
+@pytest.mark.asyncio
+async def test_should_stop_cancels_further_rounds():
+    async def call_agent(_: list[ChatCompletionMessageParam]) -> AsyncGenerator[tuple[MessageContent, bool], None]:
+        yield ToolUseContent(id="use", tool_use_id="call", name="tool_ask_multiple_choice", input={}), False
+        yield ToolResultContent(id="result", tool_use_id="call", output="{}"), True
+
+    state = TurnState([])
+
+    _ = [chunk async for chunk in run_turn(call_agent, state)]
+
+    assert state.is_cancelled
+    assert len(state.generated_messages) == 2
+
+
+@pytest.mark.asyncio
+async def test_interrupt_keeps_streamed_text_and_answers_open_tool_calls():
+    state = TurnState([{"role": "user", "content": "hi"}])
+
+    state.start_round()
+    state.add_chunk(TextDeltaContent(id="text", delta="Hel"))
+    state.add_chunk(TextDeltaContent(id="text", delta="lo"))
+    state.add_chunk(ToolUseContent(id="use", tool_use_id="call", name="tool_noop", input={}))
+
+    state.interrupt()
+
+    assistant, tool = state.generated_messages
+
+    assert [content.type for content in assistant.content] == ["tool_use", "text"]
+    assert isinstance(assistant.content[1], TextContent) and assistant.content[1].text == "Hello"
+    assert tool.tool_use_id == "call" and tool.content[0].is_error  # type: ignore[union-attr]
+    assert tool.is_cancelled and not assistant.is_cancelled
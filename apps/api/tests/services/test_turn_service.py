@@ -0,0 +1,33 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from src.services.turns.turn_service import TurnAlreadyRunningError, TurnService
+
+
+async def frames(gate: asyncio.Event) -> AsyncGenerator[str, None]:
+    yield "event: content\ndata: 0\n\n"
+    await gate.wait()
+
+
+@pytest.mark.asyncio
+async def test_running_turn_is_not_replaced() -> None:
+    gate = asyncio.Event()
+    turn = TurnService.start("running-thread", frames(gate))
+
+    with pytest.raises(TurnAlreadyRunningError):
+        TurnService.start("running-thread", frames(gate))
+
+    assert TurnService.get_current("running-thread") is turn
+
+    gate.set()
+    assert turn.task is not None
+    await turn.task
+
+    # A finished turn makes way for the next one
+    next_turn = TurnService.start("running-thread", frames(gate))
+
+    assert TurnService.get_current("running-thread") is next_turn
+    assert next_turn.task is not None
+    await next_turn.task
@@ -0,0 +1,71 @@
+from datetime import UTC, datetime, timedelta
+
+from src.services.threads.welcome import (
+    FIRST_VISIT_TEXT,
+    decide_welcome,
+    extract_user_name,
+    welcome_agent_class,
+)
+
+NOW = datetime(2025, 6, 3, 12, 0, tzinfo=UTC)
+
+
+def test_welcome_agent_class_prefers_the_most_specific_pattern() -> None:
+    assert welcome_agent_class("staging2-9mumc-server-test-12") == "MUMCAgentTest"
+    assert welcome_agent_class("staging2-9mumc-server-12") == "MUMCAgent"
+    assert welcome_agent_class("staging2-9mumc-xi-12") is None
+    assert welcome_agent_class(None) is None
+
+
+def test_first_visit_is_only_welcomed_once() -> None:
+    decision = decide_welcome({}, has_messages=False, now=NOW)
+
+    assert decision is not None and decision.text == FIRST_VISIT_TEXT and not decision.is_welcome_back
+    assert decide_welcome({"last_interaction_time": NOW.isoformat()}, has_messages=False, now=NOW) is None
+
+
+def test_welcome_back_after_the_session_timeout() -> None:
+    metadata = {
+        "last_interaction_time": (NOW - timedelta(hours=5)).isoformat(),
+        "memories": [
+            {"id": "1", "memory": "Doel: 8000 stappen"},
+            {"id": "2", "memory": "naam: Anna (datum: 2025-06-02)"},
+        ],
+    }
+
+    decision = decide_welcome(metadata, has_messages=True, now=NOW)
+
+    assert decision is not None and decision.is_welcome_back
+    assert decision.reason == "welcome_back_300min"
+    assert decision.text.startswith("👋 Hallo Anna!")
+
+    metadata["last_interaction_time"] = (NOW - timedelta(hours=3)).isoformat()
+
+    assert decide_welcome(metadata, has_messages=True, now=NOW) is None
+    assert decide_welcome({"last_interaction_time": "gisteren"}, has_messages=True, now=NOW) is None
+
+
+def test_welcome_back_skips_empty_memories() -> None:
+    # Before the session service, an empty memory aborted the name search and saved an empty welcome message
+    metadata = {
+        "last_interaction_time": (NOW - timedelta(hours=5)).isoformat(),
+        "memories": [{"id": "1", "memory": ""}, {"id": "2", "memory": None}, {"id": "3", "memory": "[Anna]"}],
+    }
+
+    decision = decide_welcome(metadata, has_messages=True, now=NOW)
+
+    assert decision is not None
+    assert decision.text == "👋 Hallo Anna!\n\nFijn dat je er weer bent. Hoe gaat het vandaag met je?"
+
+    metadata["memories"] = [{"id": "1", "memory": ""}]
+    decision = decide_welcome(metadata, has_messages=True, now=NOW)
+
+    assert decision is not None
+    assert decision.text == "👋 Hallo!\n\nFijn dat je er weer bent. Hoe gaat het vandaag met je?"
+
+
+def test_extract_user_name() -> None:
+    assert extract_user_name([{"memory": "[Jan de Vries]"}]) == "Jan de Vries"
+    assert extract_user_name([{"memory": "ZLM score 3"}, {"memory": "Piet"}]) == "Piet"
+    assert extract_user_name([{"memory": ""}, "geen dict"]) is None
+    assert extract_user_name(None) is None
@@ -0,0 +1,107 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from src.models.messages import MessageContent, TextContent, TextDeltaContent
+from src.utils.coalesce_text_deltas import coalesce_text_deltas
+
+
+async def _source(*chunks: MessageContent | float) -> AsyncGenerator[MessageContent, None]:
+    for chunk in chunks:
+        if isinstance(chunk, float):
+            await asyncio.sleep(chunk)
+        else:
+            yield chunk
+
+
+def _delta(text: str, content_id: str = "text") -> TextDeltaContent:
+    return TextDeltaContent(id=content_id, delta=text)
+
+
+async def _collect(source: AsyncGenerator[MessageContent, None], max_delay: float = 0.05, max_chars: int = 100):
+    return [chunk async for chunk in coalesce_text_deltas(source, max_delay=max_delay, max_chars=max_chars)]
+
+
+@pytest.mark.asyncio
+async def test_consecutive_deltas_are_merged():
+    chunks = await _collect(_source(_delta("Hal"), _delta("lo "), _delta("daar")))
+
+    assert [(chunk.id, chunk.delta) for chunk in chunks] == [("text", "Hallo daar")]
+
+
+@pytest.mark.asyncio
+async def test_other_chunks_flush_and_keep_order():
+    text = TextContent(id="text", text="Hallo")
+    chunks = await _collect(_source(_delta("Hal"), _delta("lo"), text, _delta("!", "other")))
+
+    assert chunks[0].model_dump() == _delta("Hallo").model_dump()
+    assert chunks[1] is text
+    assert chunks[2].model_dump() == _delta("!", "other").model_dump()
+
+
+@pytest.mark.asyncio
+async def test_different_ids_are_not_merged():
+    chunks = await _collect(_source(_delta("a", "one"), _delta("b", "two")))
+
+    assert [(chunk.id, chunk.delta) for chunk in chunks] == [("one", "a"), ("two", "b")]
+
+
+@pytest.mark.asyncio
+async def test_size_window_flushes():
+    chunks = await _collect(_source(*[_delta("abc") for _ in range(4)]), max_chars=6)
+
+    assert [chunk.delta for chunk in chunks] == ["abcabc", "abcabc"]
+
+
+@pytest.mark.asyncio
+async def test_time_window_flushes_while_source_is_idle():
+    received: list[tuple[str, float]] = []
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
+    async for chunk in coalesce_text_deltas(_source(_delta("a"), 0.3, _delta("b")), max_delay=0.02, max_chars=100):
+        received.append((chunk.delta, loop.time() - started_at))
+
+    assert [delta for delta, _ in received] == ["a", "b"]
+    assert received[0][1] < 0.2
+
+
+@pytest.mark.asyncio
+async def test_disabled_window_forwards_every_delta():
+    chunks = await _collect(_source(_delta("a"), _delta("b")), max_delay=0)
+
+    assert [chunk.delta for chunk in chunks] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_source_errors_are_raised_after_pending_text():
+    async def failing() -> AsyncGenerator[MessageContent, None]:
+        yield _delta("partial")
+        raise ValueError("boom")
+
+    received: list[str] = []
+
+    with pytest.raises(ValueError, match="boom"):
+        async for chunk in coalesce_text_deltas(failing(), max_delay=0.05, max_chars=100):
+            received.append(chunk.delta)
+
+    assert received == ["partial"]
+
+
+@pytest.mark.asyncio
+async def test_closing_the_consumer_closes_the_source():
+    closed = asyncio.Event()
+
+    async def source() -> AsyncGenerator[MessageContent, None]:
+        try:
+            for i in range(1000):
+                yield _delta(str(i), content_id=str(i))
+        finally:
+            closed.set()
+
+    chunks = coalesce_text_deltas(source(), max_delay=0.05, max_chars=100)
+    await anext(chunks)
+    await chunks.aclose()
+
+    assert closed.is_set()
@@ -0,0 +1,30 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from src.utils.cursor import InvalidCursorError, decode_cursor, encode_cursor, keyset_where
+
+
+def test_cursor_round_trip() -> None:
+    created_at = datetime(2025, 6, 2, 23, 12, 40, 238000, tzinfo=UTC)
+    cursor = encode_cursor(created_at, "01770a29-c1f9-4c89-84e6-47f0063f8aca")
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, "01770a29-c1f9-4c89-84e6-47f0063f8aca")
+
+    # Naive timestamps from raw queries are UTC
+    assert decode_cursor(encode_cursor(created_at.replace(tzinfo=None), "a"))[0] == created_at
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor(datetime.now(UTC), "a")[:-3] + "!!!"])
+def test_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def test_keyset_where_breaks_ties_on_id() -> None:
+    created_at = datetime(2025, 1, 1, tzinfo=UTC)
+
+    assert keyset_where((created_at, "b"), "desc") == {
+        "OR": [{"created_at": {"lt": created_at}}, {"created_at": created_at, "id": {"lt": "b"}}]
+    }
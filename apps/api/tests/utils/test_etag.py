@@ -0,0 +1,18 @@
+from src.utils.etag import etag_matches, make_etag
+
+
+def test_make_etag_is_quoted_and_changes_with_the_version() -> None:
+    etag = make_etag("/threads/1", "2025-06-02T23:12:40.238+00:00")
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag("/threads/1", "2025-06-02T23:12:40.238+00:00")
+    assert etag != make_etag("/threads/1", "2025-06-02T23:12:40.239+00:00")
+
+
+def test_etag_matches() -> None:
+    etag = make_etag("a")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
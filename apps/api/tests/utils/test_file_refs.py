@@ -0,0 +1,27 @@
+from src.utils.file_refs import decode_file_ref, encode_file_ref
+from src.utils.token_estimator import estimate_messages_tokens
+
+
+def test_file_ref_round_trip() -> None:
+    placeholder = encode_file_ref("thread/content", 2048)
+
+    assert decode_file_ref(placeholder) == ("thread/content", 2048)
+
+
+def test_decode_file_ref_ignores_file_data() -> None:
+    assert decode_file_ref("data:application/pdf;base64,JVBERi0xLjQ=") is None
+    assert decode_file_ref("file-ref:large:thread/content") is None
+    assert decode_file_ref("file-ref:10:") is None
+
+
+def test_placeholder_is_estimated_by_file_size() -> None:
+    def estimate(size: int) -> int:
+        file_data = encode_file_ref("thread/content", size)
+
+        return estimate_messages_tokens(
+            [{"role": "user", "content": [{"type": "file", "file": {"file_data": file_data, "filename": "a.pdf"}}]}]
+        )
+
+    assert estimate(40_000) > estimate(4_000) > estimate(0)
+    # Like inline file data, only the first 100k characters are counted
+    assert estimate(10_000_000) == estimate(100_000)
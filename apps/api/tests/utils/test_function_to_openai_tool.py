@@ -0,0 +1,47 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+from src.agents.tool_registry import ToolRegistry
+from src.utils.function_to_openai_tool import function_to_openai_tool
+
+
+class _Choice(BaseModel):
+    label: str
+    value: int
+
+
+def _make_tools(prefix: str) -> list:
+    def tool_ask(question: str, choices: list[dict[str, str]], models: list[_Choice] | None = None) -> str:
+        """Ask a question."""
+        return f"{prefix}{question}"
+
+    def tool_set_role(role: Literal["coach", "nurse"]) -> str:
+        """Set the role."""
+        return role
+
+    return [tool_ask, tool_set_role]
+
+
+def test_parameters_have_item_schemas() -> None:
+    parameters = function_to_openai_tool(_make_tools("")[0])["function"]["parameters"]
+
+    assert parameters["properties"]["choices"]["items"] == {
+        "type": "object",
+        "additionalProperties": {"type": "string"},
+    }
+    assert parameters["properties"]["models"]["items"]["required"] == ["label", "value"]
+    assert parameters["required"] == ["question", "choices"]
+
+
+def test_closures_share_schemas_and_dispatch_by_name() -> None:
+    first = ToolRegistry(_make_tools("a"))
+    second = ToolRegistry(_make_tools("b"))
+
+    assert all(a is b for a, b in zip(first.openai_tools, second.openai_tools, strict=True))
+    assert first.openai_tools[1]["function"]["parameters"]["properties"]["role"]["enum"] == ["coach", "nurse"]
+
+    tool = second.get("tool_ask")
+
+    assert tool is not None and tool("hi", []) == "bhi"
+    assert second.get("tool_unknown") is None
@@ -0,0 +1,26 @@
+from src.utils.incremental_json import IncrementalJsonScanner
+
+
+def _feed_all(*fragments: str) -> list[bool]:
+    scanner = IncrementalJsonScanner()
+    return [scanner.feed(fragment) for fragment in fragments]
+
+
+def test_object_completes_on_closing_brace():
+    assert _feed_all('{"project_id"', ": 12", "}") == [False, False, True]
+
+
+def test_braces_inside_strings_are_ignored():
+    assert _feed_all('{"query": "a } b', ' \\" { c"', "}") == [False, False, True]
+
+
+def test_nested_values():
+    assert _feed_all('{"resources": [{"id": 1}', ', {"id": 2}]', "}") == [False, False, True]
+
+
+def test_trailing_garbage_invalidates():
+    assert _feed_all('{"a": 1}', "  ", '{"b": 2}') == [True, True, False]
+
+
+def test_scalar_top_level_is_never_complete():
+    assert _feed_all("1", "{}") == [False, False]
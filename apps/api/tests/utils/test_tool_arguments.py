@@ -0,0 +1,34 @@
+import pytest
+
+from src.utils.tool_arguments import ToolArgumentsDecoder, ToolArgumentsError, decode_tool_arguments
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ('{"a": 1,}', {"a": 1}),
+        ("{'a': True, 'b': None}", {"a": True, "b": None}),
+        ('{"a": [1, 2,', {"a": [1, 2]}),
+        ('{"a": "cut o', {"a": "cut o"}),
+        ('{"a": 1, "b":', {"a": 1, "b": None}),
+        ('```json\n{"a": "x,}"}\n```', {"a": "x,}"}),
+    ],
+)
+def test_malformed_arguments_are_repaired(raw: str, expected: dict) -> None:
+    assert decode_tool_arguments(raw) == (expected, True)
+
+
+def test_decoder_counts_repairs_and_failures() -> None:
+    decoder = ToolArgumentsDecoder()
+
+    assert decoder.decode('{"a": "x,}"}') == {"a": "x,}"}
+    assert decoder.decode("") == {}
+    assert decoder.decode('{"a": 1,}') == {"a": 1}
+
+    with pytest.raises(ToolArgumentsError):
+        decoder.decode("[1, 2]")
+
+    metrics = decoder.metrics()
+
+    assert (metrics.decoded, metrics.repaired, metrics.failed) == (3, 1, 1)
+    assert metrics.repair_rate == 0.25
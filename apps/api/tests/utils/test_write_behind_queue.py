@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from src.utils.write_behind_queue import WriteBehindQueue
+
+
+@pytest.mark.asyncio
+async def test_items_queued_together_are_written_as_one_batch():
+    batches: list[list[int]] = []
+
+    async def write_batch(items: list[int]) -> None:
+        await asyncio.sleep(0.01)
+        batches.append(items)
+
+    queue = WriteBehindQueue(write_batch)
+
+    await asyncio.gather(*(queue.submit(i) for i in range(5)))
+    await queue.close()
+
+    assert sorted(item for batch in batches for item in batch) == [0, 1, 2, 3, 4]
+    assert len(batches) < 5
+
+
+@pytest.mark.asyncio
+async def test_a_failing_item_only_fails_its_own_caller():
+    written: list[int] = []
+
+    async def write_batch(items: list[int]) -> None:
+        if 3 in items:
+            raise ValueError("bad item")
+
+        written.extend(items)
+
+    queue = WriteBehindQueue(write_batch)
+
+    results = await asyncio.gather(*(queue.submit(i) for i in range(5)), return_exceptions=True)
+    await queue.close()
+
+    assert isinstance(results[3], ValueError)
+    assert [result for i, result in enumerate(results) if i != 3] == [None] * 4
+    assert sorted(written) == [0, 1, 2, 4]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_interrupt_the_write():
+    written: list[int] = []
+
+    async def write_batch(items: list[int]) -> None:
+        await asyncio.sleep(0.01)
+        written.extend(items)
+
+    queue = WriteBehindQueue(write_batch)
+
+    caller = asyncio.create_task(queue.submit(1))
+    await asyncio.sleep(0)
+    caller.cancel()
+
+    await queue.close()
+
+    assert written == [1]